@@ -1,9 +1,12 @@
 import re
 import os
+import sys
 import json
+import hashlib
 import argparse
+import contextlib
 from datetime import datetime, timezone
-from typing import List, Optional, Any
+from typing import Any, Dict, List, Optional, Tuple
 import numpy as np
 import warnings
 import pandas as pd
@@ -11,6 +14,21 @@ from bs4 import BeautifulSoup
 from bs4 import MarkupResemblesLocatorWarning
 from dateutil import parser as dtparser
 
+# Raiz do repo no path: os scripts rodam como `python Medallion/<camada>.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import storage  # noqa: E402
+
+# Copy-on-write: subconjuntos, renomeações e cópias rasas compartilham os dados até alguém escrever.
+# Sempre ligado a partir do pandas 3; nas versões anteriores é opt-in, e só durante a ingestão
+# (a opção é global: ligar no import mudaria o pandas de quem importa este módulo).
+@contextlib.contextmanager
+def _copy_on_write():
+    if int(pd.__version__.split(".")[0]) >= 3:
+        yield
+        return
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
 # Silencia apenas o aviso específico do BeautifulSoup (sem calar o resto)
 warnings.filterwarnings("ignore", category=MarkupResemblesLocatorWarning)
 
@@ -18,6 +36,7 @@ warnings.filterwarnings("ignore", category=MarkupResemblesLocatorWarning)
 # Colunas de data originais. MANTIDAS NO FORMATO ORIGINAL para não quebrar a lógica
 # de procura no bronze_ingest, já que o snake_case foi removido.
 _URLISH_RE = re.compile(r"^https?://", re.IGNORECASE)
+_MARKUPISH_RE = re.compile(r"[<&\r\x0c]")
 DATA_COL = [
     "createdAt",
     "updatedAt",
@@ -26,79 +45,86 @@ DATA_COL = [
 ]
 
 
-def unwanted_character(df: pd.DataFrame) -> pd.DataFrame:
+def _is_list_like(v: Any) -> bool:
+    return isinstance(v, (list, tuple, set, np.ndarray, pd.Series))
 
-    def _is_list_like(v: Any) -> bool:
-        return isinstance(v, (list, tuple, set, np.ndarray, pd.Series))
-
-    def clean_text(v: Any) -> Any:
-        # Se for uma estrutura iterável (lista/tuple/ndarray/Series), aplica recursivamente
-        if _is_list_like(v):
-            # converte pd.Series para lista para iterar, depois reconstrói o tipo original
-            seq = list(v) if not isinstance(v, list) else v
-            cleaned = [clean_text(x) for x in seq]
-            if isinstance(v, tuple):
-                return tuple(cleaned)
-            if isinstance(v, set):
-                return set(cleaned)
-            if isinstance(v, np.ndarray):
-                return np.array(cleaned, dtype=object)
-            # pd.Series ou list — devolve lista simples (mantemos tipo list para coerência)
-            if isinstance(v, pd.Series):
-                return pd.Series(cleaned, index=v.index)
-            return cleaned  # list
-
-        # Se for dict, limpa valores recursivamente
-        if isinstance(v, dict):
-            return {k: clean_text(val) for k, val in v.items()}
-
-        # Agora é seguro usar pd.isna porque v é (esperadamente) escalar
-        if pd.isna(v):
-            return v
-
-        txt = str(v)
-
-        # URLs / scheme-like: não passar pelo BeautifulSoup
-        if not _URLISH_RE.match(txt):
-            txt = BeautifulSoup(txt, "html.parser").get_text()
-
-        # remove aspas e colchetes literais
-        txt = re.sub(r'[\"\[\]\']', "", txt)
-        return txt.strip()
-
-    # Faz uma cópia para evitar SettingWithCopyWarning
-    df_cleaned = df.copy()
 
-    for col in df_cleaned.columns:
-        s = df_cleaned[col]
+def clean_text(v: Any) -> Any:
+    # Se for uma estrutura iterável (lista/tuple/ndarray/Series), aplica recursivamente
+    if _is_list_like(v):
+        # converte pd.Series para lista para iterar, depois reconstrói o tipo original
+        seq = list(v) if not isinstance(v, list) else v
+        cleaned = [clean_text(x) for x in seq]
+        if isinstance(v, tuple):
+            return tuple(cleaned)
+        if isinstance(v, set):
+            return set(cleaned)
+        if isinstance(v, np.ndarray):
+            return np.array(cleaned, dtype=object)
+        # pd.Series ou list — devolve lista simples (mantemos tipo list para coerência)
+        if isinstance(v, pd.Series):
+            return pd.Series(cleaned, index=v.index)
+        return cleaned  # list
 
-        # Aplica a limpeza e garante que s_cleaned é Series 1-D com mesmo índice
-        s_cleaned = pd.Series(s.apply(clean_text), index=s.index, dtype="object")
+    # Se for dict, limpa valores recursivamente
+    if isinstance(v, dict):
+        return {k: clean_text(val) for k, val in v.items()}
 
-        # Substitui strings vazias por NaN para ajudar a conversão numérica
-        s_for_numeric = s_cleaned.replace("", np.nan)
+    # Agora é seguro usar pd.isna porque v é (esperadamente) escalar
+    if pd.isna(v):
+        return v
 
-        # tenta conversão numérica (coerce)
-        try:
-            s_num = pd.to_numeric(s_for_numeric, errors="coerce")
-        except TypeError:
-            # se to_numeric reclamar, mantém o texto limpo
-            df_cleaned[col] = s_cleaned
-            continue
+    txt = str(v)
+
+    # URLs / scheme-like: não passar pelo BeautifulSoup.
+    # Texto sem '<', '&', '\r' ou '\f' sai igual do BeautifulSoup: só parseia o que pode mudar.
+    if not _URLISH_RE.match(txt) and _MARKUPISH_RE.search(txt):
+        txt = BeautifulSoup(txt, "html.parser").get_text()
+
+    # remove aspas e colchetes literais
+    txt = re.sub(r'[\"\[\]\']', "", txt)
+    return txt.strip()
 
-        # Decide se usa a versão numérica ou textual
-        if s_num.notna().any():
-            mask_num = s_num.notna()
-            # compara representações somente onde há número
-            str_cleaned = s_cleaned.astype(object).astype(str)
-            str_num = s_num.astype(object).astype(str)
-            if (str_cleaned[mask_num] != str_num[mask_num]).any():
-                df_cleaned[col] = s_num
-                continue
 
-        df_cleaned[col] = s_cleaned
+def clean_column(s: pd.Series) -> Tuple[pd.Series, str]:
+    """Limpa uma coluna inteira e decide número x texto. Retorna (série, "numeric" | "text")."""
+    # Aplica a limpeza e garante que s_cleaned é Series 1-D com mesmo índice
+    s_cleaned = pd.Series(s.apply(clean_text), index=s.index, dtype="object")
 
-    return df_cleaned
+    # Substitui strings vazias por NaN para ajudar a conversão numérica
+    s_for_numeric = s_cleaned.replace("", np.nan)
+
+    # tenta conversão numérica (coerce)
+    try:
+        s_num = pd.to_numeric(s_for_numeric, errors="coerce")
+    except TypeError:
+        # se to_numeric reclamar, mantém o texto limpo
+        return s_cleaned, "text"
+
+    # Decide se usa a versão numérica ou textual
+    if s_num.notna().any():
+        mask_num = s_num.notna()
+        # compara representações somente onde há número
+        str_cleaned = s_cleaned.astype(object).astype(str)
+        str_num = s_num.astype(object).astype(str)
+        if (str_cleaned[mask_num] != str_num[mask_num]).any():
+            return s_num, "numeric"
+
+    return s_cleaned, "text"
+
+
+def clean_columns(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, str]]:
+    """`unwanted_character` devolvendo também a decisão número x texto de cada coluna."""
+    # Cópia rasa: cada coluna limpa substitui a original sem duplicar as demais
+    df_cleaned = df.copy(deep=False)
+    kinds: Dict[str, str] = {}
+    for col in df_cleaned.columns:
+        df_cleaned[col], kinds[col] = clean_column(df_cleaned[col])
+    return df_cleaned, kinds
+
+
+def unwanted_character(df: pd.DataFrame) -> pd.DataFrame:
+    return clean_columns(df)[0]
 
 def standardization_columns(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -106,7 +132,6 @@ def standardization_columns(df: pd.DataFrame) -> pd.DataFrame:
     Se houver duplicatas (ex: listing.id e account.id virando 'id'),
     adiciona um sufixo numérico (_1, _2) para evitar erro.
     """
-    df = df.copy()
     new_cols = []
     seen = {} # Dicionário para rastrear nomes repetidos
 
@@ -124,8 +149,8 @@ def standardization_columns(df: pd.DataFrame) -> pd.DataFrame:
 
         new_cols.append(final_name)
 
-    df.columns = new_cols
-    return df
+    # set_axis devolve um novo DataFrame sobre os mesmos dados (sem copiar as colunas)
+    return df.set_axis(new_cols, axis=1)
 
     """Normaliza o nome das colunas, mantendo apenas o último nome (após o último '.')."""
     df = df.copy()
@@ -256,41 +281,215 @@ def parse_medias(cell: Any) -> Optional[List[dict]]:
 
 # -------------------------------------------------------------------------------------------------
 
-def bronze_ingest(input_path: str, outdir: str) -> str:
+# ---------- Schema inferido por layout de origem ----------
+# A primeira ingestão de um layout (mesmo cabeçalho de CSV) segue o caminho completo e grava o que
+# ele decidiu (dtypes lidos, número x texto por coluna) em <outdir>/_schemas: nada é lido duas vezes.
+# Nas seguintes o CSV é lido com dtypes explícitos e a decisão número x texto vem do schema,
+# sem a comparação de representações na coluna inteira.
+# Coluna que não cabe no schema (tipo lido diferente, número que não converte, coluna nova)
+# volta para a decisão completa de `clean_column`, e o schema é atualizado com o que foi visto.
+SCHEMA_VERSION = 1
+SCHEMA_SUBDIR = "_schemas"
+# Tipos que podem ir para o read_csv; "object" (misturado) fica por conta da inferência
+_READ_DTYPES = {"int64", "float64", "bool", "str"}
+
+
+def _read_csv(path: str, **kwargs) -> pd.DataFrame:
     # Leitura robusta do CSV
-    dataframe = pd.read_csv(
-        input_path,
+    return pd.read_csv(
+        path,
         sep=",",
-        engine="python",
+        engine="python",          # necessário para on_bad_lines
         on_bad_lines="skip",
         quotechar='"',
         escapechar="\\",
         encoding="utf-8",
+        **kwargs,
     )
 
-    # 1) Padroniza colunas (mantém nomes seguros)
-    dataframe = standardization_columns(dataframe)
 
-    # --- MUDANÇA AQUI: O PARSING VEM ANTES DA LIMPEZA ---
-    
-    # 2) Parsing de colunas JSON (Preço e Medias)
+def _parse_json_columns(dataframe: pd.DataFrame) -> pd.DataFrame:
+    # Parsing de colunas JSON (Preço e Medias)
     # Primeiro verificamos se as colunas existem antes de tentar processar
     if "pricingInfos" in dataframe.columns:
         dataframe["pricinginfos_arr"] = dataframe["pricingInfos"].apply(parse_pricing_infos)
         dataframe["pricinginfos_json"] = dataframe["pricinginfos_arr"].apply(
             lambda x: json.dumps(x, ensure_ascii=False) if isinstance(x, list) else None
         )
-    
+
     if "medias" in dataframe.columns:
         dataframe["medias_arr"] = dataframe["medias"].apply(parse_medias)
-    
+
     for am_col in ["amenities", "mergedAmenities", "searchableAmenities"]:
         if am_col in dataframe.columns:
             # Cria, por exemplo, amenities_arr
             dataframe[f"{am_col}_arr"] = dataframe[am_col].apply(parse_strings_list)
+    return dataframe
+
+
+def _dtype_name(s: pd.Series) -> str:
+    if isinstance(s.dtype, pd.StringDtype):
+        return "str"
+    name = str(s.dtype)
+    return name if name in _READ_DTYPES else "object"
+
+
+def header_key(path: str) -> str:
+    """Identifica o layout da origem pelo cabeçalho do CSV (mesmo portal/exportação => mesma chave)."""
+    with open(path, encoding="utf-8") as f:
+        header = f.readline().strip()
+    return hashlib.sha256(header.encode("utf-8")).hexdigest()[:16]
+
+
+def schema_path(schema_dir: str, key: str) -> str:
+    return storage.join(schema_dir, f"bronze_schema_{key}.json")
+
+
+def load_schema(uri: str) -> Optional[Dict[str, Any]]:
+    fs, path = storage.url_to_fs(uri)
+    if not fs.exists(path):
+        return None
+    try:
+        with fs.open(path, "r", encoding="utf-8") as f:
+            schema = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"   ⚠️ Schema ilegível em {uri} ({e}); inferindo de novo.")
+        return None
+    if schema.get("version") != SCHEMA_VERSION:
+        return None
+    return schema
+
+
+def save_schema(schema: Dict[str, Any], uri: str):
+    storage.ensure_parent(uri)
+    fs, path = storage.url_to_fs(uri)
+    with fs.open(path, "w", encoding="utf-8") as f:
+        json.dump(schema, f, ensure_ascii=False, indent=2, sort_keys=True)
+
+
+def infer_schema(key: str, read_dtypes: Dict[str, str], kinds: Dict[str, str], rows: int) -> Dict[str, Any]:
+    """Schema do layout a partir da primeira ingestão completa: dtypes lidos e decisão de `clean_columns`."""
+    return {
+        "version": SCHEMA_VERSION,
+        "header_key": key,
+        "sample_rows": rows,
+        "read_dtypes": read_dtypes,
+        "columns": kinds,
+    }
+
+
+def read_csv_with_schema(path: str, schema: Dict[str, Any]) -> pd.DataFrame:
+    dtypes = {c: d for c, d in schema["read_dtypes"].items() if d in _READ_DTYPES}
+    try:
+        return _read_csv(path, dtype=dtypes)
+    except (ValueError, TypeError, OverflowError) as e:
+        # Ex.: inteiro na amostra e vazio mais adiante. Relê com dtype só nas colunas de texto;
+        # as numéricas divergentes caem no fallback de apply_schema.
+        print(f"   ⚠️ CSV não bate com os tipos do schema ({e}); relendo com inferência nas colunas numéricas.")
+        return _read_csv(path, dtype={c: d for c, d in dtypes.items() if d == "str"})
+
+
+def _clean_str_column(s: pd.Series) -> pd.Series:
+    """
+    `clean_text` vetorizado para coluna de texto. Valores com markup (ou com os separadores
+    0x1c-0x1f, que o str.strip do Python corta e o do Arrow não) seguem pelo caminho normal.
+    """
+    out = s.str.replace(r'[\"\[\]\']', "", regex=True).str.strip()
+    slow = s.str.contains(r"[<&\r\x0c\x1c-\x1f]", regex=True, na=False)
+    if slow.any():
+        out[slow] = s[slow].map(clean_text)
+    return out.astype(object)
+
+
+def apply_schema(df: pd.DataFrame, kinds: Dict[str, str]) -> Tuple[pd.DataFrame, Dict[str, str], Dict[str, str]]:
+    """
+    Equivalente a `unwanted_character` guiado pelo schema.
+    Retorna (df limpo, decisão por coluna, colunas que caíram no fallback -> motivo).
+    """
+    df_cleaned = df.copy(deep=False)
+    observed: Dict[str, str] = {}
+    fallbacks: Dict[str, str] = {}
+    for col in df_cleaned.columns:
+        s = df_cleaned[col]
+        kind = kinds.get(col)
+
+        if kind == "text" and s.dtype.kind in "biuf":
+            # Lida como número: o texto limpo é str(valor), que sempre volta igual do to_numeric
+            df_cleaned[col] = s.map(str, na_action="ignore").astype(object)
+            observed[col] = "text"
+            continue
+
+        if isinstance(s.dtype, pd.StringDtype):
+            s_cleaned = _clean_str_column(s)
+        else:
+            s_cleaned = pd.Series(s.apply(clean_text), index=s.index, dtype="object")
+
+        if kind == "text":
+            df_cleaned[col] = s_cleaned
+            observed[col] = "text"
+            continue
+
+        if kind == "numeric":
+            try:
+                s_num = pd.to_numeric(s_cleaned.replace("", np.nan), errors="coerce")
+            except TypeError:
+                s_num = None
+            # Valor preenchido que não vira número: a coluna não cabe no schema
+            if s_num is not None and not (s_num.isna() & s_cleaned.notna() & (s_cleaned != "")).any():
+                df_cleaned[col] = s_num
+                observed[col] = "numeric"
+                continue
+            fallbacks[col] = "valor não numérico"
+        else:
+            fallbacks[col] = "coluna fora do schema"
+
+        df_cleaned[col], observed[col] = clean_column(s)
+
+    return df_cleaned, observed, fallbacks
+
+
+@_copy_on_write()
+def bronze_ingest(input_path: str, outdir: str, parquet_profile: str = "default",
+                  use_schema: bool = True, schema_dir: Optional[str] = None) -> str:
+    # Remoto passa pelo cache local do storage
+    local = storage.local_path(input_path)
+
+    if use_schema:
+        key = header_key(local)
+        schema_uri = schema_path(schema_dir or storage.join(outdir, SCHEMA_SUBDIR), key)
+        schema = load_schema(schema_uri)
+        cached = schema is not None
+        if cached:
+            print(f"   🧬 Schema em cache: {schema_uri}")
+            dataframe = read_csv_with_schema(local, schema)
+        else:
+            # primeira ingestão do layout: caminho completo, e o schema sai das decisões dele
+            dataframe = _read_csv(local)
+        read_dtypes = {c: _dtype_name(dataframe[c]) for c in dataframe.columns}
+    else:
+        dataframe = _read_csv(local)
+
+    # 1) Padroniza colunas (mantém nomes seguros)
+    dataframe = standardization_columns(dataframe)
+
+    # 2) Parsing de colunas JSON — vem antes da limpeza
+    dataframe = _parse_json_columns(dataframe)
 
     # 3) Agora sim, limpa caracteres indesejados (sem quebrar os JSONs que já salvamos nas colunas _arr)
-    dataframe = unwanted_character(dataframe)
+    if use_schema and cached:
+        dataframe, kinds, fallbacks = apply_schema(dataframe, schema["columns"])
+        for col, motivo in fallbacks.items():
+            print(f"   ⚠️ Coluna '{col}' fora do schema ({motivo}); decisão pela coluna inteira.")
+        updated = {**schema, "read_dtypes": read_dtypes, "columns": kinds}
+        if updated != schema:
+            save_schema(updated, schema_uri)
+            print(f"   💾 Schema atualizado: {schema_uri}")
+    elif use_schema:
+        dataframe, kinds = clean_columns(dataframe)
+        save_schema(infer_schema(key, read_dtypes, kinds, len(dataframe)), schema_uri)
+        print(f"   🧬 Schema inferido de {len(dataframe)} linhas ({len(kinds)} colunas) e salvo: {schema_uri}")
+    else:
+        dataframe = unwanted_character(dataframe)
 
     # 4) Cria colunas de data *_ts
     ts_cols = {}
@@ -304,18 +503,17 @@ def bronze_ingest(input_path: str, outdir: str) -> str:
 
     # 5) Metadados
     dataframe["bronze_ingestion_ts"] = pd.Timestamp.now(tz="UTC")
-    dataframe["bronze_source_file"] = os.path.abspath(input_path)
+    dataframe["bronze_source_file"] = os.path.abspath(input_path) if storage.is_local(input_path) else input_path
 
     # 6) Saída
-    if not outdir.startswith("gs://"):
-        os.makedirs(outdir, exist_ok=True)
-    
-    outpath = os.path.join(
+    storage.ensure_dir(outdir)
+
+    outpath = storage.join(
         outdir,
         f"listings_bronze_{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.parquet",
     )
     
-    dataframe.to_parquet(outpath, engine="pyarrow", index=False)
+    storage.write_parquet(dataframe, outpath, profile=parquet_profile, engine="pyarrow", index=False)
     # dataframe.to_csv(outpath + ".csv", index=False, encoding="utf-8") # Opcional: Comentei para economizar espaço
     return outpath
 
@@ -383,9 +581,16 @@ def main():
     )
     ap.add_argument("--input", required=True, help="Caminho do CSV de entrada")
     ap.add_argument("--outdir", required=True, help="Diretório de saída (Parquet)")
+    ap.add_argument("--parquet-profile", default="default", choices=list(storage.PARQUET_PROFILES),
+                    help="Perfil de escrita do Parquet (codec, row groups, dicionário, ordenação)")
+    ap.add_argument("--schema-dir", default=None,
+                    help=f"Onde guardar os schemas inferidos por layout (padrão: <outdir>/{SCHEMA_SUBDIR})")
+    ap.add_argument("--no-schema", action="store_true",
+                    help="Ignora o schema e decide número x texto pela coluna inteira (comportamento antigo)")
     args = ap.parse_args()
 
-    out = bronze_ingest(args.input, args.outdir)
+    out = bronze_ingest(args.input, args.outdir, parquet_profile=args.parquet_profile,
+                        use_schema=not args.no_schema, schema_dir=args.schema_dir)
     print(f"✅ Bronze gerado: {out}")
 
 if __name__ == "__main__":
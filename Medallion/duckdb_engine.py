@@ -0,0 +1,424 @@
+"""
+Engine DuckDB para as camadas silver e gold: as mesmas transformações do pandas, em SQL
+sobre os Parquets.
+
+- dedup do último registro por id com QUALIFY row_number();
+- pricing/medias/amenities com UNNEST das listas do bronze;
+- scans multi-thread, e o que não couber em DUCKDB_MEMORY_LIMIT vai para o disco
+  (temp_directory). A escrita é um COPY ... TO direto do DuckDB, sem DataFrame intermediário.
+
+Usado por `silver_dataframe.py --engine duckdb` e `gold_dataframe.py --engine duckdb`.
+A paridade com o engine pandas é conferida em benchmarks/bench_medallion_engines.py.
+"""
+import os
+import shutil
+import tempfile
+from typing import Dict, List, Optional
+
+import duckdb
+
+import storage
+from media_urls import KEY_HEX_RE, PREFIXES_TABLE, URL_SPLIT_RE
+from silver_dataframe import (
+    AMENITY_ARRAY_COLS, AMENITY_MAP, LISTINGS_SNAKE_COLS, MEDIAS_RENAME, PRICING_MONEY_COLS,
+    PRICING_RENAME, PRICING_SNAKE_COLS, present_listing_columns,
+)
+
+DUCKDB_MEMORY_LIMIT = os.getenv("DUCKDB_MEMORY_LIMIT", "")  # ex.: "4GB"; vazio = padrão do DuckDB (80% da RAM)
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", "0"))      # 0 = todos os núcleos
+DUCKDB_TEMP_DIR = os.getenv("DUCKDB_TEMP_DIR", os.path.join(tempfile.gettempdir(), "duckdb_spill"))
+
+# Espaços que o str.strip() do Python corta (str.isspace). O DuckDB não interpreta '\t' em literal comum:
+# trim(x, ' \t\n\r') cortaria barra, 't', 'n' e 'r'. A classe vai para o RE2, que entende os escapes.
+_PY_SPACE = r"[\s\v\x1c-\x1f\x85\pZ]"
+# Mesma lógica de _norm_str/_snake/_to_decimal do engine pandas, como macros SQL
+_MACROS = [
+    rf"""CREATE OR REPLACE MACRO py_strip(x) AS regexp_replace(x, '^{_PY_SPACE}+|{_PY_SPACE}+$', '', 'g')""",
+    r"""CREATE OR REPLACE MACRO norm_str(x) AS nullif(py_strip(CAST(x AS VARCHAR)), '')""",
+    r"""CREATE OR REPLACE MACRO snake(x) AS
+        nullif(trim(regexp_replace(lower(x), '[^a-z0-9]+', '_', 'g'), '_'), '')""",
+    r"""CREATE OR REPLACE MACRO to_decimal_txt(x) AS
+        TRY_CAST(replace(replace(py_strip(CAST(x AS VARCHAR)), '.', ''), ',', '.') AS DOUBLE)""",
+]
+_NUMERIC_TYPES = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT",
+                  "UINTEGER", "UBIGINT", "FLOAT", "DOUBLE", "DECIMAL")
+
+
+def connect() -> "duckdb.DuckDBPyConnection":
+    con = duckdb.connect()
+    os.makedirs(DUCKDB_TEMP_DIR, exist_ok=True)
+    con.execute(f"SET temp_directory = {_lit(DUCKDB_TEMP_DIR)}")
+    con.execute("SET preserve_insertion_order = true")
+    if DUCKDB_MEMORY_LIMIT:
+        con.execute(f"SET memory_limit = {_lit(DUCKDB_MEMORY_LIMIT)}")
+    if DUCKDB_THREADS:
+        con.execute(f"SET threads = {DUCKDB_THREADS}")
+    for m in _MACROS:
+        con.execute(m)
+    return con
+
+
+def _q(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _lit(s: str) -> str:
+    return "'" + s.replace("'", "''") + "'"
+
+
+def _schema(con, relation: str) -> Dict[str, str]:
+    return {r[0]: r[1] for r in con.execute(f"DESCRIBE SELECT * FROM {relation}").fetchall()}
+
+
+def _struct_members(type_str: str) -> Dict[str, str]:
+    """Campos -> tipo de um STRUCT(...) ou STRUCT(...)[] do DESCRIBE (só o primeiro nível)."""
+    t = type_str.strip()
+    if t.endswith("[]"):
+        t = t[:-2]
+    if not t.startswith("STRUCT(") or not t.endswith(")"):
+        return {}
+    parts, depth, cur = [], 0, ""
+    for ch in t[len("STRUCT("):-1]:
+        depth += ch == "("
+        depth -= ch == ")"
+        if ch == "," and depth == 0:
+            parts.append(cur.strip())
+            cur = ""
+        else:
+            cur += ch
+    parts.append(cur.strip())
+    members = {}
+    for p in parts:
+        if p.startswith('"'):
+            end = p.index('"', 1)
+            members[p[1:end]] = p[end + 1:].strip()
+        else:
+            name, _, typ = p.partition(" ")
+            members[name] = typ.strip()
+    return members
+
+
+def _copy_options(profile: str) -> str:
+    """Perfil de storage.PARQUET_PROFILES -> opções do COPY (codec, nível, row group)."""
+    opts = dict(storage.PARQUET_PROFILES[profile])
+    out = ["FORMAT PARQUET"]
+    if opts.get("compression"):
+        out.append(f"COMPRESSION {opts['compression'].upper()}")
+    if opts.get("compression_level"):
+        out.append(f"COMPRESSION_LEVEL {int(opts['compression_level'])}")
+    if opts.get("row_group_size"):
+        out.append(f"ROW_GROUP_SIZE {int(opts['row_group_size'])}")
+    return ", ".join(out)
+
+
+def _copy(con, query: str, uri: str, profile: str = "default"):
+    """COPY (query) TO uri. Destino remoto: escreve num temporário local e sobe pelo storage."""
+    sort_by = storage.PARQUET_PROFILES[profile].get("sort_by", ())
+    cols = [r[0] for r in con.execute(f"DESCRIBE {query}").fetchall()]
+    key = next((c for c in sort_by if c in cols), None)
+    if key:
+        # mesmo critério do pandas (sort estável por listing_id), mantendo a ordem original nos empates
+        query = f"SELECT * FROM ({query}) ORDER BY {_q(key)}"
+    local = uri
+    tmpdir = None
+    if not storage.is_local(uri):
+        tmpdir = tempfile.mkdtemp(prefix="duckdb_out_")
+        local = os.path.join(tmpdir, os.path.basename(uri))
+    else:
+        storage.ensure_parent(uri)
+    con.execute(f"COPY ({query}) TO {_lit(local)} ({_copy_options(profile)})")
+    if tmpdir:
+        storage.put(local, uri)
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _empty_copy(con, uri: str, columns: List[str], profile: str):
+    """Tabela vazia com as colunas (VARCHAR) que o engine pandas escreveria nesse caso."""
+    cols = ", ".join(f"CAST(NULL AS VARCHAR) AS {_q(c)}" for c in columns)
+    _copy(con, f"SELECT {cols} WHERE false", uri, profile)
+
+
+# ---------- silver ----------
+
+def _listings_query(schema: Dict[str, str]) -> str:
+    present = present_listing_columns(schema)
+    exprs = []
+    for src, dst in present.items():
+        e = _q(src)
+        if dst == "listing_id":
+            e = f"CAST({e} AS VARCHAR)"
+        elif dst in LISTINGS_SNAKE_COLS:
+            e = f"snake(norm_str({e}))"
+        elif dst in ("lat", "lon"):
+            e = f"CAST({e} AS DOUBLE)"
+        exprs.append(f"{e} AS {_q(dst)}")
+    dsts = set(present.values())
+    if "total_area_raw" in dsts:
+        src = next(k for k, v in present.items() if v == "total_area_raw")
+        typ = schema[src]
+        e = f"CAST({_q(src)} AS DOUBLE)" if typ.startswith(_NUMERIC_TYPES) else f"to_decimal_txt({_q(src)})"
+        exprs.append(f"{e} AS total_area_m2")
+    if "lat" in dsts and "lon" in dsts:
+        lat = next(k for k, v in present.items() if v == "lat")
+        lon = next(k for k, v in present.items() if v == "lon")
+        exprs.append(f"({_q(lat)} IS NOT NULL AND {_q(lon)} IS NOT NULL) AS has_geo")
+    else:
+        exprs.append("false AS has_geo")
+    return f"SELECT {', '.join(exprs)} FROM b ORDER BY _ord"
+
+
+def _pricing_query(schema: Dict[str, str]) -> Optional[str]:
+    fields = _struct_members(schema["pricinginfos_arr"])
+    if not fields:
+        return None
+    rental_fields = _struct_members(fields.get("rentalInfo", ""))
+
+    # coluna "plana" (nome do json_normalize) -> expressão sobre o elemento p
+    flat: Dict[str, str] = {}
+    for f in fields:
+        if f == "rentalInfo":
+            for rf in rental_fields:
+                flat[f"rentalInfo.{rf}"] = f"p.rentalInfo.{_q(rf)}"
+        else:
+            flat[f] = f"p.{_q(f)}"
+    cols = {PRICING_RENAME.get(k, k): v for k, v in flat.items()}
+
+    base, raws = [], []
+    for name, e in cols.items():
+        if name in PRICING_MONEY_COLS:
+            # *_raw = texto original (nulo continua nulo, como o astype(str) do pandas 3)
+            raws.append(f"CAST({e} AS VARCHAR) AS {_q(name + '_raw')}")
+            e = f"to_decimal_txt({e})"
+        elif name in PRICING_SNAKE_COLS:
+            e = f"snake(norm_str({e}))"
+        base.append(f"{e} AS {_q(name)}")
+    raws.sort(key=lambda r: PRICING_MONEY_COLS.index(r.rsplit(" AS ", 1)[1].strip('"')[:-len("_raw")]))
+
+    names = set(cols)
+
+    def c(n):
+        return _q(n) if n in names else "NULL"
+
+    # mesmo cálculo de _aluguel_total (valores nulos se propagam como o NaN do pandas)
+    rent = f"""CASE
+        WHEN {c('business_type')} IS DISTINCT FROM 'rental' THEN NULL
+        WHEN {c('monthly_rental_total_price')} IS NOT NULL THEN {c('monthly_rental_total_price')}
+        ELSE coalesce({c('price')}, 0.0) + coalesce({c('monthly_condo_fee')}, 0.0) + CASE
+            WHEN {c('iptu_period')} = 'monthly' THEN {c('iptu')}
+            WHEN {c('iptu_period')} IS NULL OR {c('iptu_period')} IN ('', 'yearly') THEN {c('iptu')} / 12.0
+            ELSE 0.0 END
+        END"""
+    return f"""
+        WITH e AS (
+            SELECT CAST(id AS VARCHAR) AS listing_id, _ord,
+                   unnest(pricinginfos_arr) AS p, generate_subscripts(pricinginfos_arr, 1) AS k
+            FROM b
+        ), t AS (
+            SELECT listing_id, _ord, k, {', '.join(base + raws)}
+            FROM e WHERE p IS NOT NULL
+        )
+        SELECT * EXCLUDE (_ord, k), {rent} AS monthly_total_rent FROM t ORDER BY _ord, k"""
+
+
+def _medias_query(schema: Dict[str, str], compact: bool = False) -> Optional[str]:
+    fields = _struct_members(schema["medias_arr"])
+    if not fields:
+        return None
+    url_field = next((f for f in fields if MEDIAS_RENAME.get(f, f) == "media_url"), None)
+    compact = compact and url_field is not None
+    exprs = []
+    for f in fields:
+        name = MEDIAS_RENAME.get(f, f)
+        e = f"m.{_q(f)}"
+        if name == "media_type":
+            e = f"snake(norm_str({e}))"
+        if compact and name == "media_url":
+            exprs += ["coalesce(p.media_url_prefix_id, -1) AS media_url_prefix_id", "media_url_key", "media_url_suffix"]
+            continue
+        exprs.append(f"{e} AS {_q(name)}")
+    if not compact:
+        return f"""
+        WITH e AS (
+            SELECT CAST(id AS VARCHAR) AS listing_id, _ord,
+                   unnest(medias_arr) AS m, generate_subscripts(medias_arr, 1) AS k
+            FROM b
+        )
+        SELECT listing_id, {', '.join(exprs)} FROM e WHERE m IS NOT NULL ORDER BY _ord, k"""
+    return f"""{_media_url_ctes(url_field)}
+        SELECT listing_id, {', '.join(exprs)} FROM s LEFT JOIN p USING (_pfx) ORDER BY _rn"""
+
+
+def _media_url_ctes(url_field: str) -> str:
+    """
+    Mesma divisão do media_urls.split_urls: prefixo (p, ids pela primeira aparição) + chave hex em bytes
+    + sufixo por linha (s). Chave que não é hex fica no sufixo; sem barras suficientes, prefixo '' e a URL
+    inteira no sufixo.
+    """
+    re_, hex_re = _lit(URL_SPLIT_RE), _lit(KEY_HEX_RE)
+    return f"""
+        WITH e AS (
+            SELECT CAST(id AS VARCHAR) AS listing_id, _ord,
+                   unnest(medias_arr) AS m, generate_subscripts(medias_arr, 1) AS k
+            FROM b
+        ), r AS (
+            SELECT *, m.{_q(url_field)} AS _url, row_number() OVER (ORDER BY _ord, k) AS _rn
+            FROM e WHERE m IS NOT NULL
+        ), x AS (
+            SELECT *, coalesce(regexp_matches(_url, {re_}), false) AS _casou,
+                   regexp_extract(_url, {re_}, 2) AS _key, regexp_extract(_url, {re_}, 3) AS _sfx
+            FROM r
+        ), s AS (
+            SELECT *,
+                   CASE WHEN _url IS NULL THEN NULL WHEN _casou THEN regexp_extract(_url, {re_}, 1) ELSE '' END AS _pfx,
+                   CASE WHEN _casou AND regexp_matches(_key, {hex_re}) THEN unhex(_key) END AS media_url_key,
+                   CASE WHEN _casou AND regexp_matches(_key, {hex_re}) THEN _sfx
+                        WHEN _casou THEN _key || _sfx ELSE _url END AS media_url_suffix
+            FROM x
+        ), p AS (
+            SELECT _pfx, CAST(row_number() OVER (ORDER BY min(_rn)) - 1 AS INTEGER) AS media_url_prefix_id
+            FROM s WHERE _pfx IS NOT NULL GROUP BY _pfx
+        )"""
+
+
+def _media_prefixes_query(schema: Dict[str, str]) -> Optional[str]:
+    fields = _struct_members(schema["medias_arr"]) if "medias_arr" in schema else {}
+    url_field = next((f for f in fields if MEDIAS_RENAME.get(f, f) == "media_url"), None)
+    if url_field is None:
+        return None
+    return f"""{_media_url_ctes(url_field)}
+        SELECT media_url_prefix_id, _pfx AS media_url_prefix FROM p ORDER BY media_url_prefix_id"""
+
+
+def _amenities_query(amen_col: str) -> str:
+    return f"""
+        WITH e AS (
+            SELECT CAST(id AS VARCHAR) AS listing_id, _ord,
+                   unnest({_q(amen_col)}) AS a, generate_subscripts({_q(amen_col)}, 1) AS k
+            FROM b
+        ), n AS (
+            SELECT e.listing_id, e._ord, e.k, e.a AS amenity_raw,
+                   CASE WHEN norm_str(e.a) IS NULL THEN NULL
+                        ELSE coalesce(am.value, snake(norm_str(e.a))) END AS amenity
+            FROM e LEFT JOIN amenity_map am ON am.key = upper(norm_str(e.a))
+            WHERE e.a IS NOT NULL
+        )
+        SELECT listing_id, amenity_raw, amenity FROM n
+        WHERE amenity IS NOT NULL
+        QUALIFY row_number() OVER (PARTITION BY listing_id, amenity ORDER BY _ord, k) = 1
+        ORDER BY _ord, k"""
+
+
+def build_silver_tables_duckdb(bronze_paths: List[str], outdir: str, parquet_profile: str = "default",
+                               compact_media_urls: bool = True):
+    storage.ensure_dir(outdir)
+
+    paths = []
+    for p in bronze_paths:
+        paths.extend(storage.glob(p))
+    if not paths:
+        raise FileNotFoundError("Nenhum arquivo Bronze encontrado pelos padrões fornecidos.")
+    # remotos passam pelo cache local; o DuckDB lê os arquivos locais em paralelo
+    local = [storage.local_path(p) for p in paths]
+
+    # fechar a conexão apaga os arquivos de spill que ela deixou no temp_directory
+    with connect() as con:
+        con.execute("CREATE TEMP TABLE files(name VARCHAR, idx INTEGER)")
+        con.executemany("INSERT INTO files VALUES (?, ?)", [(p, i) for i, p in enumerate(local)])
+        con.execute(f"""CREATE TEMP VIEW bronze AS
+            SELECT r.*, f.idx AS _file_idx
+            FROM read_parquet([{', '.join(_lit(p) for p in local)}], filename = true,
+                              file_row_number = true, union_by_name = true) r
+            JOIN files f ON r.filename = f.name""")
+        schema = _schema(con, "bronze")
+
+        if "id" not in schema:
+            print("⚠️ Aviso: A coluna 'id' não existe no Bronze, cannot gerar listing_id e tabelas explode.")
+            return
+
+        # dedup: último registro de cada id (updatedAt/createdAt desc, nulos por último; empate = ordem de leitura)
+        order = [f"{_q(c)} DESC NULLS LAST" for c in ("updatedAt_ts", "createdAt_ts") if c in schema]
+        order += ["_file_idx", "file_row_number"]
+        order_sql = ", ".join(order)
+        con.execute(f"""CREATE TEMP TABLE b AS
+            SELECT * EXCLUDE (filename, file_row_number, _file_idx),
+                   row_number() OVER (ORDER BY id, {order_sql}) AS _ord
+            FROM bronze
+            QUALIFY row_number() OVER (PARTITION BY id ORDER BY {order_sql}) = 1""")
+        schema = _schema(con, "b")
+
+        con.execute("CREATE TEMP TABLE amenity_map(key VARCHAR, value VARCHAR)")
+        con.executemany("INSERT INTO amenity_map VALUES (?, ?)", list(AMENITY_MAP.items()))
+
+        def out(name):
+            return storage.join(outdir, name)
+
+        _copy(con, _listings_query(schema), out("silver_listings.parquet"), parquet_profile)
+        counts = {"silver_listings.parquet": con.execute("SELECT count(*) FROM b").fetchone()[0]}
+
+        # Tabelas explode; quando não há dados, as mesmas colunas que o engine pandas escreve
+        q = _pricing_query(schema) if "pricinginfos_arr" in schema else None
+        empty_pricing = (["business_type", "price", "price_raw", "monthly_total_rent", "listing_id"]
+                         if "pricinginfos_arr" in schema else ["listing_id"])
+        q_medias = _medias_query(schema, compact_media_urls) if "medias_arr" in schema else None
+        empty_medias = (["media_id", "media_url", "media_type", "listing_id"]
+                        if "medias_arr" in schema else ["listing_id"])
+        amen_col = next((c for c in AMENITY_ARRAY_COLS if c in schema), None)
+        q_amen = _amenities_query(amen_col) if amen_col and schema[amen_col].endswith("[]") else None
+
+        tables = [("silver_pricing.parquet", q, empty_pricing),
+                  ("silver_medias.parquet", q_medias, empty_medias),
+                  ("silver_amenities.parquet", q_amen, ["listing_id", "amenity_raw", "amenity"])]
+        if compact_media_urls:
+            if q_medias is None and "medias_arr" in schema:
+                # mesmo vazio do pandas: media_url já na forma compacta
+                i = empty_medias.index("media_url")
+                empty_medias[i:i + 1] = ["media_url_prefix_id", "media_url_key", "media_url_suffix"]
+            tables.append((PREFIXES_TABLE, _media_prefixes_query(schema), ["media_url_prefix_id", "media_url_prefix"]))
+        for name, query, empty in tables:
+            n = con.execute(f"SELECT count(*) FROM ({query})").fetchone()[0] if query else 0
+            if n:
+                _copy(con, query, out(name), parquet_profile)
+            else:
+                _empty_copy(con, out(name), empty, parquet_profile)
+            counts[name] = n
+
+        print("✅ Silver (duckdb) gerado em:", outdir)
+        for name, n in counts.items():
+            print(f" - {name}: {n} linhas")
+
+
+# ---------- gold ----------
+
+def join_listings_pricing_duckdb(silver_path: str, out_path: str, business_type: str = "sale",
+                                 price_col_fallback: str = "price", parquet_profile: str = "default") -> str:
+    listings = storage.local_path(storage.join(silver_path, "silver_listings.parquet"))
+    pricing = storage.local_path(storage.join(silver_path, "silver_pricing.parquet"))
+
+    # fechar a conexão apaga os arquivos de spill que ela deixou no temp_directory
+    with connect() as con:
+        cols = _schema(con, f"read_parquet({_lit(pricing)})")
+        biz = business_type.lower()
+        if biz == "sale":
+            price_col = "price" if "price" in cols else price_col_fallback
+        else:
+            price_col = "monthly_total_rent" if "monthly_total_rent" in cols else price_col_fallback
+
+        where = [f"{_q(price_col)} IS NOT NULL"]
+        if "business_type" in cols:
+            where.append(f"lower(business_type) = {_lit(biz)}")
+
+        # uma linha por listing: a primeira (ordem do arquivo) entre as que sobram do filtro
+        query = f"""
+            WITH p AS (
+                SELECT listing_id, {_q(price_col)} AS target_price
+                FROM read_parquet({_lit(pricing)}, file_row_number = true)
+                WHERE {' AND '.join(where)}
+                QUALIFY row_number() OVER (PARTITION BY listing_id ORDER BY file_row_number) = 1
+            ), l AS (
+                SELECT * FROM read_parquet({_lit(listings)}, file_row_number = true)
+            )
+            SELECT l.* EXCLUDE (file_row_number), p.target_price
+            FROM l JOIN p ON l.listing_id = p.listing_id
+            ORDER BY l.file_row_number"""
+        _copy(con, query, out_path, parquet_profile)
+        return out_path
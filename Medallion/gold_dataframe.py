@@ -1,17 +1,41 @@
 import argparse
+import contextlib
 import pandas as pd
 import os
+import sys
 
+# Raiz do repo no path: os scripts rodam como `python Medallion/<camada>.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import storage  # noqa: E402
+
+# Copy-on-write (padrão no pandas 3): filtros e subconjuntos de colunas não copiam os dados.
+# No pandas 2 liga só durante o join (pd.option_context), não no import.
+@contextlib.contextmanager
+def _copy_on_write():
+    if int(pd.__version__.split(".")[0]) >= 3:
+        yield
+        return
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
+
+@_copy_on_write()
 def join_listings_pricing(silver_path: str,
                           out_path: str,
                           business_type: str = "sale",
-                          price_col_fallback: str = "price") -> str:
+                          price_col_fallback: str = "price",
+                          parquet_profile: str = "default",
+                          engine: str = "pandas") -> str:
     """
     Junta listings + pricing da camada Silver e salva em Parquet.
     """
+    if engine == "duckdb":
+        from duckdb_engine import join_listings_pricing_duckdb
+        return join_listings_pricing_duckdb(silver_path, out_path, business_type, price_col_fallback, parquet_profile)
+
     # lê dataframes
-    df_listings = pd.read_parquet(os.path.join(silver_path, "silver_listings.parquet"))
-    df_pricing  = pd.read_parquet(os.path.join(silver_path, "silver_pricing.parquet"))
+    df_listings = storage.read_parquet(storage.join(silver_path, "silver_listings.parquet"))
+    df_pricing  = storage.read_parquet(storage.join(silver_path, "silver_pricing.parquet"))
 
     biz = business_type.lower()
 
@@ -21,6 +45,9 @@ def join_listings_pricing(silver_path: str,
     else:
         price_col = "monthly_total_rent" if "monthly_total_rent" in df_pricing.columns else price_col_fallback
 
+    # só as colunas usadas daqui em diante: o sort e o dedup não carregam o resto do pricing
+    df_pricing = df_pricing[["listing_id", price_col] + (["business_type"] if "business_type" in df_pricing.columns else [])]
+
     # filtra por tipo de negócio (se existir a coluna)
     if "business_type" in df_pricing.columns:
         df_pricing = df_pricing[df_pricing["business_type"].str.lower() == biz]
@@ -30,7 +57,7 @@ def join_listings_pricing(silver_path: str,
 
     # uma linha por listing
     df_pricing = (
-        df_pricing.sort_values("listing_id")
+        df_pricing.sort_values("listing_id", kind="mergesort")  # estável: empate fica na ordem do arquivo
                   .drop_duplicates("listing_id", keep="first")
                   .rename(columns={price_col: "target_price"})
                   [["listing_id", "target_price"]]
@@ -40,10 +67,7 @@ def join_listings_pricing(silver_path: str,
     df_joined = df_listings.merge(df_pricing, on="listing_id", how="inner")
 
     # salva
-    # Só tenta criar pasta se NÃO for nuvem
-    if not out_path.startswith("gs://"):
-        os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    df_joined.to_parquet(out_path, index=False)
+    storage.write_parquet(df_joined, out_path, profile=parquet_profile, index=False)
 
     return out_path
 
@@ -53,11 +77,29 @@ def main():
     ap.add_argument("--silver", required=True, help="Diretório onde estão os Parquets da camada Silver")
     ap.add_argument("--out", required=True, help="Caminho do arquivo Parquet de saída")
     ap.add_argument("--business-type", default="sale", choices=["sale", "rental"], help="Tipo de negócio (sale|rental)")
+    ap.add_argument("--parquet-profile", default="default", choices=list(storage.PARQUET_PROFILES),
+                    help="Perfil de escrita do Parquet (codec, row groups, dicionário, ordenação)")
+    ap.add_argument("--engine", default="pandas", choices=["pandas", "duckdb"],
+                    help="pandas (padrão) ou duckdb (SQL sobre os Parquets)")
+    ap.add_argument("--stats-cube", default=None,
+                    help="Atualiza o cubo de estatísticas de mercado neste diretório/prefixo gs:// (market_stats.py)")
+    ap.add_argument("--comps-index", default=None,
+                    help="Atualiza o índice de imóveis comparáveis neste diretório/prefixo gs:// (comps.py)")
+    ap.add_argument("--stats-gold", nargs="+", default=None,
+                    help="Arquivos da gold que entram no cubo e no índice de comps (aceita glob; padrão: só o --out)")
     args = ap.parse_args()
 
-    out_file = join_listings_pricing(args.silver, args.out, business_type=args.business_type)
+    out_file = join_listings_pricing(args.silver, args.out, business_type=args.business_type,
+                                     parquet_profile=args.parquet_profile, engine=args.engine)
     print(f"✅ Silver join listings+pricing salvo em: {out_file}")
 
+    if args.stats_cube:
+        from market_stats import build_cube
+        build_cube(args.stats_gold or [out_file], args.stats_cube)
+    if args.comps_index:
+        from comps import build_index
+        build_index(args.stats_gold or [out_file], args.comps_index)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,160 @@
+"""
+URLs compactas da silver_medias.
+
+As fotos de um portal dividem poucos prefixos de CDN/template de redimensionamento:
+  https://resizedimgs.zapimoveis.com.br/{action}/{width}x{height}/named.images.sp/<hash>/<arquivo>.jpg
+  (prefixo até "named.images.sp/", chave = <hash>, sufixo = "/<arquivo>.jpg")
+A silver guarda cada URL em três partes:
+  media_url_prefix_id (int32)  -> dicionário silver_media_prefixes.parquet (-1 = URL nula)
+  media_url_key (binário)      -> penúltimo segmento, quando é hex minúsculo: 16 bytes no lugar de 32 caracteres
+  media_url_suffix (texto)     -> "/<arquivo>" (poucos nomes distintos: o Parquet codifica em dicionário)
+Segmento que não é hex fica no sufixo (chave nula); URL sem barras suficientes vira prefixo "" + sufixo inteiro.
+prefixo + hex(chave) + sufixo reconstrói a URL original byte a byte. Os ids dos prefixos seguem a ordem
+da primeira aparição, igual nos engines pandas e duckdb.
+
+Leitura: `load_medias(silver_dir)` devolve a tabela compacta e um MediaUrls, que só monta as URLs
+pedidas (uma linha, um recorte ou todas, via to_series()).
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+import storage
+
+URL_SPLIT_RE = r"^(?P<prefix>.*/)(?P<key>[^/]*)(?P<suffix>/[^/]*)$"
+KEY_HEX_RE = r"^(?:[0-9a-f]{2})+$"
+PREFIXES_TABLE = "silver_media_prefixes.parquet"
+MEDIAS_TABLE = "silver_medias.parquet"
+URL_COLUMNS = ["media_url_prefix_id", "media_url_key", "media_url_suffix"]
+
+_HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+# byte -> os dois dígitos hex como um uint16 (um gather por byte, em vez de dois)
+_HEX_PAIRS = np.ascontiguousarray(np.stack([_HEX_DIGITS[np.arange(256) >> 4], _HEX_DIGITS[np.arange(256) & 15]],
+                                           axis=1)).view(np.uint16).ravel()
+_HEX_VALUE = np.zeros(256, dtype=np.uint8)
+_HEX_VALUE[_HEX_DIGITS] = np.arange(16, dtype=np.uint8)
+
+
+def _offsets_and_data(arr: pa.Array) -> Tuple[np.ndarray, np.ndarray, Optional[pa.Buffer]]:
+    """Offsets a partir de 0, bytes e bitmap de validade (também para arrays fatiados, com offset)."""
+    offsets = np.frombuffer(arr.buffers()[1], dtype=np.int32)[arr.offset:arr.offset + len(arr) + 1]
+    data = np.frombuffer(arr.buffers()[2], dtype=np.uint8) if arr.buffers()[2] else np.zeros(0, np.uint8)
+    validity = pc.is_valid(arr).buffers()[1] if arr.null_count else None
+    return offsets - offsets[0], data[offsets[0]:offsets[-1]], validity
+
+
+def _unhex(arr: pa.StringArray) -> pa.BinaryArray:
+    """Strings hex minúsculas de tamanho par -> bytes, sem passar por objetos Python."""
+    # posições nulas podem guardar bytes (if_else): "" garante só hex de tamanho par nos dados
+    offsets, data, _ = _offsets_and_data(pc.fill_null(arr, ""))
+    validity = pc.is_valid(arr).buffers()[1] if arr.null_count else None
+    raw = (_HEX_VALUE[data[0::2]] << 4) | _HEX_VALUE[data[1::2]]
+    return pa.Array.from_buffers(pa.binary(), len(arr), [validity, pa.py_buffer(offsets // 2),
+                                                         pa.py_buffer(raw.tobytes())], arr.null_count)
+
+
+def _hex(arr: pa.BinaryArray) -> pa.StringArray:
+    """Bytes -> hex minúsculo, vetorizado."""
+    offsets, data, validity = _offsets_and_data(arr)
+    return pa.Array.from_buffers(pa.string(), len(arr), [validity, pa.py_buffer(offsets * 2),
+                                                         pa.py_buffer(_HEX_PAIRS[data].tobytes())], arr.null_count)
+
+
+def split_urls(urls: pd.Series) -> Tuple[np.ndarray, pa.BinaryArray, pa.StringArray, List[str]]:
+    """(ids de prefixo int32, chaves, sufixos, prefixos na ordem da primeira aparição)."""
+    arr = pa.array(urls.to_numpy(dtype=object), type=pa.string(), from_pandas=True)
+    parts = pc.extract_regex(arr, URL_SPLIT_RE)
+    casou = pc.fill_null(pc.is_valid(parts), False)
+    key = parts.field("key")
+    hexa = pc.and_(casou, pc.fill_null(pc.match_substring_regex(key, KEY_HEX_RE), False))
+    prefix = pc.if_else(casou, parts.field("prefix"), pc.if_else(pc.is_valid(arr), "", None))
+    suffix = pc.if_else(hexa, parts.field("suffix"),
+                        pc.if_else(casou, pc.binary_join_element_wise(key, parts.field("suffix"), ""), arr))
+    keys = _unhex(pc.if_else(hexa, key, pa.scalar(None, pa.string())))
+    ids, prefixes = pd.factorize(pd.Series(prefix.to_numpy(zero_copy_only=False), dtype=object))
+    return ids.astype(np.int32), keys, suffix, [str(p) for p in prefixes]
+
+
+def compact_medias(dfm: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Troca media_url pelas três colunas compactas, na mesma posição; devolve também o dicionário."""
+    if "media_url" not in dfm.columns:
+        return dfm, pd.DataFrame({"media_url_prefix_id": pd.Series(dtype=np.int32),
+                                  "media_url_prefix": pd.Series(dtype=object)})
+    ids, keys, suffixes, prefixes = split_urls(dfm["media_url"])
+    pos = dfm.columns.get_loc("media_url")
+    out = dfm.drop(columns=["media_url"])
+    out.insert(pos, "media_url_prefix_id", ids)
+    out.insert(pos + 1, "media_url_key", pd.Series(keys.to_numpy(zero_copy_only=False), index=dfm.index, dtype=object))
+    out.insert(pos + 2, "media_url_suffix",
+               pd.Series(suffixes.to_numpy(zero_copy_only=False), index=dfm.index, dtype=object))
+    return out, pd.DataFrame({"media_url_prefix_id": np.arange(len(prefixes), dtype=np.int32),
+                              "media_url_prefix": pd.Series(prefixes, dtype=object)})
+
+
+class MediaUrls:
+    """URLs montadas sob demanda: prefixo do dicionário + hex da chave + sufixo. Nada é materializado antes."""
+
+    def __init__(self, prefix_ids: np.ndarray, keys: pa.Array, suffixes: pa.Array, prefixes: List[str]):
+        self.prefix_ids = np.asarray(prefix_ids, dtype=np.int32)
+        self.keys = keys
+        self.suffixes = suffixes
+        self.prefixes = pa.array(prefixes, type=pa.string())
+
+    def __len__(self) -> int:
+        return len(self.prefix_ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, (int, np.integer)):
+            pid = self.prefix_ids[i]
+            if pid < 0:
+                return None
+            key = self.keys[i].as_py()
+            return self.prefixes[pid].as_py() + (key.hex() if key is not None else "") + self.suffixes[i].as_py()
+        return self.take(np.arange(len(self))[i])
+
+    def take(self, rows) -> List[Optional[str]]:
+        """URLs das linhas pedidas; URL nula vira None, como em m[i] (o to_series segue o pandas: NaN)."""
+        return MediaUrls(self.prefix_ids[rows], self.keys.take(pa.array(rows)), self.suffixes.take(pa.array(rows)),
+                         self.prefixes.to_pylist())._join().to_pylist()
+
+    def _join(self) -> pa.Array:
+        valido = pa.array(self.prefix_ids >= 0)
+        prefix = pc.if_else(valido, pc.take(self.prefixes, pa.array(np.maximum(self.prefix_ids, 0))),
+                            pa.scalar(None, pa.string()))
+        key = pc.fill_null(_hex(self.keys), "")
+        return pc.binary_join_element_wise(prefix, key, self.suffixes, "")
+
+    def to_series(self, index=None) -> pd.Series:
+        """Todas as URLs (vetorizado no Arrow)."""
+        # mesmo dtype de texto que o pd.read_parquet da media_url inteira, sem objetos Python no meio
+        out = self._join().to_pandas().rename("media_url")
+        if index is not None:
+            out.index = index
+        return out
+
+
+def load_medias(silver_dir: str, columns: Optional[List[str]] = None) -> Tuple[pd.DataFrame, MediaUrls]:
+    """
+    silver_medias compacta (sem as colunas da URL) + acessor das URLs.
+    Uma silver antiga, com media_url inteira, também serve: a URL é dividida na leitura.
+    """
+    uri = storage.join(silver_dir, MEDIAS_TABLE)
+    local = storage.local_path(uri)
+    names = pq.read_schema(local).names
+    if columns is not None:
+        columns = list(dict.fromkeys(list(columns) + [c for c in URL_COLUMNS + ["media_url"] if c in names]))
+    t = pq.read_table(local, columns=columns)
+    if "media_url" in names:
+        ids, keys, suffixes, prefixes = split_urls(t.column("media_url").to_pandas())
+        return t.drop(["media_url"]).to_pandas(), MediaUrls(ids, keys, suffixes, prefixes)
+    if not set(URL_COLUMNS) <= set(names):
+        return t.to_pandas(), MediaUrls(np.zeros(0, np.int32), pa.array([], pa.binary()), pa.array([], pa.string()), [])
+    prefixes = pq.read_table(storage.local_path(storage.join(silver_dir, PREFIXES_TABLE))).to_pandas()
+    prefixes = prefixes.sort_values("media_url_prefix_id")["media_url_prefix"].tolist()
+    urls = MediaUrls(t.column("media_url_prefix_id").to_numpy(), t.column("media_url_key").combine_chunks(),
+                     t.column("media_url_suffix").combine_chunks(), prefixes)
+    return t.drop(URL_COLUMNS).to_pandas(), urls
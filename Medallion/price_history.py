@@ -0,0 +1,211 @@
+"""
+Histórico de preços da silver: uma linha por (listing_id, business_type) sempre que preço, condomínio
+ou IPTU mudam entre raspagens.
+
+A dedup da silver guarda só o último registro de cada anúncio. Aqui, cada arquivo da bronze é um lote
+(uma raspagem) aplicado uma única vez. O lote vira uma linha por chave com um hash das colunas
+acompanhadas, que é comparado com o último hash guardado para a chave. Só as linhas novas ou alteradas
+são gravadas. O histórico é append-only e nunca é relido nem re-juntado.
+
+Layout (dentro do diretório da silver, local ou gs://):
+  price_history/part-<lote>.parquet        -> mudanças de um lote (o nome vem da versão do arquivo: reaplicar sobrescreve)
+  price_history/_state/state_<NN>.parquet  -> último hash/preço/observação por chave, em STATE_BUCKETS baldes
+  price_history/_state/batches.json        -> lotes já aplicados
+Os diretórios com "_" ficam de fora na leitura: pd.read_parquet("<silver>/price_history") devolve só o histórico.
+
+    python Medallion/price_history.py --bronze "bronze/listings_bronze_*.parquet" --silver silver/
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Raiz do repo no path: os scripts rodam como `python Medallion/<camada>.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import storage  # noqa: E402
+from silver_dataframe import PRICING_RENAME, _snake  # noqa: E402
+
+HISTORY_DIR = "price_history"
+STATE_DIR = "_state"
+BATCHES_FILE = "batches.json"
+# Estado particionado pelo hash do listing_id: um lote só lê/regrava os baldes que toca
+STATE_BUCKETS = 16
+KEY = ["listing_id", "business_type"]
+TRACKED_COLS = ["price", "monthly_condo_fee", "iptu", "yearly_iptu"]
+HISTORY_COLS = KEY + ["observed_at", "updated_at"] + TRACKED_COLS + ["previous_price", "change", "bronze_batch"]
+STATE_COLS = KEY + ["row_hash", "price", "observed_at"]
+
+
+def _money(col: pa.Array) -> np.ndarray:
+    """Mesma conversão do _to_decimal da silver ("1.234,56" -> 1234.56), vetorizada."""
+    if pa.types.is_integer(col.type) or pa.types.is_floating(col.type):
+        return col.to_numpy(zero_copy_only=False).astype(np.float64)
+    s = pc.replace_substring(pc.utf8_trim_whitespace(col.cast(pa.string())), ".", "")
+    s = pc.replace_substring(s, ",", ".")
+    return pd.to_numeric(pd.Series(s.to_numpy(zero_copy_only=False), dtype=object), errors="coerce").to_numpy(np.float64)
+
+
+def read_batch_pricing(path: str) -> pd.DataFrame:
+    """
+    Preços de um arquivo da bronze, uma linha por chave (o registro com updatedAt mais recente).
+    observed_at = momento da ingestão do lote (bronze_ingestion_ts).
+    """
+    local = storage.local_path(path)
+    names = pq.read_schema(local).names
+    if "pricinginfos_arr" not in names or "id" not in names:
+        return pd.DataFrame(columns=KEY + ["observed_at", "updated_at"] + TRACKED_COLS)
+    cols = [c for c in ("id", "updatedAt_ts", "bronze_ingestion_ts", "pricinginfos_arr") if c in names]
+    t = pq.read_table(local, columns=cols)
+
+    # lista de structs -> uma linha por item, sem passar por dicts Python
+    arr = t.column("pricinginfos_arr").combine_chunks()
+    parents = pc.list_parent_indices(arr).to_numpy()
+    items = pc.list_flatten(arr)
+    fields = {items.type.field(i).name: items.field(i) for i in range(items.type.num_fields)}
+
+    df = pd.DataFrame({"listing_id": t.column("id").take(parents).to_numpy(zero_copy_only=False).astype(str)})
+    btype = fields.get("businessType")
+    raw = pd.Series(btype.to_numpy(zero_copy_only=False) if btype is not None else [None] * len(df), dtype=object)
+    df["business_type"] = raw.map({v: _snake(v) for v in raw.dropna().unique()})
+    for src, dst in PRICING_RENAME.items():
+        if dst in TRACKED_COLS:
+            df[dst] = _money(fields[src]) if src in fields else np.nan
+    for col, dst, default in (("bronze_ingestion_ts", "observed_at", pd.Timestamp.now(tz="UTC")),
+                              ("updatedAt_ts", "updated_at", pd.NaT)):
+        df[dst] = t.column(col).take(parents).to_pandas() if col in names else default
+        df[dst] = pd.to_datetime(df[dst], utc=True)
+
+    df = df.dropna(subset=["business_type"])
+    # mesma chave repetida no lote (o scraper revisita anúncios): vale o updatedAt mais recente
+    df = df.sort_values(KEY + ["updated_at"], kind="mergesort", na_position="first")
+    return df.drop_duplicates(KEY, keep="last").reset_index(drop=True)
+
+
+def row_hashes(df: pd.DataFrame) -> np.ndarray:
+    """Hash estável (chave fixa do pandas) das colunas acompanhadas; NaN == NaN."""
+    return pd.util.hash_pandas_object(df[TRACKED_COLS], index=False).to_numpy()
+
+
+def buckets(listing_ids: pd.Series) -> np.ndarray:
+    return (pd.util.hash_pandas_object(listing_ids, index=False).to_numpy() % STATE_BUCKETS).astype(int)
+
+
+def _batch_id(path: str) -> str:
+    fs, p = storage.url_to_fs(path)
+    ident = f"{path}|{storage.fingerprint(fs.info(p))}"
+    return hashlib.sha256(ident.encode()).hexdigest()[:16]
+
+
+def _read_applied(history_uri: str) -> Dict[str, Any]:
+    fs, p = storage.url_to_fs(storage.join(history_uri, STATE_DIR, BATCHES_FILE))
+    if not fs.exists(p):
+        return {}
+    with fs.open(p, "r") as f:
+        return json.load(f)
+
+
+def _write_applied(history_uri: str, applied: Dict[str, Any]):
+    uri = storage.join(history_uri, STATE_DIR, BATCHES_FILE)
+    storage.ensure_parent(uri)
+    fs, p = storage.url_to_fs(uri)
+    with fs.open(p, "w") as f:
+        json.dump(applied, f, indent=2)
+
+
+def apply_batch(path: str, history_uri: str, batch_id: str) -> Dict[str, int]:
+    """
+    Compara um lote com o estado e grava as mudanças. Custo: o lote + os baldes de estado que ele toca.
+
+    Ordem de escrita: primeiro a parte do histórico (calculada com o estado anterior ao lote inteiro),
+    só depois os baldes de estado. Se o processo cair no meio dos baldes, a parte já está completa:
+    na reaplicação ela não é regravada (os baldes já atualizados não acusariam mais as mudanças), e
+    os baldes que faltaram são atualizados.
+    """
+    batch = read_batch_pricing(path)
+    batch["row_hash"] = row_hashes(batch)
+    batch_buckets = buckets(batch["listing_id"])
+
+    changes, novos_estados, stats = [], [], {"linhas": len(batch), "novas": 0, "alteradas": 0}
+    for b in np.unique(batch_buckets):
+        part = batch[batch_buckets == b]
+        state_uri = storage.join(history_uri, STATE_DIR, f"state_{b:02d}.parquet")
+        state = storage.read_parquet(state_uri) if storage.glob(state_uri) else pd.DataFrame(
+            {c: pd.Series(dtype=t) for c, t in (("listing_id", str), ("business_type", str), ("row_hash", "uint64"),
+                                               ("price", "float64"), ("observed_at", "datetime64[us, UTC]"))})
+        # o hash anterior vem por posição: no merge, um uint64 com faltantes viraria float
+        m = part.merge(state[KEY + ["price", "observed_at"]].assign(_pos=np.arange(len(state)))
+                       .rename(columns={"price": "previous_price", "observed_at": "prev_observed_at"}),
+                       on=KEY, how="left")
+        pos = m["_pos"].to_numpy(dtype=np.float64)
+        novo = np.isnan(pos)
+        prev_hash = state["row_hash"].to_numpy(dtype=np.uint64)[np.where(novo, 0, pos).astype(np.int64)] \
+            if len(state) else np.zeros(len(m), dtype=np.uint64)
+        # lote mais antigo que o estado (reprocessamento fora de ordem) não conta como mudança
+        recente = novo | (m["observed_at"] > m["prev_observed_at"]).to_numpy()
+        alterado = ~novo & recente & (m["row_hash"].to_numpy() != prev_hash)
+        stats["novas"] += int(novo.sum())
+        stats["alteradas"] += int(alterado.sum())
+        if (novo | alterado).any():
+            changes.append(m[novo | alterado].assign(change=np.where(novo[novo | alterado], "new", "changed")))
+
+        # estado: a última observação de cada chave (mudou ou não); gravado só depois do histórico
+        manter = np.ones(len(state), dtype=bool)
+        manter[pos[recente & ~novo].astype(np.int64)] = False
+        if recente.any():
+            novos_estados.append((state_uri, pd.concat([state[manter], m.loc[recente, STATE_COLS]], ignore_index=True)))
+
+    part_uri = storage.join(history_uri, f"part-{batch_id}.parquet")
+    if storage.glob(part_uri):
+        # reaplicação de um lote interrompido: a parte gravada antes do estado é a completa
+        gravada = storage.read_parquet(part_uri, columns=["change"])["change"]
+        stats["novas"], stats["alteradas"] = int((gravada == "new").sum()), int((gravada == "changed").sum())
+    elif changes:
+        hist = pd.concat(changes, ignore_index=True).assign(bronze_batch=os.path.basename(path))
+        storage.write_parquet(hist[HISTORY_COLS].sort_values(KEY, kind="mergesort"), part_uri, index=False)
+    for state_uri, state in novos_estados:
+        storage.write_parquet(state, state_uri, index=False)
+    return stats
+
+
+def update_price_history(bronze_paths: List[str], silver_dir: str) -> str:
+    """Aplica, em ordem de nome (o nome da bronze carrega o timestamp), os lotes ainda não aplicados."""
+    history_uri = storage.join(silver_dir, HISTORY_DIR)
+    paths = sorted({p for pattern in bronze_paths for p in storage.glob(pattern)})
+    if not paths:
+        raise FileNotFoundError("Nenhum arquivo Bronze encontrado pelos padrões fornecidos.")
+    applied = _read_applied(history_uri)
+    for path in paths:
+        batch_id = _batch_id(path)
+        if batch_id in applied:
+            continue
+        t0 = time.perf_counter()
+        stats = apply_batch(path, history_uri, batch_id)
+        # só depois das mudanças e do estado: lote interrompido no meio é reaplicado (ver apply_batch)
+        applied[batch_id] = {"bronze": path, "applied_at": pd.Timestamp.now(tz="UTC").isoformat(), **stats}
+        _write_applied(history_uri, applied)
+        print(f"   📈 Histórico de preços: {os.path.basename(path)} | {stats['linhas']} chaves, "
+              f"{stats['novas']} novas, {stats['alteradas']} com preço alterado | {time.perf_counter() - t0:.2f}s")
+    return history_uri
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Histórico de preços incremental (bronze -> silver/price_history)")
+    ap.add_argument("--bronze", required=True, nargs="+", help="Parquet(s) da bronze, um por raspagem (aceita glob)")
+    ap.add_argument("--silver", required=True, help="Diretório da silver (o histórico fica em price_history/)")
+    args = ap.parse_args()
+
+    out = update_price_history(args.bronze, args.silver)
+    print(f"✅ Histórico de preços atualizado em: {out}")
+
+
+if __name__ == "__main__":
+    main()
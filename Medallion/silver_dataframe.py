@@ -1,14 +1,31 @@
 import argparse
-import glob
+import contextlib
 import json
 import os
 import re
+import sys
 from typing import List, Optional, Any
 
 import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 from dateutil import parser as dtparser
 
+# Raiz do repo no path: os scripts rodam como `python Medallion/<camada>.py`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import storage  # noqa: E402
+from media_urls import PREFIXES_TABLE, compact_medias  # noqa: E402
+
+# Copy-on-write (padrão no pandas 3): subconjuntos de colunas e renomeações não copiam os dados.
+# No pandas 2 vale só dentro de build_silver_tables, sem mexer na opção global de quem importa.
+@contextlib.contextmanager
+def _copy_on_write():
+    if int(pd.__version__.split(".")[0]) >= 3:
+        yield
+        return
+    with pd.option_context("mode.copy_on_write", True):
+        yield
+
 # ---------- helpers ----------
 
 AMENITY_MAP = {
@@ -46,9 +63,150 @@ AMENITY_MAP = {
 }
 
 
+# Colunas de silver_listings: origem no bronze -> nome na silver (compartilhado pelos engines pandas e duckdb)
+LISTINGS_COLS_KEEP = {
+    "id": "listing_id",
+    "sourceId": "source_id",
+    "providerId": "provider_id",
+    "portal": "portal",
+    "account_id": "account_id",
+    "status": "status",
+    "statusEncoded": "status_encoded",
+    "listingType": "listing_type",
+    "publicationType": "publication_type",
+    "modality": "modality",
+    "contractType": "contract_type",
+    "propertyType": "property_type",
+    "usableAreas_num": "usable_area_m2",
+    "totalAreas": "total_area_raw",
+    "bedrooms_num": "bedrooms",
+    "suites_num": "suites",
+    "bathrooms_num": "bathrooms",
+    "parkingSpaces_num": "parking_spaces",
+    "unitFloor_num": "unit_floor",
+    "unitsOnTheFloor_num": "units_on_floor",
+    "buildings_num": "buildings",
+    "floors_num": "floors",
+    "createdAt_ts": "created_at",
+    "updatedAt_ts": "updated_at",
+    "deliveredAt_ts": "delivered_at",
+    "address_city": "address_city_raw",
+    "address_state": "address_state_raw",
+    "address_stateAcronym": "state_acronym",
+    "address_zone": "address_zone_raw",
+    "address_district": "address_district_raw",
+    "address_neighborhood": "address_neighborhood_raw",
+    "address_street": "address_street_raw",
+    "address_streetNumber": "address_number_raw",
+    "address_zipCode": "zip_code",
+    "address_point_lat_num": "lat",
+    "address_point_lon_num": "lon",
+    "title_clean": "title",
+    "description_clean": "description",
+    "qualityScores_lqsV3_num": "quality_lqs_v3",
+    "qualityScores_lqsBeta_num": "quality_lqs_beta",
+    "showPrice": "show_price",
+    "acceptExchange": "accept_exchange",
+    "transacted": "transacted",
+    # nomes reais depois do standardization_columns do bronze (só o último segmento:
+    # 'address.neighborhood' -> 'neighborhood', 'address.point.lat' -> 'lat')
+    "usableAreas": "usable_area_m2",
+    "bedrooms": "bedrooms",
+    "suites": "suites",
+    "bathrooms": "bathrooms",
+    "parkingSpaces": "parking_spaces",
+    "unitFloor": "unit_floor",
+    "unitsOnTheFloor": "units_on_floor",
+    "buildings": "buildings",
+    "floors": "floors",
+    "city": "address_city_raw",
+    "state": "address_state_raw",
+    "stateAcronym": "state_acronym",
+    "zone": "address_zone_raw",
+    "district": "address_district_raw",
+    "neighborhood": "address_neighborhood_raw",
+    "street": "address_street_raw",
+    "streetNumber": "address_number_raw",
+    "zipCode": "zip_code",
+    "lat": "lat",
+    "lon": "lon",
+    "title": "title",
+    "description": "description",
+}
+
+# Colunas categóricas de silver_listings normalizadas com _norm_str + _snake
+LISTINGS_SNAKE_COLS = ["status", "listing_type", "publication_type", "modality", "contract_type", "property_type"]
+
+PRICING_RENAME = {
+    "iptuPeriod": "iptu_period",
+    "businessType": "business_type",
+    "monthlyCondoFee": "monthly_condo_fee",
+    "yearlyIptu": "yearly_iptu",
+    "price": "price",
+    "iptu": "iptu",
+    "rentalInfo.period": "rental_period",
+    "rentalInfo.warranties": "rental_warranties",
+    "rentalInfo.monthlyRentalTotalPrice": "monthly_rental_total_price"
+}
+PRICING_MONEY_COLS = ["price", "iptu", "monthly_condo_fee", "yearly_iptu", "monthly_rental_total_price"]
+PRICING_SNAKE_COLS = ["business_type", "rental_period", "iptu_period"]
+MEDIAS_RENAME = {"id": "media_id", "url": "media_url", "type": "media_type"}
+# Primeira coluna de amenities encontrada no bronze é a usada
+AMENITY_ARRAY_COLS = ["mergedAmenities_arr", "amenities_arr", "aiAmenities_arr", "searchableAmenities_arr"]
+ENGINES = ["pandas", "duckdb"]
+# Listas de structs viram objetos Python (dicts) no pandas: são as colunas mais pesadas do bronze.
+# Ficam fora da leitura inicial e são lidas uma de cada vez, na hora de montar a tabela que as usa.
+NESTED_BRONZE_COLS = ["pricinginfos_arr", "medias_arr", *AMENITY_ARRAY_COLS]
+
+
+def present_listing_columns(columns) -> dict:
+    """Origem -> destino das colunas de listings que existem no bronze (a primeira origem de cada destino vence)."""
+    present = {}
+    for k, v in LISTINGS_COLS_KEEP.items():
+        if k in columns and v not in present.values():
+            present[k] = v
+    return present
+
+
+def bronze_columns_needed(columns) -> List[str]:
+    """Colunas escalares do bronze usadas pela silver (pandas); JSON cru e metadados da ingestão nem são lidos."""
+    needed = set(LISTINGS_COLS_KEEP) | {"id", "title", "updatedAt_ts", "createdAt_ts"}
+    return [c for c in columns if c in needed]
+
+
+def _read_bronze(paths: List[str]):
+    """(colunas escalares de todos os arquivos, nomes das colunas aninhadas presentes em algum deles)."""
+    frames, nested = [], set()
+    for p in paths:
+        local = storage.local_path(p)
+        names = pq.read_schema(local).names
+        frames.append(pd.read_parquet(local, columns=bronze_columns_needed(names)))
+        nested.update(c for c in NESTED_BRONZE_COLS if c in names)
+    return pd.concat(frames, ignore_index=True), nested
+
+
+def _read_nested(paths: List[str], col: str, ids: pd.Series) -> pd.DataFrame:
+    """
+    [id, col] para as linhas de `ids`. O índice de `ids` é a posição no concat dos arquivos
+    (como em _read_bronze); arquivos sem a coluna contribuem com nulos.
+    """
+    parts = []
+    for p in paths:
+        local = storage.local_path(p)
+        if col in pq.read_schema(local).names:
+            parts.append(pd.read_parquet(local, columns=[col])[col])
+        else:
+            parts.append(pd.Series([None] * pq.ParquetFile(local).metadata.num_rows, dtype=object))
+    values = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame({"id": ids, col: values.loc[ids.index]})
+
+
 def _to_decimal(x: Any) -> Optional[float]:
     if x is None or (isinstance(x, float) and np.isnan(x)):
         return None
+    # o bronze já converte colunas numéricas; "120.0" não pode passar pelo parser de "1.234,56"
+    if isinstance(x, (int, float, np.integer, np.floating)):
+        return float(x)
     s = str(x).strip().replace(".", "").replace(",", ".")  # suporta "1.234,56"
     try:
         return float(s)
@@ -71,6 +229,9 @@ def _norm_str(x: Any) -> Optional[str]:
 
 
 def _snake(s: Optional[str]) -> Optional[str]:
+    # no pandas 3 o apply numa coluna str devolve NaN (e não None) para os nulos
+    if s is None or (isinstance(s, float) and np.isnan(s)):
+        return None
     if not s:
         return s
     s = s.strip().lower()
@@ -122,12 +283,8 @@ def _explode_array(df: pd.DataFrame, col: str) -> pd.DataFrame:
             return []
         return [v]
 
-    df = df.copy()
-    # Aplica a função para garantir que todos os valores na coluna 'col' sejam listas
-    df[col] = df[col].apply(ensure_list)
-
-    # Explode apenas o ID e a coluna array
-    df_explode = df[["id", col]].explode(col, ignore_index=True)
+    # Explode apenas o ID e a coluna array (normalizada para lista); o df de entrada não é copiado
+    df_explode = df[["id"]].assign(**{col: df[col].apply(ensure_list)}).explode(col, ignore_index=True)
 
     # Filtra linhas onde o valor da coluna explode é nulo/vazio (e não era para ser explodido)
     df_explode = df_explode[~df_explode[col].isna()].reset_index(drop=True)
@@ -137,29 +294,31 @@ def _explode_array(df: pd.DataFrame, col: str) -> pd.DataFrame:
 
 # ---------- núcleo Silver ----------
 
-def build_silver_tables(bronze_paths: List[str], outdir: str):
-    os.makedirs(outdir, exist_ok=True)
+@_copy_on_write()
+def build_silver_tables(bronze_paths: List[str], outdir: str, parquet_profile: str = "default",
+                        engine: str = "pandas", compact_media_urls: bool = True):
+    if engine == "duckdb":
+        from duckdb_engine import build_silver_tables_duckdb
+        return build_silver_tables_duckdb(bronze_paths, outdir, parquet_profile, compact_media_urls)
 
-    # 1) leitura do bronze (um ou muitos arquivos)
+    storage.ensure_dir(outdir)
+
+    # 1) leitura do bronze (um ou muitos arquivos; glob vale para local e gs://)
     paths = []
     for p in bronze_paths:
-        if p.startswith("gs://"):
-            # Se for nuvem, adiciona o caminho direto (glob não funciona no GCS sem plugin extra)
-            paths.append(p)
-        else:
-            # Se for local, usa o glob para achar arquivos
-            paths.extend(glob.glob(p))
+        paths.extend(storage.glob(p))
     if not paths:
         raise FileNotFoundError("Nenhum arquivo Bronze encontrado pelos padrões fornecidos.")
-    dfb = pd.concat([pd.read_parquet(p) for p in paths], ignore_index=True)
+    dfb, nested = _read_bronze(paths)
 
     # 2) dedup *antes* de transformar
     dedup_col = "id" if "id" in dfb.columns else "title"
     if dedup_col in dfb.columns:
         sort_cols = [c for c in ["updatedAt_ts", "createdAt_ts"] if c in dfb.columns]
-        dfb = dfb.sort_values(by=[dedup_col] + sort_cols, ascending=[True] + [False] * len(sort_cols),
-                              kind="mergesort")
-        dfb = dfb.drop_duplicates(subset=[dedup_col], keep="first")
+        # ordena e deduplica só as chaves; o bronze inteiro é reordenado uma única vez no final
+        keys = dfb[[dedup_col] + sort_cols].sort_values(
+            by=[dedup_col] + sort_cols, ascending=[True] + [False] * len(sort_cols), kind="mergesort")
+        dfb = dfb.loc[keys.index[~keys[dedup_col].duplicated(keep="first")]]
 
     # Garante que 'id' exista para usar como 'listing_id'
     if 'id' not in dfb.columns:
@@ -169,59 +328,13 @@ def build_silver_tables(bronze_paths: List[str], outdir: str):
         # -------------------------
     # A) silver_listings (1:1)
     # -------------------------
-    listings_cols_keep = {
-        # ... (restante das colunas de listings_cols_keep omitidas por brevidade, mas o mapeamento é mantido)
-        "id": "listing_id",
-        "sourceId": "source_id",
-        "providerId": "provider_id",
-        "portal": "portal",
-        "account_id": "account_id",
-        "status": "status",
-        "statusEncoded": "status_encoded",
-        "listingType": "listing_type",
-        "publicationType": "publication_type",
-        "modality": "modality",
-        "contractType": "contract_type",
-        "propertyType": "property_type",
-        "usableAreas_num": "usable_area_m2",
-        "totalAreas": "total_area_raw",
-        "bedrooms_num": "bedrooms",
-        "suites_num": "suites",
-        "bathrooms_num": "bathrooms",
-        "parkingSpaces_num": "parking_spaces",
-        "unitFloor_num": "unit_floor",
-        "unitsOnTheFloor_num": "units_on_floor",
-        "buildings_num": "buildings",
-        "floors_num": "floors",
-        "createdAt_ts": "created_at",
-        "updatedAt_ts": "updated_at",
-        "deliveredAt_ts": "delivered_at",
-        "address_city": "address_city_raw",
-        "address_state": "address_state_raw",
-        "address_stateAcronym": "state_acronym",
-        "address_zone": "address_zone_raw",
-        "address_district": "address_district_raw",
-        "address_neighborhood": "address_neighborhood_raw",
-        "address_street": "address_street_raw",
-        "address_streetNumber": "address_number_raw",
-        "address_zipCode": "zip_code",
-        "address_point_lat_num": "lat",
-        "address_point_lon_num": "lon",
-        "title_clean": "title",
-        "description_clean": "description",
-        "qualityScores_lqsV3_num": "quality_lqs_v3",
-        "qualityScores_lqsBeta_num": "quality_lqs_beta",
-        "showPrice": "show_price",
-        "acceptExchange": "accept_exchange",
-        "transacted": "transacted",
-    }
-
-    # garante existência/renomeia
-    present = {k: v for k, v in listings_cols_keep.items() if k in dfb.columns}
-    dfl = dfb[list(present.keys())].rename(columns=present).copy()
+
+    # garante existência/renomeia (a primeira origem encontrada para cada destino vence)
+    present = present_listing_columns(dfb.columns)
+    dfl = dfb[list(present.keys())].set_axis(list(present.values()), axis=1)
 
     # normalizações leves
-    for c in ["status", "listing_type", "publication_type", "modality", "contract_type", "property_type"]:
+    for c in LISTINGS_SNAKE_COLS:
         if c in dfl.columns:
             dfl[c] = dfl[c].apply(_norm_str).apply(_snake)
 
@@ -250,36 +363,27 @@ def build_silver_tables(bronze_paths: List[str], outdir: str):
 
     # Ajuste para minúsculo para garantir que encontra a coluna do Bronze
     # Bloco corrigido
-    if "pricinginfos_arr" in dfb.columns:
+    if "pricinginfos_arr" in nested:
         # Usa 'id' (porque vem do Bronze) e 'pricinginfos_arr' (minúsculo corrigido)
-        dfp_temp = _explode_array(dfb[["id", "pricinginfos_arr"]], "pricinginfos_arr")
+        dfp_temp = _explode_array(_read_nested(paths, "pricinginfos_arr", dfb["id"]), "pricinginfos_arr")
 
         if not dfp_temp.empty and any(isinstance(x, dict) for x in dfp_temp["pricinginfos_arr"].dropna()):
-            pi = pd.json_normalize(dfp_temp["pricinginfos_arr"]).rename(columns={
-                "iptuPeriod": "iptu_period",
-                "businessType": "business_type",
-                "monthlyCondoFee": "monthly_condo_fee",
-                "yearlyIptu": "yearly_iptu",
-                "price": "price",
-                "iptu": "iptu",
-                "rentalInfo.period": "rental_period",
-                "rentalInfo.warranties": "rental_warranties",
-                "rentalInfo.monthlyRentalTotalPrice": "monthly_rental_total_price"
-            })
+            pi = pd.json_normalize(dfp_temp["pricinginfos_arr"]).rename(columns=PRICING_RENAME)
             # Aqui sim removemos a coluna array e juntamos
             dfp = pd.concat([dfp_temp.drop(columns=["pricinginfos_arr"]), pi], axis=1)
+            del dfp_temp, pi  # libera os dicts explodidos antes das próximas tabelas
             # AQUI acontece a mágica: o 'id' vira 'listing_id'
-            dfp = dfp.rename(columns={"id": "listing_id"}).copy()
+            dfp = dfp.rename(columns={"id": "listing_id"})
 
 
             # tipagem monetária (float)
-            for col in ["price", "iptu", "monthly_condo_fee", "yearly_iptu", "monthly_rental_total_price"]:
+            for col in PRICING_MONEY_COLS:
                 if col in dfp.columns:
                     dfp[col + "_raw"] = dfp[col].astype(str).replace('<NA>', None)
                     dfp[col] = dfp[col].apply(_to_decimal)
 
             # normaliza businessType/period
-            for col in ["business_type", "rental_period", "iptu_period"]:
+            for col in PRICING_SNAKE_COLS:
                 if col in dfp.columns:
                     dfp[col] = dfp[col].apply(_norm_str).apply(_snake)
 
@@ -303,7 +407,7 @@ def build_silver_tables(bronze_paths: List[str], outdir: str):
                 return (base or 0.0) + condo + (iptu_m or 0.0)
 
             dfp["monthly_total_rent"] = dfp.apply(_aluguel_total, axis=1)
-            dfp = dfp[["listing_id"] + [c for c in dfp.columns if c != "listing_id"]].copy()
+            dfp = dfp[["listing_id"] + [c for c in dfp.columns if c != "listing_id"]]
 
         else:
             # Garante que o dfp vazio tenha as colunas mínimas esperadas se o explode falhar ou for vazio
@@ -316,18 +420,18 @@ def build_silver_tables(bronze_paths: List[str], outdir: str):
     # 💡 CORREÇÃO DE EXPLODE E NORMALIZAÇÃO
     dfm = pd.DataFrame(columns=["listing_id"])
 
-    if "medias_arr" in dfb.columns:
-        dfm_temp = _explode_array(dfb[["id", "medias_arr"]], "medias_arr")
+    if "medias_arr" in nested:
+        dfm_temp = _explode_array(_read_nested(paths, "medias_arr", dfb["id"]), "medias_arr")
 
         if not dfm_temp.empty and any(isinstance(x, dict) for x in dfm_temp["medias_arr"].dropna()):
-            mi = pd.json_normalize(dfm_temp["medias_arr"]).rename(
-                columns={"id": "media_id", "url": "media_url", "type": "media_type"})
+            mi = pd.json_normalize(dfm_temp["medias_arr"]).rename(columns=MEDIAS_RENAME)
             dfm = pd.concat([dfm_temp.drop(columns=["medias_arr"]), mi], axis=1)
+            del dfm_temp, mi
             dfm = dfm.rename(columns={"id": "listing_id"})
 
             if "media_type" in dfm.columns:
                 dfm["media_type"] = dfm["media_type"].apply(_norm_str).apply(_snake)
-            dfm = dfm[["listing_id"] + [c for c in dfm.columns if c != "listing_id"]].copy()
+            dfm = dfm[["listing_id"] + [c for c in dfm.columns if c != "listing_id"]]
 
         else:
             expected_cols = ["listing_id", "media_id", "media_url", "media_type"]
@@ -340,14 +444,14 @@ def build_silver_tables(bronze_paths: List[str], outdir: str):
     dfa = pd.DataFrame(columns=["listing_id", "amenity"])
 
     amen_col = None
-    for c in ["mergedAmenities_arr", "amenities_arr", "aiAmenities_arr", "searchableAmenities_arr"]:
-        if c in dfb.columns:
+    for c in AMENITY_ARRAY_COLS:
+        if c in nested:
             amen_col = c
             break
 
     if amen_col:
         # Explode para criar uma linha por amenity
-        dfa_temp = _explode_array(dfb[["id", amen_col]], amen_col)
+        dfa_temp = _explode_array(_read_nested(paths, amen_col, dfb["id"]), amen_col)
 
         if not dfa_temp.empty:
             dfa = dfa_temp.rename(columns={amen_col: "amenity_raw", "id": "listing_id"})
@@ -395,7 +499,7 @@ def build_silver_tables(bronze_paths: List[str], outdir: str):
     # O código abaixo **não particiona** no sentido de *hive-style partitioning* (pastas),
     # mas garante que os dados estão logicamente separados em tabelas (o objetivo Silver).
 
-    dfl.to_parquet(os.path.join(outdir, "silver_listings.parquet"), engine="pyarrow", index=False)
+    storage.write_parquet(dfl, storage.join(outdir, "silver_listings.parquet"), profile=parquet_profile, engine="pyarrow", index=False)
 
     # Garante as colunas para evitar erro de concatenação/schema
     if dfp.empty:
@@ -405,9 +509,13 @@ def build_silver_tables(bronze_paths: List[str], outdir: str):
     if dfa.empty:
         dfa = pd.DataFrame(columns=['listing_id', 'amenity_raw', 'amenity'])
 
-    dfp.to_parquet(os.path.join(outdir, "silver_pricing.parquet"), engine="pyarrow", index=False)
-    dfm.to_parquet(os.path.join(outdir, "silver_medias.parquet"), engine="pyarrow", index=False)
-    dfa.to_parquet(os.path.join(outdir, "silver_amenities.parquet"), engine="pyarrow", index=False)
+    storage.write_parquet(dfp, storage.join(outdir, "silver_pricing.parquet"), profile=parquet_profile, engine="pyarrow", index=False)
+    if compact_media_urls:
+        # media_url -> id do prefixo (CDN/template) + chave binária + sufixo; dicionário em silver_media_prefixes (media_urls.py)
+        dfm, dfmp = compact_medias(dfm)
+        storage.write_parquet(dfmp, storage.join(outdir, PREFIXES_TABLE), profile=parquet_profile, engine="pyarrow", index=False)
+    storage.write_parquet(dfm, storage.join(outdir, "silver_medias.parquet"), profile=parquet_profile, engine="pyarrow", index=False)
+    storage.write_parquet(dfa, storage.join(outdir, "silver_amenities.parquet"), profile=parquet_profile, engine="pyarrow", index=False)
 
     print("✅ Silver gerado em:", outdir)
     print(" - silver_listings.parquet:", len(dfl), "linhas")
@@ -423,9 +531,21 @@ def main():
     ap.add_argument("--bronze", required=True, nargs="+",
                     help="Caminho(s) para Parquet do Bronze (aceita glob, ex: /lake/bronze/listings/*.parquet)")
     ap.add_argument("--outdir", required=True, help="Diretório de saída para as tabelas Silver (Parquet)")
+    ap.add_argument("--parquet-profile", default="default", choices=list(storage.PARQUET_PROFILES),
+                    help="Perfil de escrita do Parquet (codec, row groups, dicionário, ordenação)")
+    ap.add_argument("--engine", default="pandas", choices=ENGINES,
+                    help="pandas (padrão) ou duckdb (SQL sobre os Parquets, multi-thread e out-of-core)")
+    ap.add_argument("--full-media-urls", action="store_true",
+                    help="Grava media_url inteira em silver_medias (padrão: prefixo no dicionário + chave + sufixo)")
+    ap.add_argument("--price-history", action="store_true",
+                    help="Atualiza também <outdir>/price_history com os lotes da bronze ainda não aplicados")
     args = ap.parse_args()
 
-    build_silver_tables(args.bronze, args.outdir)
+    build_silver_tables(args.bronze, args.outdir, parquet_profile=args.parquet_profile, engine=args.engine,
+                        compact_media_urls=not args.full_media_urls)
+    if args.price_history:
+        from price_history import update_price_history
+        update_price_history(args.bronze, args.outdir)
 
 
 if __name__ == "__main__":
@@ -1,98 +1,399 @@
+import io
+import json
 import os
-import joblib
-import pandas as pd
-import gcsfs
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+import time
+from typing import List, Optional, get_args
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, ValidationError
 from contextlib import asynccontextmanager
 
+import metrics
+from comps import CompsIndex, DEFAULT_K, MAX_K
+from market_stats import MarketCube
+from model_loader import ModelLoader, MODEL_CACHE_DIR
+from prediction_cache import PredictionCache
+
 # --- CONFIGURAÇÕES ---
 # Nome do Bucket e caminhos
 BUCKET_NAME = "datalake-imoveis-pdm-2025"  # <--- CONFIRA SE ESTÁ CERTO
-MODEL_CLOUD_PATH = f"gs://{BUCKET_NAME}/models/model_imoveis_xgb.pkl"
-MODEL_LOCAL_PATH = "model_imoveis_xgb.pkl"
+# Ordem de preferência: formato nativo do XGBoost e, se não existir, o pickle antigo.
+# MODEL_URI permite apontar para um diretório local no lugar do bucket (testes/dev).
+MODEL_URIS = (
+    [os.environ["MODEL_URI"]] if os.getenv("MODEL_URI") else [
+        f"gs://{BUCKET_NAME}/models/model_imoveis_xgb.ubj",
+        f"gs://{BUCKET_NAME}/models/model_imoveis_xgb.pkl",
+    ]
+)
+# Registry versionado (ponteiro 'latest'); os URIs acima ficam como fallback
+MODEL_REGISTRY_URI = os.getenv("MODEL_REGISTRY_URI", f"gs://{BUCKET_NAME}/models/registry")
+# Intervalo de polling do registry para hot reload (0 desliga)
+MODEL_POLL_SECONDS = float(os.getenv("MODEL_POLL_SECONDS", "300"))
+# eager | background | lazy
+MODEL_LOAD_MODE = os.getenv("MODEL_LOAD_MODE", "background")
+# Limite de itens por chamada do /predict/batch (protege memória da instância)
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "100000"))
+DEFAULT_PROPERTY_TYPE = "APARTMENT"
+# Cache de previsões: 0 desliga. A área é arredondada para PREDICTION_CACHE_AREA_DECIMALS casas.
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "50000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+PREDICTION_CACHE_AREA_DECIMALS = int(os.getenv("PREDICTION_CACHE_AREA_DECIMALS", "1"))
+# Cubo de estatísticas de mercado (market_stats.py), publicado pela gold; vazio desliga o /stats
+MARKET_CUBE_URI = os.getenv("MARKET_CUBE_URI", f"gs://{BUCKET_NAME}/stats/market_cube")
+MARKET_CUBE_POLL_SECONDS = float(os.getenv("MARKET_CUBE_POLL_SECONDS", "300"))
+# Índice de comparáveis (comps.py), publicado pela gold; vazio desliga o /comps
+COMPS_INDEX_URI = os.getenv("COMPS_INDEX_URI", f"gs://{BUCKET_NAME}/stats/comps_index")
+COMPS_POLL_SECONDS = float(os.getenv("COMPS_POLL_SECONDS", "300"))
+# gunicorn --preload (start.sh com WEB_CONCURRENCY > 1): modelo carregado no mestre, sem polling nos workers
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD") == "1"
+
+# Carregador do modelo (o modelo em si fica em loader.model)
+loader = ModelLoader(MODEL_URIS, MODEL_CACHE_DIR, MODEL_REGISTRY_URI or None)
+# Multi-worker (gunicorn --preload): o modelo é carregado uma vez no processo mestre,
+# antes do fork, e os workers compartilham as páginas do booster via copy-on-write.
+if MODEL_PRELOAD:
+    loader.load()
 
-# Variável global para guardar o modelo na memória
-model = None
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, PREDICTION_CACHE_AREA_DECIMALS)
+market_cube = MarketCube(MARKET_CUBE_URI) if MARKET_CUBE_URI else None
+comps_index = CompsIndex(COMPS_INDEX_URI) if COMPS_INDEX_URI else None
 
 # --- ESTRUTURA DOS DADOS DE ENTRADA ---
 class ImovelInput(BaseModel):
     total_area_m2: float
-    property_type_slug: str = "APARTMENT" # Ex: 'APARTMENT', 'HOME', 'UNIT'
+    property_type_slug: str = DEFAULT_PROPERTY_TYPE # Ex: 'APARTMENT', 'HOME', 'UNIT'
+    # Opcionais: usados pelos modelos treinados com --features wide (ausente = missing)
+    usable_area_m2: Optional[float] = None
+    bedrooms: Optional[float] = None
+    suites: Optional[float] = None
+    bathrooms: Optional[float] = None
+    parking_spaces: Optional[float] = None
+    unit_floor: Optional[float] = None
+    lat: Optional[float] = None
+    lon: Optional[float] = None
+    neighborhood: Optional[str] = None
+    amenities: Optional[List[str]] = None
+    # Opcionais: usados pelos modelos treinados com --text-features (hashing, sem vocabulário)
+    title: Optional[str] = None
+    description: Optional[str] = None
+
+# --- FEATURES ---
+# Campos da entrada -> colunas do pipeline de features (feature_pipeline.json do modelo ativo).
+# A codificação (vocabulário e ordem das colunas) vem do treino; a API não adivinha nada.
+INPUT_TO_FEATURE = {"property_type_slug": "property_type", "neighborhood": "address_neighborhood_raw"}
+
+def to_features(cols: dict) -> dict:
+    return {INPUT_TO_FEATURE.get(k, k): v for k, v in cols.items()}
+
+def encode_one(pipeline, record: dict) -> np.ndarray:
+    # Uma linha nova por requisição (uma alocação, como a cópia que um buffer compartilhado exigiria):
+    # segue sem cópia para a thread da inferência e nenhuma requisição concorrente escreve nela
+    return pipeline.transform_one(record)
+
+def predict_array(active, X: np.ndarray, data: Optional[dict] = None, endpoint: str = "predict") -> np.ndarray:
+    # Backend compilado ou booster (LoadedModel.predict); com texto, X vira CSR [densas | hashing]
+    t0 = time.perf_counter()
+    if active.pipeline.text:
+        X = active.pipeline.with_text(X, data)
+    precos = active.predict(X)
+    metrics.INFERENCE_SECONDS.observe(time.perf_counter() - t0, endpoint)
+    return precos
+
+def json_response(body: dict, endpoint: str, t0: float) -> JSONResponse:
+    # mesmo JSON que o FastAPI geraria para o dict; t0 marca o início da montagem da resposta
+    resposta = JSONResponse(body)
+    metrics.SERIALIZATION_SECONDS.observe(time.perf_counter() - t0, endpoint)
+    return resposta
+
+def arrow_column(column, name: str, field):
+    """
+    Coluna do stream Arrow com as regras do ImovelInput: nulo só em campo Optional, número (ou texto
+    numérico) nos campos float, texto nos str e lista de textos em amenities. Fora disso, ValueError/TypeError.
+    """
+    import pyarrow as pa
+    import pyarrow.types as pat
+
+    args = get_args(field.annotation)
+    opcional = type(None) in args
+    tipo = next(a for a in args if a is not type(None)) if opcional else field.annotation
+    if column.null_count and not opcional:
+        linha = column.is_null().to_pylist().index(True)
+        raise ValueError(f"Coluna '{name}' com nulo na linha {linha} (campo obrigatório).")
+
+    if pat.is_dictionary(column.type):
+        column = column.cast(column.type.value_type)
+    origem = column.type
+    texto = pat.is_string(origem) or pat.is_large_string(origem) or pat.is_null(origem)
+    if tipo is float:
+        aceito = texto or pat.is_integer(origem) or pat.is_floating(origem) or pat.is_decimal(origem) \
+            or pat.is_boolean(origem)
+        destino = pa.float64()
+    elif tipo is str:
+        aceito, destino = texto, pa.string()
+    else:  # List[str]
+        aceito = pat.is_null(origem) or ((pat.is_list(origem) or pat.is_large_list(origem))
+                                         and (pat.is_string(origem.value_type) or pat.is_large_string(origem.value_type)))
+        destino = pa.list_(pa.string())
+    if not aceito:
+        raise TypeError(f"Coluna '{name}' do tipo {column.type} não é {destino}.")
+    try:
+        column = column.cast(destino)
+    except pa.ArrowException as e:
+        raise ValueError(f"Coluna '{name}' não converte para {destino}: {e}") from None
+    # float vira array (nulo -> NaN, como o ausente do JSON no pipeline); texto e listas, objetos Python
+    return column.to_numpy() if tipo is float else column.to_pylist()
+
+def parse_batch_body(body: bytes, content_type: str) -> dict:
+    """
+    Aceita JSON (lista de ImovelInput), NDJSON (um objeto por linha)
+    ou Arrow IPC stream (uma coluna por campo do ImovelInput, validada por arrow_column).
+    Retorna dict campo -> lista/array de valores.
+    """
+    fields = ImovelInput.model_fields
+    if "arrow" in content_type:
+        import pyarrow.ipc as ipc
+        table = ipc.open_stream(io.BytesIO(body)).read_all()
+        cols = {}
+        for name, field in fields.items():
+            if name in table.column_names:
+                cols[name] = arrow_column(table.column(name), name, field)
+            elif field.is_required():
+                raise ValueError(f"Coluna '{name}' ausente no stream Arrow.")
+            else:
+                cols[name] = [field.default] * table.num_rows
+        return cols
+
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        records = [json.loads(line) for line in body.splitlines() if line.strip()]
+    else:
+        records = json.loads(body)
+        if not isinstance(records, list):
+            raise ValueError("O corpo deve ser uma lista de imóveis.")
+
+    itens = [ImovelInput(**r) for r in records]
+    return {name: [getattr(i, name) for i in itens] for name in fields}
 
 # --- CICLO DE VIDA (LIGAR/DESLIGAR) ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Isso roda quando a API liga
-    global model
-    print("⏳ [API] Inicializando... Baixando modelo do Data Lake...")
-    
-    try:
-        # Baixa o modelo do Google Cloud Storage
-        fs = gcsfs.GCSFileSystem()
-        if fs.exists(MODEL_CLOUD_PATH):
-            fs.get(MODEL_CLOUD_PATH, MODEL_LOCAL_PATH)
-            print("   ⬇️ Download concluído.")
-            
-            # Carrega o modelo na memória RAM
-            model = joblib.load(MODEL_LOCAL_PATH)
-            print("   🧠 Cérebro da IA carregado com sucesso!")
-            
-            # Remove arquivo temporário para limpar disco
-            if os.path.exists(MODEL_LOCAL_PATH):
-                os.remove(MODEL_LOCAL_PATH)
-        else:
-            print(f"   ❌ Erro: Modelo não encontrado em {MODEL_CLOUD_PATH}")
-    except Exception as e:
-        print(f"   ❌ Falha crítica ao carregar modelo: {e}")
+    t0 = time.perf_counter()
+    print(f"⏳ [API] Inicializando... Carregando modelo do Data Lake (modo {MODEL_LOAD_MODE})...")
+
+    loader.start(MODEL_LOAD_MODE)
+    if loader.model is not None:
+        hit = "cache local" if loader.info["cache_hit"] else "download"
+        print(f"   🧠 Cérebro da IA carregado ({hit}, {loader.info['format']}, versão {loader.version}) "
+              f"| startup em {time.perf_counter() - t0:.3f}s")
+    if MODEL_PRELOAD:
+        # Um reload por worker daria a cada um o seu booster (fim do copy-on-write) e um polling por worker
+        # no registry. Versões novas entram com HUP no mestre do gunicorn (gunicorn.conf.py).
+        print("   🔁 --preload: polling desligado no worker; versões novas entram com `kill -HUP` no mestre")
+    else:
+        loader.start_polling(MODEL_POLL_SECONDS)
+    if market_cube:
+        market_cube.start(background=True)
+        if not MODEL_PRELOAD:
+            market_cube.start_polling(MARKET_CUBE_POLL_SECONDS)
+    if comps_index:
+        comps_index.start(background=True)
+        if not MODEL_PRELOAD:
+            comps_index.start_polling(COMPS_POLL_SECONDS)
 
     yield
+    loader.stop()
+    if market_cube:
+        market_cube.stop()
+    if comps_index:
+        comps_index.stop()
     # Isso roda quando a API desliga (limpeza)
     print("🛑 [API] Desligando...")
 
 # --- INICIALIZA O APP ---
 app = FastAPI(title="API Previsão Imóveis", lifespan=lifespan)
+# Latência por rota, status e requisições em andamento (GET /metrics)
+app.add_middleware(metrics.MetricsMiddleware)
 
 # --- ROTAS ---
 
 @app.get("/")
 def home():
-    return {"status": "online", "message": "API de Imóveis rodando! Acesse /docs para testar."}
+    return {
+        "status": "online",
+        "message": "API de Imóveis rodando! Acesse /docs para testar.",
+        "modelo_carregado": loader.model is not None,
+        "modelo": loader.info,
+    }
+
+@app.get("/ready")
+def ready():
+    """
+    Readiness (probe do Cloud Run / balanceador): 200 só com o modelo carregado e aquecido,
+    503 enquanto carrega ou se a carga falhou. Não dispara a carga, nem no modo lazy.
+    """
+    active = loader.active
+    corpo = {
+        "pronto": active is not None,
+        "modo": MODEL_LOAD_MODE,
+        "versao": active.version if active else None,
+        "backend": active.info.get("backend") if active else None,
+        "load_seconds": active.info.get("load_seconds") if active else None,
+        "warmup_seconds": active.info.get("warmup_seconds") if active else None,
+        "erro": loader.error,
+    }
+    return corpo if active is not None else JSONResponse(status_code=503, content=corpo)
+
+@app.get("/model")
+def model_info():
+    # versão ativa, tempos de carga e memória (RSS do processo após a carga)
+    return {
+        "carregado": loader.model is not None,
+        "registry": loader.registry_uri,
+        "reloads": loader.reloads,
+        "erro": loader.error,
+        **loader.info,
+    }
 
 @app.post("/predict")
-def predict(imovel: ImovelInput):
-    if not model:
+async def predict(imovel: ImovelInput):
+    # snapshot único: modelo e versão sempre coerentes mesmo se houver hot reload no meio
+    active = loader.active or await run_in_threadpool(loader.get)
+    if not active:
         raise HTTPException(status_code=500, detail="Modelo de IA não está carregado.")
 
     # 1. Tratamento dos dados (Feature Engineering em Tempo Real)
-    # Precisamos converter o texto 'APARTMENT' para número, igual fizemos no treino
-    # Como não temos o dicionário exato, vamos fazer uma aproximação simples para funcionar
-    tipo_code = 0 # Default
     tipo = imovel.property_type_slug.upper()
-    
-    if "HOME" in tipo or "CASA" in tipo:
-        tipo_code = 1
-    elif "UNIT" in tipo or "CONJUNTO" in tipo:
-        tipo_code = 2
-    # Apartment/Outros fica como 0
-
-    # 2. Monta o DataFrame igual ao usado no treino
-    # A ordem das colunas DEVE ser a mesma do treino: ['total_area_m2', 'property_type_code']
-    input_data = pd.DataFrame([[imovel.total_area_m2, tipo_code]], 
-                              columns=['total_area_m2', 'property_type_code'])
-
-    # 3. Faz a previsão
+
+    record = to_features(imovel.model_dump())
+    record["total_area_m2"] = prediction_cache.normalize_area(imovel.total_area_m2)
+    X = encode_one(active.pipeline, record)
+
+    # 2. Consulta o cache (chave = vetor de features normalizado, por versão do modelo)
+    key = X.tobytes()
+    if active.pipeline.text:
+        key += json.dumps([record.get(c) for c in active.pipeline.text["columns"]]).encode()
+    preco_estimado = prediction_cache.get(key, active.version)
+
+    # 3. Faz a previsão fora do event loop
     try:
-        preco_estimado = model.predict(input_data)[0]
-        return {
+        if preco_estimado is None:
+            preco = await run_in_threadpool(predict_array, active, X, {k: [v] for k, v in record.items()})
+            preco_estimado = float(preco[0])
+            prediction_cache.put(key, preco_estimado, active.version)
+        t0 = time.perf_counter()
+        return json_response({
             "area_m2": imovel.total_area_m2,
             "tipo": tipo,
             "preco_previsto": float(round(preco_estimado, 2)),
             "mensagem": f"O valor estimado para este imóvel é R$ {preco_estimado:,.2f}"
-        }
+        }, "predict", t0)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro na previsão: {str(e)}")
 
+@app.get("/cache/stats")
+def cache_stats():
+    return prediction_cache.stats()
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Métricas no formato texto do Prometheus. Modelo e cache são lidos aqui, na hora do scrape."""
+    active = loader.active
+    metrics.MODEL_INFO.clear()
+    if active is not None:
+        metrics.MODEL_INFO.set(1, active.version, active.info.get("backend", "xgboost"))
+        metrics.MODEL_LOAD_SECONDS.set(active.info.get("load_seconds", 0))
+        metrics.MODEL_WARMUP_SECONDS.set(active.info.get("warmup_seconds", 0))
+    metrics.MODEL_LOADED.set(1 if active is not None else 0)
+    metrics.MODEL_RELOADS.set_total(loader.reloads)
+    cache = prediction_cache.stats()
+    metrics.CACHE_EVENTS.set_total(cache["hits"], "hit")
+    metrics.CACHE_EVENTS.set_total(cache["misses"], "miss")
+    metrics.CACHE_SIZE.set(cache["size"])
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/stats")
+async def stats(city: Optional[str] = None, neighborhood: Optional[str] = None,
+                property_type: Optional[str] = None, bedrooms: Optional[str] = None):
+    """
+    Estatísticas de mercado (n, média e quantis de preço e preço/m²) do cubo pré-computado.
+    Filtro omitido = todas as categorias daquela dimensão. Sem I/O: a célula vem do mmap.
+    """
+    resultado = market_cube.query(city=city, neighborhood=neighborhood, property_type=property_type,
+                                  bedrooms=bedrooms) if market_cube else None
+    if resultado is None:
+        erro = market_cube.error if market_cube else "MARKET_CUBE_URI não configurado"
+        raise HTTPException(status_code=503, detail=f"Cubo de estatísticas não carregado: {erro}")
+    return resultado
+
+@app.get("/stats/info")
+def stats_info():
+    return market_cube.info() if market_cube else {"carregado": False, "erro": "MARKET_CUBE_URI não configurado"}
+
+@app.get("/comps")
+async def comps(lat: float, lon: float, total_area_m2: float, bedrooms: int,
+                k: int = DEFAULT_K, property_type: Optional[str] = None):
+    """
+    Os k anúncios ativos mais parecidos (localização, área e quartos), com preço e preço/m².
+    Consulta ao KD-tree em memória: sem I/O por requisição.
+    """
+    if total_area_m2 <= 0 or bedrooms < 0 or not 1 <= k <= MAX_K:
+        raise HTTPException(status_code=422, detail=f"Exige total_area_m2 > 0, bedrooms >= 0 e 1 <= k <= {MAX_K}")
+    resultado = comps_index.query(lat, lon, total_area_m2, bedrooms, k, property_type) if comps_index else None
+    if resultado is None:
+        erro = comps_index.error if comps_index else "COMPS_INDEX_URI não configurado"
+        raise HTTPException(status_code=503, detail=f"Índice de comps não carregado: {erro}")
+    return resultado
+
+@app.get("/comps/info")
+def comps_info():
+    return comps_index.info() if comps_index else {"carregado": False, "erro": "COMPS_INDEX_URI não configurado"}
+
+@app.post("/predict/batch")
+async def predict_batch(request: Request):
+    """
+    Previsão em lote: JSON (lista), NDJSON (application/x-ndjson) ou
+    Arrow IPC stream (application/vnd.apache.arrow.stream).
+    Os resultados voltam na mesma ordem da entrada.
+    """
+    active = loader.active or await run_in_threadpool(loader.get)
+    if not active:
+        raise HTTPException(status_code=500, detail="Modelo de IA não está carregado.")
+
+    content_type = (request.headers.get("content-type") or "application/json").lower()
+    body = await request.body()
+    try:
+        cols = parse_batch_body(body, content_type)
+    except (ValueError, TypeError, ValidationError) as e:
+        raise HTTPException(status_code=422, detail=f"Lote inválido: {e}")
+
+    areas, slugs = cols["total_area_m2"], cols["property_type_slug"]
+    if len(areas) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Lote acima do limite de {MAX_BATCH_SIZE} itens.")
+    metrics.BATCH_ROWS.observe(len(areas))
+    if len(areas) == 0:
+        return {"n": 0, "previsoes": []}
+
+    feats = to_features(cols)
+    X = active.pipeline.transform(feats)
+    try:
+        # inferência fora do event loop
+        precos = await run_in_threadpool(predict_array, active, X, feats, "predict_batch")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Erro na previsão: {str(e)}")
+
+    t0 = time.perf_counter()
+    precos = np.round(precos.astype(np.float64), 2)
+    return json_response({
+        "n": len(precos),
+        "previsoes": [
+            {"area_m2": float(a), "tipo": str(s).upper(), "preco_previsto": float(p)}
+            for a, s, p in zip(areas, slugs, precos)
+        ],
+    }, "predict_batch", t0)
+
 # Se rodar este arquivo direto, inicia o servidor local
 if __name__ == "__main__":
     import uvicorn
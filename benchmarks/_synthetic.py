@@ -0,0 +1,163 @@
+"""
+Dados e modelo sintéticos para os benchmarks (não precisam do bucket).
+"""
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def synthetic_listings(n: int, seed: int = 42):
+    """Área e código de tipo com preço ~ área * fator do tipo + ruído."""
+    rng = np.random.default_rng(seed)
+    area = rng.uniform(25, 600, n).astype(np.float32)
+    tipo = rng.integers(0, 3, n).astype(np.float32)
+    preco = area * np.array([6500, 4200, 5200])[tipo.astype(int)] + rng.normal(0, 20000, n)
+    return area, tipo, preco
+
+
+def train_synthetic_model(n: int = 5000, n_estimators: int = 200):
+    import pandas as pd
+    import xgboost as xgb
+
+    area, tipo, preco = synthetic_listings(n)
+    X = pd.DataFrame({"total_area_m2": area, "property_type_code": tipo})
+    model = xgb.XGBRegressor(n_estimators=n_estimators, max_depth=6, learning_rate=0.05, n_jobs=1)
+    model.fit(X, preco)
+    return model
+
+
+def install_model(app_module, model):
+    """Injeta o modelo no loader da API, sem passar pelo bucket."""
+    from model_loader import LoadedModel
+    app_module.loader.active = LoadedModel(model, "synthetic", {"version": "synthetic", "source": "synthetic"})
+    app_module.loader.ready.set()
+
+
+def synthetic_gold(n: int, seed: int = 0):
+    """
+    DataFrame com a cara da gold: cidades e bairros com preço/m² próprio, área log-normal,
+    lat/lon perto do centro do bairro e ~10% de anúncios inativos.
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    cidades = np.array(["Goiânia", "Aparecida de Goiânia", "Anápolis", "Brasília", "Trindade"], dtype=object)
+    bairros = np.array([f"Setor {i}" for i in range(300)], dtype=object)
+    tipos = np.array(["apartment", "home", "condominium", "unit", "penthouse"], dtype=object)
+    area = rng.lognormal(4.5, 0.5, n).round(1)
+    base_m2 = rng.lognormal(8.6, 0.3, 300)
+    centro = np.column_stack([rng.normal(-16.69, 0.08, 300), rng.normal(-49.26, 0.08, 300)])
+    b = rng.integers(0, 300, n)
+    return pd.DataFrame({
+        "listing_id": np.arange(n).astype(str),
+        "status": np.where(rng.random(n) < 0.9, "active", "inactive"),
+        "address_city_raw": cidades[rng.integers(0, 5, n)],
+        "address_neighborhood_raw": bairros[b],
+        "property_type": tipos[rng.integers(0, 5, n)],
+        "bedrooms": rng.integers(0, 8, n).astype(str),
+        "lat": centro[b, 0] + rng.normal(0, 0.01, n),
+        "lon": centro[b, 1] + rng.normal(0, 0.01, n),
+        "total_area_m2": area,
+        "target_price": (area * base_m2[b] * rng.lognormal(0, 0.2, n)).round(-2),
+    })
+
+
+def synthetic_bronze(n: int, seed: int = 42):
+    """
+    DataFrame com a cara da bronze: id embaralhado, textos longos (description), JSON cru
+    (pricingInfos, medias), categorias repetitivas e numéricos. Serve para comparar formatos de escrita.
+    """
+    import json
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    bairros = np.array(["Setor Bueno", "Setor Oeste", "Jardim Goiás", "Setor Marista", "Park Lozandes",
+                        "Setor Bela Vista", "Jardim América", "Setor Sul"], dtype=object)
+    tipos = np.array(["APARTMENT", "HOME", "UNIT", "CONDOMINIUM"], dtype=object)
+    frases = ["Excelente apartamento com vista livre.", "Próximo a escolas, shopping e parques.",
+              "Lazer completo: piscina, academia e salão de festas.", "Acabamento de alto padrão.",
+              "Aceita financiamento.", "Condomínio com portaria 24 horas.", "Sol da manhã, andar alto."]
+    area = rng.uniform(25, 600, n).round(1)
+    preco = (area * rng.uniform(4000, 9000, n)).round(-3)
+    desc = [" ".join(rng.choice(frases, rng.integers(3, 12))) for _ in range(n)]
+    pricing = [json.dumps([{"businessType": "SALE", "price": str(int(p)),
+                            "monthlyCondoFee": str(int(rng.integers(200, 1500)))}]) for p in preco]
+    medias = [json.dumps([{"url": f"https://resizedimgs.zapimoveis.com.br/{{action}}/{{width}}x{{height}}/"
+                                  f"named.images.sp/{rng.integers(10**9):x}/foto.jpg", "type": "IMAGE"}
+                          for _ in range(rng.integers(5, 25))]) for _ in range(n)]
+    return pd.DataFrame({
+        "id": rng.permutation(n).astype(str),
+        "title": [f"Imóvel à venda em {b}" for b in rng.choice(bairros, n)],
+        "description": desc,
+        "unitTypes": rng.choice(tipos, n),
+        "neighborhood": rng.choice(bairros, n),
+        "city": "Goiânia",
+        "usableAreas": area,
+        "bedrooms": rng.integers(1, 6, n),
+        "lat": rng.normal(-16.69, 0.03, n),
+        "lon": rng.normal(-49.26, 0.03, n),
+        "pricingInfos": pricing,
+        "medias": medias,
+        "updatedAt_ts": pd.Timestamp("2025-01-01", tz="UTC") + pd.to_timedelta(rng.integers(0, 300 * 86400, n), "s"),
+    })
+
+
+def synthetic_raw_csv(path: str, n: int, dup_frac: float = 0.1, seed: int = 42):
+    """
+    CSV no formato do scraper (dataframes/popuplate.py: json_normalize com sep="."), incluindo
+    reaparições do mesmo id com updatedAt diferente, venda e aluguel, medias e amenities.
+    Entrada para bronze_ingest nos benchmarks da silver/gold.
+    """
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    bairros = ["Setor Bueno", "Setor Oeste", "Jardim Goiás", "Setor Marista", "Park Lozandes", "Setor Sul"]
+    # minúsculas terminadas em t/n/r: pegam um strip que corte letras além de espaços
+    tipos = ["APARTMENT", "HOME", "CONDOMINIUM", "apartment", "penthouse"]
+    amen = ["POOL", "GYM", "ELEVATOR", "PISCINA", "Churrasqueira", "Área de serviço", "SPORTS_COURT",
+            "GATED_COMMUNITY", "PARTY_HALL", "PLAYGROUND", "elevator", "garden", "barbecue_grill"]
+    base_ids = rng.choice(10**9, n, replace=False) + 2 * 10**9
+    n_dup = int(n * dup_frac)
+    ids = np.concatenate([base_ids, rng.choice(base_ids, n_dup)])
+    rows = []
+    for i, lid in enumerate(ids):
+        area = round(float(rng.uniform(25, 600)))
+        price = int(area * rng.uniform(4000, 9000))
+        pricing = [{"businessType": "SALE", "price": str(price), "monthlyCondoFee": str(int(rng.integers(200, 1500))),
+                    "yearlyIptu": str(int(rng.integers(300, 5000))), "iptuPeriod": "YEARLY"}]
+        if rng.random() < 0.2:
+            pricing.append({"businessType": str(rng.choice(["RENTAL", "rental"])), "price": str(int(price * 0.005)),
+                            "iptu": str(int(rng.integers(30, 400))), "iptuPeriod": str(rng.choice(["MONTHLY", "YEARLY", "per_year"])),
+                            "rentalInfo": {"period": "MONTHLY", "warranties": ["DEPOSIT"],
+                                           "monthlyRentalTotalPrice": None if rng.random() < 0.5
+                                           else str(int(price * 0.0055))}})
+        dia = int(rng.integers(1, 28))
+        rows.append({
+            "id": str(lid),
+            "title": f"Apartamento à venda em {rng.choice(bairros)}",
+            "description": "Imóvel <b>bem localizado</b>, próximo a comércio.",
+            "propertyType": str(rng.choice(["UNIT", "unit", "apartment"])),
+            "unitTypes": [str(rng.choice(tipos))],
+            "status": "ACTIVE",
+            "listingType": "USED",
+            "usableAreas": [int(area)],
+            "totalAreas": [int(area * 1.2)],
+            "bedrooms": [int(rng.integers(1, 6))],
+            "bathrooms": [int(rng.integers(1, 5))],
+            "parkingSpaces": [int(rng.integers(0, 4))],
+            "createdAt": f"2025-01-{dia:02d}T10:00:00Z",
+            "updatedAt": f"2025-{2 + (i >= n):02d}-{dia:02d}T{int(rng.integers(0, 24)):02d}:00:00Z",
+            "address": {"city": "Goiânia", "stateAcronym": "GO", "neighborhood": str(rng.choice(bairros)),
+                        "point": {"lat": float(rng.normal(-16.69, 0.03)), "lon": float(rng.normal(-49.26, 0.03))}},
+            "amenities": [str(a) for a in rng.choice(amen, int(rng.integers(0, 6)), replace=False)],
+            "pricingInfos": pricing,
+            "medias": [{"id": f"m{lid}{k}", "url": f"https://resizedimgs.zapimoveis.com.br/{{action}}/x/{lid}_{k}.jpg",
+                        "type": "IMAGE"} for k in range(int(rng.integers(1, 6)))],
+        })
+    pd.json_normalize(rows, sep=".").to_csv(path, index=False, encoding="utf-8")
+    return path
@@ -0,0 +1,94 @@
+"""
+Ingestão bronze com e sem o schema inferido: tempo, pico de memória e paridade das saídas.
+
+    python benchmarks/bench_bronze_schema.py --rows 20000
+    python benchmarks/bench_bronze_schema.py --csv dados/listings.csv
+
+Modos (cada um num subprocesso, para o pico de RSS de um não contaminar o outro):
+  - full:   --no-schema, decisão número x texto pela coluna inteira (comportamento antigo)
+  - cold:   primeira ingestão do layout: infere na amostra e grava o schema
+  - cached: ingestões seguintes do mesmo layout, lendo com os dtypes do schema
+A saída de cold e cached é comparada com a de full; divergência faz o script sair com código 1.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from _synthetic import ROOT, synthetic_raw_csv
+
+MODES = ["full", "cold", "cached"]
+METADATA = ["bronze_ingestion_ts", "bronze_source_file"]
+
+
+def filho(mode: str, csv: str, outdir: str):
+    sys.path.insert(0, os.path.join(ROOT, "Medallion"))
+    sys.path.insert(0, ROOT)
+    import bronze_dataframe
+    from train_streaming import peak_rss_mb
+
+    t0 = time.perf_counter()
+    out = bronze_dataframe.bronze_ingest(csv, outdir, use_schema=(mode != "full"),
+                                         schema_dir=os.path.join(os.path.dirname(outdir), "schemas"))
+    print(json.dumps({"seconds": round(time.perf_counter() - t0, 2), "peak_rss_mb": round(peak_rss_mb(), 1),
+                      "out": out}))
+
+
+def diferencas(path_a: str, path_b: str) -> list:
+    a = pd.read_parquet(path_a).drop(columns=METADATA)
+    b = pd.read_parquet(path_b).drop(columns=METADATA)
+    if list(a.columns) != list(b.columns) or len(a) != len(b):
+        return [f"formato: {a.shape} x {b.shape}"]
+    problemas = []
+    for c in a.columns:
+        va, vb = a[c].astype(str).tolist(), b[c].astype(str).tolist()
+        diff = [i for i, (x, y) in enumerate(zip(va, vb)) if x != y]
+        if diff:
+            i = diff[0]
+            problemas.append(f"{c}: {len(diff)} valores diferentes (ex. linha {i}: {va[i]!r} x {vb[i]!r})")
+    return problemas
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Bronze: decisão pela coluna inteira x schema inferido")
+    ap.add_argument("--rows", type=int, default=20_000, help="Listings do CSV sintético")
+    ap.add_argument("--csv", default=None, help="CSV real do scraper (no lugar do sintético)")
+    ap.add_argument("--child", nargs=3, metavar=("MODE", "CSV", "OUTDIR"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        return filho(*args.child)
+
+    tmp = tempfile.mkdtemp(prefix="bench_bronze_")
+    csv = args.csv or synthetic_raw_csv(os.path.join(tmp, "raw.csv"), args.rows)
+
+    saidas = {}
+    print(f"{'modo':>7} {'tempo s':>8} {'pico MB':>8}")
+    for mode in MODES:
+        outdir = os.path.join(tmp, f"bronze_{mode}")
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", mode, csv, outdir],
+                             capture_output=True, text=True)
+        linhas = [l for l in out.stdout.splitlines() if l.startswith("{")]
+        if out.returncode != 0 or not linhas:
+            print(f"{mode:>7} falhou: {out.stderr.strip()[-300:]}")
+            sys.exit(1)
+        r = json.loads(linhas[-1])
+        saidas[mode] = r["out"]
+        print(f"{mode:>7} {r['seconds']:>8} {r['peak_rss_mb']:>8}")
+
+    falhas = 0
+    print("\nParidade com full:")
+    for mode in ("cold", "cached"):
+        problemas = diferencas(saidas["full"], saidas[mode])
+        print(f"   {'✅' if not problemas else '❌'} {mode}" + "".join(f"\n      - {p}" for p in problemas))
+        falhas += bool(problemas)
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
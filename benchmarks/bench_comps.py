@@ -0,0 +1,116 @@
+"""
+Índice de comps: tempo de build, tamanho, carga na API (mmap + KD-tree), memória e latência da consulta.
+
+    python benchmarks/bench_comps.py --rows 100000 1000000
+
+Cada tamanho roda num subprocesso (o RSS de um não contamina o outro). A memória medida é o
+crescimento do RSS ao abrir o índice e montar a árvore. As respostas de --check consultas são
+conferidas contra a força bruta (distância a todos os pontos). Sai com código 1 se alguma
+divergir ou se a p99 da consulta passar de P99_BUDGET_MS.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from _synthetic import ROOT, synthetic_gold
+
+P99_BUDGET_MS = 5.0
+
+
+def filho(rows: int, queries: int, check: int) -> dict:
+    sys.path.insert(0, ROOT)
+    import comps
+    from model_loader import _rss_mb
+
+    tmp = tempfile.mkdtemp(prefix="bench_comps_")
+    gold = synthetic_gold(rows)
+    gold_path = os.path.join(tmp, "gold.parquet")
+    gold.to_parquet(gold_path, index=False)
+    index_uri = os.path.join(tmp, "index")
+
+    t0 = time.perf_counter()
+    comps.build_index([gold_path], index_uri)
+    t_build = time.perf_counter() - t0
+    tamanho = sum(os.path.getsize(os.path.join(dp, f)) for dp, _, fs in os.walk(index_uri) for f in fs)
+
+    del gold
+    idx = comps.CompsIndex(index_uri)
+    antes = _rss_mb()
+    t0 = time.perf_counter()
+    idx.reload_if_newer()
+    t_load = time.perf_counter() - t0
+    rss = _rss_mb() - antes
+
+    rng = np.random.default_rng(1)
+    alvos = list(zip(rng.normal(-16.69, 0.08, queries), rng.normal(-49.26, 0.08, queries),
+                     rng.lognormal(4.5, 0.5, queries), rng.integers(0, 6, queries)))
+    tipos = [None, "apartment", "home"]
+    lat = {"sem filtro": [], "com tipo": []}
+    for j, (la, lo, ar, be) in enumerate(alvos):
+        tipo = tipos[j % 3]
+        t0 = time.perf_counter()
+        idx.query(la, lo, ar, be, k=10, property_type=tipo)
+        lat["com tipo" if tipo else "sem filtro"].append(time.perf_counter() - t0)
+
+    # força bruta: os mesmos ids, na mesma ordem de distância
+    active = idx._active
+    pts = np.asarray(active["points"])
+    divergencias = 0
+    for la, lo, ar, be in alvos[:check]:
+        r = idx.query(la, lo, ar, be, k=10)
+        alvo = comps.project([la], [lo], [ar], [be], active["meta"]["center"])[0]
+        d = np.sqrt(((pts - alvo) ** 2).sum(axis=1))
+        esperado = active["listing_id"][np.argsort(d, kind="stable")[:10]]
+        divergencias += [c["listing_id"] for c in r["comps"]] != [x.decode() for x in esperado]
+
+    return {
+        "rows": rows, "ativos": active["meta"]["n"], "build_s": round(t_build, 2), "mb": round(tamanho / 2**20, 1),
+        "load_s": round(t_load, 3), "rss_mb": round(rss, 1),
+        **{f"{k} p50 ms": round(float(np.percentile(v, 50)) * 1000, 3) for k, v in lat.items()},
+        **{f"{k} p99 ms": round(float(np.percentile(v, 99)) * 1000, 3) for k, v in lat.items()},
+        "divergencias": int(divergencias),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Índice de comps: build, carga, memória e latência")
+    ap.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    ap.add_argument("--queries", type=int, default=3000)
+    ap.add_argument("--check", type=int, default=50, help="Consultas conferidas contra a força bruta")
+    ap.add_argument("--child", type=int, default=None, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(filho(args.child, args.queries, args.check)))
+        return
+
+    falhas = 0
+    for rows in args.rows:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", str(rows),
+                              "--queries", str(args.queries), "--check", str(args.check)],
+                             capture_output=True, text=True)
+        linhas = [l for l in out.stdout.splitlines() if l.startswith("{")]
+        if out.returncode != 0 or not linhas:
+            print(f"{rows} linhas: falhou: {out.stderr.strip()[-300:]}")
+            falhas += 1
+            continue
+        r = json.loads(linhas[-1])
+        p99 = max(r["sem filtro p99 ms"], r["com tipo p99 ms"])
+        ok = r["divergencias"] == 0 and p99 <= P99_BUDGET_MS
+        falhas += not ok
+        print(f"{'✅' if ok else '❌'} {r['rows']} linhas ({r['ativos']} ativas): build {r['build_s']}s | "
+              f"{r['mb']} MB em disco | carga na API {r['load_s']}s, +{r['rss_mb']} MB de RSS")
+        print(f"   consulta k=10: p50 {r['sem filtro p50 ms']} ms, p99 {r['sem filtro p99 ms']} ms | "
+              f"com filtro de tipo: p50 {r['com tipo p50 ms']} ms, p99 {r['com tipo p99 ms']} ms | "
+              f"divergências da força bruta: {r['divergencias']}/{args.check}")
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Latência e vazão da previsão: booster do XGBoost (inplace_predict) x preditor compilado (tl2cgen).
+
+    python benchmarks/bench_inference_backends.py --trees 500 --n 3000
+
+Treina um modelo no tamanho do de produção (XGB_PARAMS: 500 árvores, profundidade 6) numa gold
+sintética, compila com compiled_model.compile_model e mede, pelo LoadedModel.predict da API:
+  - uma linha por chamada (p50/p99), como no /predict;
+  - lotes de --batch linhas (linhas/s), como no /predict/batch;
+  - o /predict inteiro via HTTP (TestClient), com cada backend ativo.
+Os lotes são medidos direto no preditor compilado (sem o corte de COMPILED_MAX_ROWS do LoadedModel),
+para mostrar onde fica o ponto de troca. Sai com código 1 se as previsões divergirem além de
+PARITY_RTOL ou se o compilado não for mais rápido que o XGBoost na p50 de uma linha.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from _synthetic import ROOT, synthetic_gold
+
+sys.path.insert(0, ROOT)
+# o /predict medido tem de chegar ao modelo: cache de previsões desligado
+os.environ["PREDICTION_CACHE_SIZE"] = "0"
+
+
+def percentis(tempos):
+    us = np.asarray(tempos) * 1e6
+    return np.percentile(us, 50), np.percentile(us, 99)
+
+
+def uma_linha(predict, X: np.ndarray, n: int):
+    tempos = []
+    for i in range(n):
+        x = X[i % len(X):i % len(X) + 1]
+        t0 = time.perf_counter()
+        predict(x)
+        tempos.append(time.perf_counter() - t0)
+    return percentis(tempos)
+
+
+def lote(predict, X: np.ndarray, repeticoes: int = 3) -> float:
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        predict(X)
+        melhor = min(melhor, time.perf_counter() - t0)
+    return len(X) / melhor
+
+
+def main():
+    ap = argparse.ArgumentParser(description="XGBoost x preditor compilado (tl2cgen): latência e vazão")
+    ap.add_argument("--trees", type=int, default=500)
+    ap.add_argument("--rows", type=int, default=50_000, help="Linhas da gold sintética de treino")
+    ap.add_argument("--n", type=int, default=3000, help="Previsões de uma linha medidas")
+    ap.add_argument("--batch", type=int, nargs="+", default=[10, 100, 1000, 100_000])
+    args = ap.parse_args()
+
+    import xgboost as xgb
+    from fastapi.testclient import TestClient
+    import app as api
+    import compiled_model
+    from feature_pipeline import FeaturePipeline
+    from model_loader import LoadedModel
+    from train_model import XGB_PARAMS
+
+    gold = synthetic_gold(args.rows)
+    gold["bedrooms"] = gold["bedrooms"].astype(float)
+    pipeline = FeaturePipeline.fit(gold, numeric=["total_area_m2", "bedrooms", "lat", "lon"],
+                                   categorical=["property_type"], target_encoded=["address_neighborhood_raw"],
+                                   target="target_price")
+    X, y = pipeline.transform(gold), gold["target_price"].to_numpy()
+    params = {**XGB_PARAMS, "n_estimators": args.trees}
+    model = xgb.XGBRegressor(**params, tree_method="hist", n_jobs=-1).fit(X, y)
+
+    tmp = tempfile.mkdtemp(prefix="bench_backend_")
+    t0 = time.perf_counter()
+    arquivos = compiled_model.compile_model(model, tmp, X)  # anota com as primeiras ANNOTATE_ROWS linhas
+    t_compile = time.perf_counter() - t0
+    predictor, info = compiled_model.load_compiled(*arquivos, model)
+    if predictor is None:
+        print(f"❌ backend compilado não carregou: {info.get('backend_error')}")
+        sys.exit(1)
+
+    # mesmo ajuste de threads da API (INFERENCE_NTHREAD) para os dois lados
+    model.get_booster().set_param({"nthread": compiled_model.INFERENCE_NTHREAD})
+    backends = {"xgboost": LoadedModel(model, "xgb", {}, pipeline),
+                "tl2cgen": LoadedModel(model, "tl2cgen", {}, pipeline, predictor)}
+    diff = compiled_model.max_rel_diff(backends["tl2cgen"].predict(X), backends["xgboost"].predict(X))
+    print(f"⚙️ {args.trees} árvores compiladas em {t_compile:.1f}s ({os.path.getsize(arquivos[0]) / 2**20:.1f} MB) | "
+          f"diferença relativa máxima em {len(X)} linhas: {diff:.1e} (limite {compiled_model.PARITY_RTOL:.0e})")
+
+    client = TestClient(api.app)
+    areas = np.random.default_rng(0).uniform(25, 600, args.n)
+    res = {}
+    for nome, active in backends.items():
+        direto = active.predictor.predict if active.predictor is not None else active.predict
+        res[nome] = {"linha": uma_linha(active.predict, X, args.n),
+                     "lote": [lote(direto, np.resize(X, (b, X.shape[1]))) for b in args.batch]}
+        api.loader.active = active
+        api.loader.ready.set()
+        tempos = []
+        for i in range(args.n):
+            t0 = time.perf_counter()
+            client.post("/predict", json={"total_area_m2": float(areas[i]), "property_type_slug": "APARTMENT"})
+            tempos.append(time.perf_counter() - t0)
+        res[nome]["http"] = percentis(tempos)
+
+    print(f"\n{'backend':>8} {'1 linha p50 µs':>15} {'p99 µs':>9} {'/predict p50 µs':>16} "
+          + " ".join(f"{f'lote {b} linhas/s':>20}" for b in args.batch))
+    for nome, r in res.items():
+        print(f"{nome:>8} {r['linha'][0]:>15.1f} {r['linha'][1]:>9.1f} {r['http'][0]:>16.1f} "
+              + " ".join(f"{v:>20,.0f}" for v in r["lote"]))
+    ganho = res["xgboost"]["linha"][0] / res["tl2cgen"]["linha"][0]
+    print(f"\n1 linha: compilado {ganho:.1f}x mais rápido na p50")
+    ok = diff <= compiled_model.PARITY_RTOL and ganho > 1
+    print("✅ paridade e latência ok" if ok else "❌ paridade ou latência fora do esperado")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Cubo de estatísticas de mercado: construção, reconstrução incremental, latência do /stats e precisão dos quantis.
+
+    python benchmarks/bench_market_stats.py --rows 500000 --files 4
+
+- build: cubo do zero; incremental: um dos arquivos da gold muda; inalterada: nada muda
+- consulta: MarketCube.query (mmap) x filtro + quantil em pandas sobre a gold carregada
+- precisão: mediana do sketch x mediana exata, em todas as células com ao menos --min-n linhas
+Sai com código 1 se o erro relativo da mediana passar de SKETCH_GAMMA - 1 ou a p99 da consulta passar de 1 ms.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from _synthetic import ROOT, synthetic_gold
+
+sys.path.insert(0, ROOT)
+import market_stats  # noqa: E402
+
+P99_BUDGET_MS = 1.0
+
+
+def cronometrar(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return time.perf_counter() - t0, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Cubo de estatísticas: build, incremental, latência e precisão")
+    ap.add_argument("--rows", type=int, default=500_000)
+    ap.add_argument("--files", type=int, default=4, help="Arquivos (partições) da gold")
+    ap.add_argument("--queries", type=int, default=20_000)
+    ap.add_argument("--min-n", type=int, default=200, help="Células menores ficam fora da checagem de precisão")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_cube_")
+    gold = synthetic_gold(args.rows)
+    paths = []
+    for i, parte in enumerate(np.array_split(np.arange(args.rows), args.files)):
+        paths.append(os.path.join(tmp, f"gold_{i}.parquet"))
+        gold.iloc[parte].to_parquet(paths[-1], index=False)
+    cube_uri = os.path.join(tmp, "cube")
+
+    t_full, _ = cronometrar(market_stats.build_cube, paths, cube_uri)
+    t_same, _ = cronometrar(market_stats.build_cube, paths, cube_uri)
+    mudado = gold.iloc[np.array_split(np.arange(args.rows), args.files)[0]].copy()
+    mudado["target_price"] *= 1.1
+    mudado.to_parquet(paths[0], index=False)
+    gold.loc[mudado.index, "target_price"] = mudado["target_price"]
+    t_incr, _ = cronometrar(market_stats.build_cube, paths, cube_uri)
+
+    cube = market_stats.MarketCube(cube_uri)
+    t_load, _ = cronometrar(cube.reload_if_newer)
+
+    rng = np.random.default_rng(1)
+    amostra = gold.sample(args.queries, replace=True, random_state=1)
+    consultas = []
+    for _, r in amostra.iterrows():
+        f = {"city": r["address_city_raw"], "neighborhood": r["address_neighborhood_raw"],
+             "property_type": r["property_type"], "bedrooms": r["bedrooms"]}
+        consultas.append({k: v for k, v in f.items() if rng.random() < 0.6})
+    lat = []
+    for f in consultas:
+        t0 = time.perf_counter()
+        cube.query(**f)
+        lat.append(time.perf_counter() - t0)
+    lat_ms = np.array(lat) * 1000
+
+    # a mesma pergunta respondida varrendo a gold em pandas (sem índice)
+    t0 = time.perf_counter()
+    for f in consultas[:50]:
+        m = np.ones(len(gold), dtype=bool)
+        if "city" in f:
+            m &= gold["address_city_raw"].to_numpy() == f["city"]
+        if "neighborhood" in f:
+            m &= gold["address_neighborhood_raw"].to_numpy() == f["neighborhood"]
+        if "property_type" in f:
+            m &= gold["property_type"].to_numpy() == f["property_type"]
+        if "bedrooms" in f:
+            m &= gold["bedrooms"].to_numpy() == f["bedrooms"]
+        gold.loc[m, "target_price"].quantile(list(market_stats.QUANTILES))
+    t_pandas_ms = (time.perf_counter() - t0) / 50 * 1000
+
+    # precisão: mediana do preço e do preço/m² nas células base com bastante linha
+    g = gold.assign(ppm2=gold["target_price"] / gold["total_area_m2"],
+                    bedrooms=gold["bedrooms"].astype(int).clip(upper=market_stats.BEDROOMS_CAP))
+    dims = ["address_city_raw", "address_neighborhood_raw", "property_type"]
+    erro_max = 0.0
+    celulas = 0
+    for (cidade, tipo), grupo in g.groupby(["address_city_raw", "property_type"]):
+        if len(grupo) < args.min_n:
+            continue
+        r = cube.query(city=cidade, property_type=tipo)
+        for alvo, campo in (("target_price", "preco"), ("ppm2", "preco_m2")):
+            exato = float(np.median(grupo[alvo]))
+            erro_max = max(erro_max, abs(r[campo]["p50"] - exato) / exato)
+            celulas += 1
+    for chave, grupo in g.groupby(dims + ["bedrooms"]):
+        if len(grupo) < args.min_n:
+            continue
+        r = cube.query(**dict(zip(["city", "neighborhood", "property_type", "bedrooms"], chave)))
+        exato = float(np.median(grupo["target_price"]))
+        erro_max = max(erro_max, abs(r["preco"]["p50"] - exato) / exato)
+        celulas += 1
+
+    info = cube.info()
+    tamanho = sum(os.path.getsize(os.path.join(dp, f)) for dp, _, fs in os.walk(cube_uri) for f in fs)
+    print(f"gold: {args.rows} linhas em {args.files} arquivos | cubo: {info['celulas']} células, "
+          f"{tamanho / 2**20:.1f} MB em disco")
+    print(f"build do zero {t_full:.2f}s | incremental (1 arquivo mudou) {t_incr:.2f}s | "
+          f"gold inalterada {t_same:.3f}s | abrir na API {t_load * 1000:.1f} ms")
+    print(f"consulta no cubo: p50 {np.percentile(lat_ms, 50) * 1000:.0f} µs | p99 {np.percentile(lat_ms, 99) * 1000:.0f} µs "
+          f"| varrendo a gold em pandas: {t_pandas_ms:.1f} ms")
+    limite = market_stats.SKETCH_GAMMA - 1
+    print(f"precisão da mediana: erro relativo máximo {erro_max:.4f} em {celulas} células (limite {limite:.2f})")
+
+    ok = erro_max <= limite and np.percentile(lat_ms, 99) <= P99_BUDGET_MS
+    print("✅ dentro dos limites" if ok else "❌ fora dos limites")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Engine pandas x duckdb na silver e na gold: tempo de cada um e paridade das saídas.
+
+    python benchmarks/bench_medallion_engines.py --rows 20000
+    python benchmarks/bench_medallion_engines.py --bronze "dataframes/bronze/*.parquet"
+
+Sem --bronze, gera um CSV sintético no formato do scraper e passa pelo bronze_ingest.
+Cada tabela é comparada linha a linha (ordem, colunas e valores); qualquer divergência
+faz o script sair com código 1.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from _synthetic import ROOT, synthetic_raw_csv
+
+sys.path.insert(0, os.path.join(ROOT, "Medallion"))
+import bronze_dataframe  # noqa: E402
+import gold_dataframe  # noqa: E402
+import silver_dataframe  # noqa: E402
+
+SILVER_TABLES = ["silver_listings.parquet", "silver_pricing.parquet", "silver_medias.parquet",
+                 "silver_media_prefixes.parquet", "silver_amenities.parquet"]
+
+
+def _norm_value(v):
+    if isinstance(v, (list, tuple, np.ndarray)):
+        return tuple(_norm_value(x) for x in v)
+    if v is None or (isinstance(v, float) and np.isnan(v)) or v is pd.NaT or v is pd.NA:
+        return None
+    if isinstance(v, pd.Timestamp):
+        return v.tz_convert("UTC") if v.tzinfo else v.tz_localize("UTC")
+    if isinstance(v, (np.floating, float)):
+        return round(float(v), 6)
+    if isinstance(v, (np.integer, np.bool_)):
+        return v.item()
+    return v
+
+
+def compare(path_a: str, path_b: str) -> list:
+    """Diferenças entre dois Parquets (mesma ordem de linhas; ordem das colunas ignorada)."""
+    a, b = pd.read_parquet(path_a), pd.read_parquet(path_b)
+    problemas = []
+    # o json_normalize do pandas deixa a coluna 'rentalInfo' (struct nulo) quando algum item não tem aluguel
+    so_a = [c for c in set(a.columns) - set(b.columns) if not a[c].notna().any()]
+    extras_a = set(a.columns) - set(b.columns) - set(so_a)
+    if extras_a or set(b.columns) - set(a.columns):
+        problemas.append(f"colunas: só pandas {sorted(extras_a)}, só duckdb {sorted(set(b.columns) - set(a.columns))}")
+    if len(a) != len(b):
+        problemas.append(f"linhas: pandas {len(a)} x duckdb {len(b)}")
+        return problemas
+    for c in sorted(set(a.columns) & set(b.columns)):
+        va = [_norm_value(v) for v in a[c].tolist()]
+        vb = [_norm_value(v) for v in b[c].tolist()]
+        diff = [i for i, (x, y) in enumerate(zip(va, vb)) if x != y and not (_num(x) and _num(y) and str(x) == str(y))]
+        if diff:
+            i = diff[0]
+            problemas.append(f"{c}: {len(diff)} valores diferentes (ex. linha {i}: {va[i]!r} x {vb[i]!r})")
+    return problemas
+
+
+def _num(x):
+    return isinstance(x, (int, float))
+
+
+def cronometrar(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Paridade e tempo: silver/gold em pandas x duckdb")
+    ap.add_argument("--rows", type=int, default=20_000, help="Listings do CSV sintético")
+    ap.add_argument("--bronze", nargs="+", default=None, help="Parquet(s) do bronze reais (aceita glob)")
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_engines_")
+    if args.bronze:
+        bronze = args.bronze
+    else:
+        csv = synthetic_raw_csv(os.path.join(tmp, "raw.csv"), args.rows)
+        t0 = time.perf_counter()
+        bronze = [bronze_dataframe.bronze_ingest(csv, os.path.join(tmp, "bronze"))]
+        print(f"Bronze sintético: {args.rows} listings em {time.perf_counter() - t0:.1f}s")
+
+    tempos = {}
+    for engine in silver_dataframe.ENGINES:
+        silver = os.path.join(tmp, f"silver_{engine}")
+        tempos[("silver", engine)] = cronometrar(silver_dataframe.build_silver_tables, bronze, silver, engine=engine)
+        tempos[("gold", engine)] = cronometrar(gold_dataframe.join_listings_pricing, silver,
+                                                os.path.join(tmp, f"gold_{engine}.parquet"), engine=engine)
+        gold_dataframe.join_listings_pricing(silver, os.path.join(tmp, f"gold_rental_{engine}.parquet"),
+                                             business_type="rental", engine=engine)
+
+    print(f"\n{'camada':>7} {'pandas s':>9} {'duckdb s':>9} {'ganho':>7}")
+    for camada in ("silver", "gold"):
+        p, d = tempos[(camada, "pandas")], tempos[(camada, "duckdb")]
+        print(f"{camada:>7} {p:>9.2f} {d:>9.2f} {p / d:>6.1f}x")
+
+    falhas = 0
+    pares = [(os.path.join(tmp, "silver_pandas", t), os.path.join(tmp, "silver_duckdb", t)) for t in SILVER_TABLES]
+    for gold in ("gold", "gold_rental"):
+        pares.append((os.path.join(tmp, f"{gold}_pandas.parquet"), os.path.join(tmp, f"{gold}_duckdb.parquet")))
+    print("\nParidade:")
+    for a, b in pares:
+        problemas = compare(a, b)
+        nome = os.path.basename(b).replace("_duckdb", "")
+        print(f"   {'✅' if not problemas else '❌'} {nome}" + "".join(f"\n      - {p}" for p in problemas))
+        falhas += bool(problemas)
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
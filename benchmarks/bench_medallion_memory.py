@@ -0,0 +1,161 @@
+"""
+Auditoria de memória da medallion (pandas): pico de RSS de cada função sobre uma entrada sintética grande.
+
+    python benchmarks/bench_medallion_memory.py --rows 200000
+    python benchmarks/bench_medallion_memory.py --rows 200000 --only build_silver_tables
+
+Cada função roda num subprocesso próprio. A entrada é carregada antes da medição; o que se mede é o
+crescimento do RSS durante a chamada (pico - RSS logo antes). O pico vem de um amostrador em thread
+(/proc/self/statm) e do ru_maxrss, o que for maior.
+
+Funciona como teste de regressão: cada função tem um orçamento em MB por 10 mil linhas da entrada
+(`BUDGET_MB_PER_10K`, mais `BUDGET_BASE_MB` fixos). Se algum pico passar do orçamento, o script sai
+com código 1.
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from _synthetic import ROOT, synthetic_raw_csv
+
+# Crescimento do RSS permitido durante a chamada, por 10 mil linhas da entrada.
+# Medido com copy-on-write e leitura das colunas aninhadas uma a uma, com ~30% de folga
+# (antes, a silver de 200 mil linhas crescia ~910 MB e estourava o orçamento).
+BUDGET_MB_PER_10K = {
+    "standardization_columns": 1,
+    "unwanted_character": 30,
+    "_explode_array": 4,
+    "build_silver_tables": 36,
+    "join_listings_pricing": 9,
+}
+BUDGET_BASE_MB = 40
+# Funções da bronze rodam sobre o CSV cru (bem mais lentas): entrada menor
+BRONZE_FUNCS = {"standardization_columns", "unwanted_character"}
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # sem /proc: só o pico
+
+
+def medir(fn, *args, **kwargs):
+    """(segundos, pico de RSS durante a chamada em MB, RSS antes em MB)."""
+    antes = rss_mb()
+    maxrss_antes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    pico = [antes]
+    parar = threading.Event()
+
+    def amostrar():
+        while not parar.is_set():
+            pico[0] = max(pico[0], rss_mb())
+            time.sleep(0.002)
+
+    t = threading.Thread(target=amostrar, daemon=True)
+    t.start()
+    t0 = time.perf_counter()
+    try:
+        fn(*args, **kwargs)
+    finally:
+        segundos = time.perf_counter() - t0
+        parar.set()
+        t.join()
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    if maxrss > maxrss_antes:
+        pico[0] = max(pico[0], maxrss)
+    return segundos, pico[0], antes
+
+
+def preparar(tmp: str, rows: int, bronze_rows: int):
+    """CSV cru (bronze) e bronze/silver grandes: um bronze pequeno de verdade replicado com ids novos."""
+    sys.path.insert(0, os.path.join(ROOT, "Medallion"))
+    import pandas as pd
+    import bronze_dataframe
+    import silver_dataframe
+
+    csv = synthetic_raw_csv(os.path.join(tmp, "raw.csv"), bronze_rows)
+    base = pd.read_parquet(bronze_dataframe.bronze_ingest(csv, os.path.join(tmp, "bronze_base")))
+    copias = [base.assign(id=base["id"].astype(str) + f"_{k}") for k in range(-(-rows // len(base)))]
+    bronze = os.path.join(tmp, "bronze.parquet")
+    pd.concat(copias, ignore_index=True).head(rows).to_parquet(bronze, index=False)
+    silver_dataframe.build_silver_tables([bronze], os.path.join(tmp, "silver"))
+    return csv, bronze
+
+
+def filho(func: str, tmp: str) -> dict:
+    sys.path.insert(0, os.path.join(ROOT, "Medallion"))
+    import pandas as pd
+    import bronze_dataframe
+    import gold_dataframe
+    import silver_dataframe
+
+    csv, bronze, silver = os.path.join(tmp, "raw.csv"), os.path.join(tmp, "bronze.parquet"), os.path.join(tmp, "silver")
+    if func in BRONZE_FUNCS:
+        df = bronze_dataframe._read_csv(csv)
+        if func == "unwanted_character":
+            df = bronze_dataframe._parse_json_columns(bronze_dataframe.standardization_columns(df))
+        rows = len(df)
+        fn = getattr(bronze_dataframe, func)
+        seg, pico, antes = medir(fn, df)
+    elif func == "_explode_array":
+        df = pd.read_parquet(bronze, columns=["id", "medias_arr"])
+        rows = len(df)
+        seg, pico, antes = medir(silver_dataframe._explode_array, df, "medias_arr")
+    elif func == "build_silver_tables":
+        rows = pd.read_parquet(bronze, columns=["id"]).shape[0]
+        seg, pico, antes = medir(silver_dataframe.build_silver_tables, [bronze], os.path.join(tmp, "silver_audit"))
+    else:
+        rows = pd.read_parquet(os.path.join(silver, "silver_listings.parquet"), columns=["listing_id"]).shape[0]
+        seg, pico, antes = medir(gold_dataframe.join_listings_pricing, silver, os.path.join(tmp, "gold.parquet"))
+    return {"rows": rows, "seconds": round(seg, 2), "delta_mb": round(pico - antes, 1), "peak_mb": round(pico, 1)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Pico de memória por função da medallion, com orçamento")
+    ap.add_argument("--rows", type=int, default=200_000, help="Linhas da bronze/silver sintética")
+    ap.add_argument("--bronze-rows", type=int, default=20_000, help="Linhas do CSV cru (funções da bronze)")
+    ap.add_argument("--only", nargs="+", choices=list(BUDGET_MB_PER_10K), default=list(BUDGET_MB_PER_10K))
+    ap.add_argument("--tmp", default=None, help="Reaproveita uma entrada já gerada")
+    ap.add_argument("--child", nargs=2, metavar=("FUNC", "TMP"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        print(json.dumps(filho(*args.child)))
+        return
+
+    tmp = args.tmp or tempfile.mkdtemp(prefix="bench_memory_")
+    if not glob.glob(os.path.join(tmp, "silver", "*.parquet")):
+        t0 = time.perf_counter()
+        preparar(tmp, args.rows, args.bronze_rows)
+        print(f"Entrada sintética em {tmp} ({time.perf_counter() - t0:.0f}s)\n")
+
+    falhas = 0
+    print(f"{'função':>24} {'linhas':>8} {'tempo s':>8} {'Δ MB':>8} {'pico MB':>8} {'orçam. MB':>9}")
+    for func in args.only:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", func, tmp],
+                             capture_output=True, text=True)
+        linhas = [l for l in out.stdout.splitlines() if l.startswith("{")]
+        if out.returncode != 0 or not linhas:
+            print(f"{func:>24} falhou: {out.stderr.strip()[-300:]}")
+            falhas += 1
+            continue
+        r = json.loads(linhas[-1])
+        orcamento = BUDGET_BASE_MB + BUDGET_MB_PER_10K[func] * r["rows"] / 10_000
+        estourou = r["delta_mb"] > orcamento
+        falhas += estourou
+        print(f"{func:>24} {r['rows']:>8} {r['seconds']:>8} {r['delta_mb']:>8} {r['peak_mb']:>8} "
+              f"{orcamento:>9.0f} {'❌' if estourou else '✅'}")
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+silver_medias com media_url inteira x compacta (id do prefixo + chave binária + sufixo): tamanho em disco e tempo de leitura.
+
+    python benchmarks/bench_media_urls.py --listings 50000
+    python benchmarks/bench_media_urls.py --silver dataframes/silver   # silver real (com media_url inteira)
+
+Para cada perfil Parquet, grava as duas formas e mede:
+  - leitura da tabela (a compacta sem montar URL nenhuma)
+  - leitura + montagem de todas as URLs (MediaUrls.to_series)
+As URLs remontadas precisam ser idênticas às originais; se divergirem, ou se a forma compacta
+não ficar menor, o script sai com código 1.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from _synthetic import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, "Medallion"))
+import storage  # noqa: E402
+import media_urls  # noqa: E402
+
+PROFILES = ["default", "archive"]
+CDNS = ["https://resizedimgs.zapimoveis.com.br/{action}/{width}x{height}/named.images.sp/",
+        "https://resizedimgs.vivareal.com/{action}/{width}x{height}/named.images.sp/",
+        "https://resizedimgs.olx.com.br/{action}/{width}x{height}/vr.images.sp/"]
+
+
+def medias_sinteticas(listings: int, seed: int = 0) -> pd.DataFrame:
+    """Como a silver_medias: 5 a 25 fotos por anúncio, hash de 32 hex por foto e nome de arquivo."""
+    rng = np.random.default_rng(seed)
+    por_anuncio = rng.integers(5, 26, listings)
+    n = int(por_anuncio.sum())
+    lid = np.repeat(rng.choice(10**9, listings, replace=False) + 2 * 10**9, por_anuncio).astype(str)
+    cdn = np.repeat(rng.integers(0, len(CDNS), listings), por_anuncio)
+    hexa = rng.bytes(16 * n).hex()
+    hashes = [hexa[i:i + 32] for i in range(0, 32 * n, 32)]
+    nomes = np.array(["foto.jpg", "fachada.jpg", "sala-de-estar.jpg", "cozinha.webp", "original.jpg"])
+    urls = [f"{CDNS[c]}{h}/{a}" for c, h, a in zip(cdn, hashes, nomes[rng.integers(0, len(nomes), n)])]
+    return pd.DataFrame({"listing_id": lid, "media_id": [f"{h[:16]}" for h in hashes], "media_url": urls,
+                         "media_type": "image"})
+
+
+def cronometrar(fn, repeticoes: int = 3):
+    melhor, out = float("inf"), None
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        out = fn()
+        melhor = min(melhor, time.perf_counter() - t0)
+    return melhor, out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="silver_medias: media_url inteira x prefixo + chave + sufixo")
+    ap.add_argument("--listings", type=int, default=50_000)
+    ap.add_argument("--silver", default=None, help="Diretório de uma silver real com media_url inteira")
+    args = ap.parse_args()
+
+    full = (storage.read_parquet(storage.join(args.silver, media_urls.MEDIAS_TABLE)) if args.silver
+            else medias_sinteticas(args.listings))
+    compacta, prefixos = media_urls.compact_medias(full)
+    print(f"{len(full)} fotos, {len(prefixos)} prefixos distintos")
+
+    tmp = tempfile.mkdtemp(prefix="bench_medias_")
+    falhas = 0
+    print(f"\n{'perfil':>8} {'forma':>9} {'MB':>7} {'ler s':>7} {'ler+URLs s':>11}")
+    for profile in PROFILES:
+        d_full, d_comp = os.path.join(tmp, f"full_{profile}"), os.path.join(tmp, f"compact_{profile}")
+        storage.write_parquet(full, storage.join(d_full, media_urls.MEDIAS_TABLE), profile=profile, index=False)
+        storage.write_parquet(compacta, storage.join(d_comp, media_urls.MEDIAS_TABLE), profile=profile, index=False)
+        storage.write_parquet(prefixos, storage.join(d_comp, media_urls.PREFIXES_TABLE), profile=profile, index=False)
+
+        mb = {d: sum(os.path.getsize(os.path.join(d, f)) for f in os.listdir(d)) / 2**20 for d in (d_full, d_comp)}
+        t_full, lido = cronometrar(lambda: pd.read_parquet(os.path.join(d_full, media_urls.MEDIAS_TABLE)))
+        t_comp, _ = cronometrar(lambda: media_urls.load_medias(d_comp))
+        t_comp_urls, (df, urls) = cronometrar(lambda: (lambda r: (r[0], r[1].to_series()))(media_urls.load_medias(d_comp)))
+        print(f"{profile:>8} {'inteira':>9} {mb[d_full]:>7.1f} {t_full:>7.3f} {t_full:>11.3f}")
+        print(f"{profile:>8} {'compacta':>9} {mb[d_comp]:>7.1f} {t_comp:>7.3f} {t_comp_urls:>11.3f}  "
+              f"({mb[d_full] / mb[d_comp]:.1f}x menor)")
+
+        # a ordem de escrita pode mudar com o perfil (archive ordena por listing_id): compara na mesma ordem
+        iguais = urls.tolist() == lido["media_url"].tolist() and df["listing_id"].tolist() == lido["listing_id"].tolist()
+        if not iguais or mb[d_comp] >= mb[d_full]:
+            print(f"   ❌ {'URLs remontadas diferentes das originais' if not iguais else 'forma compacta não ficou menor'}")
+            falhas += 1
+
+    _, acessor = media_urls.load_medias(os.path.join(tmp, "compact_default"))
+    amostra = np.random.default_rng(1).integers(0, len(acessor), 10_000)
+    t0 = time.perf_counter()
+    for i in amostra:
+        acessor[int(i)]
+    print(f"\nacesso a uma URL: {(time.perf_counter() - t0) / len(amostra) * 1e6:.1f} µs")
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
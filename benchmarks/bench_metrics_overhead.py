@@ -0,0 +1,150 @@
+"""
+Custo das métricas (metrics.py) no caminho quente do /predict.
+
+    python benchmarks/bench_metrics_overhead.py --n 5000
+    python benchmarks/bench_metrics_overhead.py --budget-us 20 --budget-pct 3
+
+Chama o app direto pela interface ASGI (sem servidor nem TestClient, que somariam ruído maior que o
+custo medido):
+  1. por requisição, o MetricsMiddleware em volta de um app ASGI vazio x o app vazio sozinho,
+     mais as duas observações que o /predict faz (inferência e serialização);
+  2. a p50 do /predict inteiro no app real, para pôr esse custo em proporção;
+  3. o /metrics depois da carga: todas as linhas no formato do Prometheus e a contagem de /predict
+     batendo com as chamadas feitas.
+Sai com código 1 se o custo por requisição passar de --budget-us, ou de --budget-pct da p50 do
+/predict, ou se a exposição estiver errada.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+
+import numpy as np
+
+from _synthetic import ROOT, install_model, train_synthetic_model
+
+sys.path.insert(0, ROOT)
+
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="([^"\\]|\\.)*",?)*\})? -?[0-9.e+-]+$')
+
+
+def scope(method: str, path: str) -> dict:
+    return {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "path": path,
+            "raw_path": path.encode(), "root_path": "", "scheme": "http", "query_string": b"",
+            "headers": [(b"content-type", b"application/json")], "client": ("127.0.0.1", 5000),
+            "server": ("127.0.0.1", 8080)}
+
+
+async def call(app, method: str, path: str, body: bytes = b""):
+    """(status, corpo) de uma requisição ASGI direta."""
+    enviado = False
+    out = {"status": None, "body": b""}
+
+    async def receive():
+        nonlocal enviado
+        if enviado:
+            return {"type": "http.disconnect"}
+        enviado = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            out["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            out["body"] += message.get("body", b"")
+
+    await app(scope(method, path), receive, send)
+    return out["status"], out["body"]
+
+
+async def vazio(scope_, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def por_chamada(app, n: int, rodadas: int = 5) -> float:
+    """Melhor média (µs) de n chamadas, em algumas rodadas."""
+    melhor = float("inf")
+    for _ in range(rodadas):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            await call(app, "POST", "/predict")
+        melhor = min(melhor, (time.perf_counter() - t0) / n * 1e6)
+    return melhor
+
+
+def observacoes_us(metrics, n: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        metrics.INFERENCE_SECONDS.observe(0.0004, "bench")
+        metrics.SERIALIZATION_SECONDS.observe(0.00005, "bench")
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+async def main_async(args) -> int:
+    # toda chamada do /predict chega ao modelo; sem bucket. Antes do import: o app lê o ambiente no import
+    os.environ.update(PREDICTION_CACHE_SIZE="0", MODEL_REGISTRY_URI="", MARKET_CUBE_URI="", COMPS_INDEX_URI="")
+    import app as api
+    import metrics
+
+    install_model(api, train_synthetic_model(n=20000, n_estimators=args.trees))
+
+    # 1. custo do middleware + observações do handler
+    bare = await por_chamada(vazio, args.micro)
+    wrapped = await por_chamada(metrics.MetricsMiddleware(vazio), args.micro)
+    obs = observacoes_us(metrics, args.micro)
+    custo = max(0.0, wrapped - bare) + obs
+
+    # 2. /predict inteiro no app real (com o middleware)
+    corpo = json.dumps({"total_area_m2": 80.0, "property_type_slug": "APARTMENT"}).encode()
+    for _ in range(50):
+        await call(api.app, "POST", "/predict", corpo)
+    metrics.REQUESTS.clear()
+    tempos = []
+    for i in range(args.n):
+        t0 = time.perf_counter()
+        status, _ = await call(api.app, "POST", "/predict", corpo)
+        tempos.append(time.perf_counter() - t0)
+        if status != 200:
+            print(f"❌ /predict respondeu {status}")
+            return 1
+    p50 = float(np.percentile(tempos, 50)) * 1e6
+    pct = custo / p50 * 100
+
+    # 3. exposição
+    status, texto = await call(api.app, "GET", "/metrics")
+    linhas = texto.decode().splitlines()
+    invalidas = [l for l in linhas if l and not l.startswith("# ") and not SAMPLE_LINE.match(l)]
+    contagem = next((float(l.rsplit(" ", 1)[1]) for l in linhas
+                     if l.startswith('api_requests_total{method="POST",route="/predict",status="200"}')), 0)
+    exposicao_ok = status == 200 and not invalidas and contagem == args.n
+
+    print(f"⏱️ middleware: {bare:.1f} µs -> {wrapped:.1f} µs por requisição (+{wrapped - bare:.1f} µs) | "
+          f"observações de inferência + serialização: {obs:.2f} µs")
+    print(f"   /predict p50 {p50:.0f} µs | custo das métricas {custo:.1f} µs = {pct:.2f}% "
+          f"(orçamento {args.budget_us:.0f} µs e {args.budget_pct:.1f}%)")
+    print(f"   /metrics: {len(linhas)} linhas, {len(invalidas)} fora do formato | /predict contados: {contagem:.0f}/{args.n}")
+    for l in invalidas[:5]:
+        print(f"      {l}")
+
+    ok = custo <= args.budget_us and pct <= args.budget_pct and exposicao_ok
+    print("✅ métricas dentro do orçamento" if ok else "❌ métricas acima do orçamento ou exposição inválida")
+    return 0 if ok else 1
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Custo do middleware de métricas no /predict")
+    ap.add_argument("--n", type=int, default=5000, help="Chamadas do /predict medidas")
+    ap.add_argument("--micro", type=int, default=20000, help="Chamadas por rodada no app vazio")
+    ap.add_argument("--trees", type=int, default=500)
+    ap.add_argument("--budget-us", type=float, default=20, help="Custo máximo por requisição (µs)")
+    ap.add_argument("--budget-pct", type=float, default=3, help="Custo máximo em %% da p50 do /predict")
+    args = ap.parse_args()
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Tamanho, tempo de escrita e tempo de leitura por perfil de escrita Parquet (storage.PARQUET_PROFILES).
+
+    python benchmarks/bench_parquet_profiles.py --rows 200000
+    python benchmarks/bench_parquet_profiles.py --input dataframes/bronze/listings_bronze_X.parquet
+
+A leitura é medida duas vezes: a tabela inteira e só três colunas (o que a silver/gold costuma ler).
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from _synthetic import synthetic_bronze
+import storage
+
+
+def medir(df: pd.DataFrame, profile: str, outdir: str, repeat: int = 3):
+    path = os.path.join(outdir, f"{profile}.parquet")
+    t_write = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        storage.write_parquet(df, path, profile=profile, engine="pyarrow", index=False)
+        t_write.append(time.perf_counter() - t0)
+
+    cols = [c for c in ("id", "listing_id", "usableAreas", "total_area_m2", "neighborhood") if c in df.columns][:3]
+    t_full, t_cols = [], []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        back = pd.read_parquet(path)
+        t_full.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        pd.read_parquet(path, columns=cols)
+        t_cols.append(time.perf_counter() - t0)
+    assert len(back) == len(df), f"{profile}: {len(back)} linhas lidas de {len(df)}"
+    return os.path.getsize(path), min(t_write), min(t_full), min(t_cols)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Compara os perfis de escrita Parquet")
+    ap.add_argument("--rows", type=int, default=200_000, help="Linhas da bronze sintética")
+    ap.add_argument("--input", default=None, help="Parquet real para medir (em vez do sintético)")
+    ap.add_argument("--profiles", nargs="+", default=list(storage.PARQUET_PROFILES),
+                    choices=list(storage.PARQUET_PROFILES))
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    df = pd.read_parquet(args.input) if args.input else synthetic_bronze(args.rows)
+    mem = df.memory_usage(deep=True).sum() / 2**20
+    print(f"Dados: {len(df)} linhas x {df.shape[1]} colunas ({mem:.0f} MB em memória)")
+
+    outdir = tempfile.mkdtemp(prefix="bench_parquet_")
+    print(f"{'perfil':>11} {'MB':>8} {'escrita s':>10} {'leitura s':>10} {'3 cols s':>9}")
+    for profile in args.profiles:
+        size, tw, tr, tc = medir(df, profile, outdir, args.repeat)
+        print(f"{profile:>11} {size / 2**20:>8.1f} {tw:>10.3f} {tr:>10.3f} {tc:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
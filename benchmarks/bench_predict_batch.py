@@ -0,0 +1,53 @@
+"""
+Compara a vazão do /predict (um imóvel por requisição) com o /predict/batch.
+
+    python benchmarks/bench_predict_batch.py --n 2000
+"""
+import argparse
+import json
+import time
+
+from _synthetic import install_model, synthetic_listings, train_synthetic_model
+
+SLUGS = ["APARTMENT", "HOME", "UNIT"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark /predict vs /predict/batch")
+    ap.add_argument("--n", type=int, default=2000, help="Quantidade de imóveis avaliados")
+    args = ap.parse_args()
+
+    from fastapi.testclient import TestClient
+    import app as api
+
+    install_model(api, train_synthetic_model())
+    api.prediction_cache.maxsize = 0  # mede o modelo, não o cache (e evita o arredondamento da área)
+    client = TestClient(api.app)
+
+    area, tipo, _ = synthetic_listings(args.n, seed=7)
+    itens = [{"total_area_m2": float(a), "property_type_slug": SLUGS[int(t)]} for a, t in zip(area, tipo)]
+
+    t0 = time.perf_counter()
+    single = [client.post("/predict", json=it).json()["preco_previsto"] for it in itens]
+    t_single = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    r = client.post("/predict/batch", json=itens)
+    t_batch = time.perf_counter() - t0
+    batch = [p["preco_previsto"] for p in r.json()["previsoes"]]
+
+    body = "\n".join(json.dumps(it) for it in itens).encode()
+    t0 = time.perf_counter()
+    client.post("/predict/batch", content=body, headers={"content-type": "application/x-ndjson"})
+    t_ndjson = time.perf_counter() - t0
+
+    divergentes = sum(abs(a - b) > 0.01 for a, b in zip(single, batch))
+    print(f"📊 {args.n} imóveis")
+    print(f"   /predict (1 por req) : {t_single:.3f}s | {args.n / t_single:,.0f} itens/s")
+    print(f"   /predict/batch JSON  : {t_batch:.3f}s | {args.n / t_batch:,.0f} itens/s")
+    print(f"   /predict/batch NDJSON: {t_ndjson:.3f}s | {args.n / t_ndjson:,.0f} itens/s")
+    print(f"   speedup (JSON)       : {t_single / t_batch:.1f}x | previsões divergentes: {divergentes}")
+
+
+if __name__ == "__main__":
+    main()
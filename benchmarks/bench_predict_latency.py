@@ -0,0 +1,71 @@
+"""
+Latência p50/p99 da previsão unitária: caminho antigo (DataFrame + model.predict)
+versus o caminho rápido (tabela de tipos + buffer NumPy + inplace_predict).
+
+    python benchmarks/bench_predict_latency.py --n 5000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from _synthetic import install_model, train_synthetic_model
+
+SLUGS = ["APARTMENT", "HOME", "UNIT"]
+
+
+def predict_pandas(model, area: float, slug: str) -> float:
+    # Reprodução do handler antigo, para servir de linha de base
+    import pandas as pd
+    tipo_code = 0
+    tipo = slug.upper()
+    if "HOME" in tipo or "CASA" in tipo:
+        tipo_code = 1
+    elif "UNIT" in tipo or "CONJUNTO" in tipo:
+        tipo_code = 2
+    input_data = pd.DataFrame([[area, tipo_code]], columns=["total_area_m2", "property_type_code"])
+    return float(model.predict(input_data)[0])
+
+
+def percentis(amostras):
+    us = np.asarray(amostras) * 1e6
+    return np.percentile(us, 50), np.percentile(us, 99)
+
+
+def medir(fn, n: int):
+    rng = np.random.default_rng(0)
+    areas = rng.uniform(25, 600, n)
+    tempos = []
+    for i in range(n):
+        t0 = time.perf_counter()
+        fn(float(areas[i]), SLUGS[i % 3])
+        tempos.append(time.perf_counter() - t0)
+    return percentis(tempos)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Latência da previsão unitária (antes/depois)")
+    ap.add_argument("--n", type=int, default=5000, help="Número de previsões medidas")
+    args = ap.parse_args()
+
+    from fastapi.testclient import TestClient
+    import app as api
+
+    model = train_synthetic_model()
+    install_model(api, model)
+    client = TestClient(api.app)
+
+    antes = medir(lambda a, s: predict_pandas(model, a, s), args.n)
+    pipe = api.loader.active.pipeline
+    depois = medir(lambda a, s: api.predict_array(
+        api.loader.active, api.encode_one(pipe, {"total_area_m2": a, "property_type": s}))[0], args.n)
+    http = medir(lambda a, s: client.post("/predict", json={"total_area_m2": a, "property_type_slug": s}), args.n)
+
+    print(f"📊 {args.n} previsões (µs)")
+    print(f"   antes  (pandas)          p50={antes[0]:8.1f} p99={antes[1]:8.1f}")
+    print(f"   depois (numpy/inplace)   p50={depois[0]:8.1f} p99={depois[1]:8.1f}")
+    print(f"   /predict via HTTP (novo) p50={http[0]:8.1f} p99={http[1]:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
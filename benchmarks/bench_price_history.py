@@ -0,0 +1,130 @@
+"""
+Histórico de preços incremental x recalcular tudo, numa carga de raspagens diárias.
+
+    python benchmarks/bench_price_history.py --listings 100000 --days 20
+    python benchmarks/bench_price_history.py --listings 100000 --days 20 --mode delta
+
+Cada dia gera um arquivo da bronze (id, updatedAt, ingestão, pricinginfos_arr):
+  - full:  a raspagem traz todos os anúncios ativos (--change-frac com preço novo, --new-per-day novos)
+  - delta: a raspagem traz só os anúncios novos ou alterados
+Por dia, mede-se o update_price_history (só o lote novo) e a alternativa ingênua: reler todos os lotes e
+recalcular as mudanças com sort + comparação com a linha anterior. No fim, os dois históricos precisam
+ser iguais. Sai com código 1 se divergirem ou se o custo do incremental crescer com o histórico
+(média dos 3 últimos dias > GROWTH_BUDGET x média dos 3 primeiros).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from _synthetic import ROOT
+
+sys.path.insert(0, os.path.join(ROOT, "Medallion"))
+import price_history  # noqa: E402
+
+GROWTH_BUDGET = 1.5
+PRICING_TYPE = pa.list_(pa.struct([("businessType", pa.string()), ("price", pa.string()),
+                                   ("monthlyCondoFee", pa.string()), ("yearlyIptu", pa.string())]))
+
+
+def escrever_lote(path: str, ids: np.ndarray, preco: np.ndarray, condo: np.ndarray, aluguel: np.ndarray,
+                  dia: pd.Timestamp, rng):
+    itens = []
+    for p, c, a in zip(preco.tolist(), condo.tolist(), aluguel.tolist()):
+        venda = {"businessType": "SALE", "price": str(p), "monthlyCondoFee": str(c), "yearlyIptu": "1.200"}
+        itens.append([venda, {"businessType": "RENTAL", "price": str(a), "monthlyCondoFee": str(c),
+                              "yearlyIptu": None}] if a else [venda])
+    t = pa.table({
+        "id": pa.array(ids.astype(str)),
+        "updatedAt_ts": pa.array(dia - pd.to_timedelta(rng.integers(0, 86400, len(ids)), "s"),
+                                 pa.timestamp("us", tz="UTC")),
+        "bronze_ingestion_ts": pa.array([dia] * len(ids), pa.timestamp("us", tz="UTC")),
+        "pricinginfos_arr": pa.array(itens, PRICING_TYPE),
+    })
+    pq.write_table(t, path)
+
+
+def historico_ingenuo(paths) -> pd.DataFrame:
+    """Relê todos os lotes e recalcula as mudanças do zero (o que o incremental evita)."""
+    tudo = pd.concat([price_history.read_batch_pricing(p) for p in paths], ignore_index=True)
+    tudo = tudo.sort_values(price_history.KEY + ["observed_at"], kind="mergesort").reset_index(drop=True)
+    h = price_history.row_hashes(tudo)
+    ids, bt = tudo["listing_id"].to_numpy(), tudo["business_type"].to_numpy()
+    mesma = np.zeros(len(tudo), dtype=bool)
+    mesma[1:] = (ids[1:] == ids[:-1]) & (bt[1:] == bt[:-1])
+    muda = ~mesma
+    muda[1:] |= h[1:] != h[:-1]
+    return tudo[muda]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Histórico de preços: incremental x recalcular tudo")
+    ap.add_argument("--listings", type=int, default=100_000)
+    ap.add_argument("--days", type=int, default=20)
+    ap.add_argument("--change-frac", type=float, default=0.02, help="Fração dos anúncios com preço novo por dia")
+    ap.add_argument("--new-per-day", type=int, default=1000)
+    ap.add_argument("--mode", choices=["full", "delta"], default="full")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    tmp = tempfile.mkdtemp(prefix="bench_history_")
+    bronze, silver = os.path.join(tmp, "bronze"), os.path.join(tmp, "silver")
+    os.makedirs(bronze)
+    n = args.listings
+    ids = np.arange(n) + 10**9
+    preco = (rng.lognormal(13, 0.5, n) / 1000).round().astype(int) * 1000
+    condo = rng.integers(200, 1500, n)
+    aluguel = np.where(rng.random(n) < 0.2, (preco * 0.005).astype(int), 0)
+
+    paths, t_inc, t_naive, linhas = [], [], [], []
+    for d in range(args.days):
+        dia = pd.Timestamp("2025-01-01", tz="UTC") + pd.Timedelta(days=d)
+        mudou = np.zeros(len(ids), dtype=bool)
+        if d:
+            mudou[rng.random(len(ids)) < args.change_frac] = True
+            preco = np.where(mudou, (preco * rng.uniform(0.9, 1.05, len(ids))).round(-3).astype(int), preco)
+            k = args.new_per_day
+            ids = np.concatenate([ids, ids.max() + 1 + np.arange(k)])
+            preco = np.concatenate([preco, (rng.lognormal(13, 0.5, k) / 1000).round().astype(int) * 1000])
+            condo = np.concatenate([condo, rng.integers(200, 1500, k)])
+            aluguel = np.concatenate([aluguel, np.zeros(k, dtype=int)])
+            mudou = np.concatenate([mudou, np.ones(k, dtype=bool)])
+        sel = slice(None) if args.mode == "full" or d == 0 else mudou
+        paths.append(os.path.join(bronze, f"listings_bronze_{dia:%Y%m%dT000000Z}.parquet"))
+        escrever_lote(paths[-1], ids[sel], preco[sel], condo[sel], aluguel[sel], dia, rng)
+        linhas.append(len(ids[sel]))
+
+        t0 = time.perf_counter()
+        price_history.update_price_history([os.path.join(bronze, "*.parquet")], silver)
+        t_inc.append(time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        ingenuo = historico_ingenuo(paths)
+        t_naive.append(time.perf_counter() - t0)
+
+    print(f"\n{'dia':>4} {'linhas do lote':>15} {'incremental s':>14} {'recalcular tudo s':>18}")
+    for d in range(args.days):
+        print(f"{d + 1:>4} {linhas[d]:>15} {t_inc[d]:>14.2f} {t_naive[d]:>18.2f}")
+
+    hist = pd.read_parquet(os.path.join(silver, price_history.HISTORY_DIR))
+    cols = price_history.KEY + ["observed_at"] + price_history.TRACKED_COLS
+    a = hist[cols].sort_values(cols[:3]).reset_index(drop=True)
+    b = ingenuo[cols].sort_values(cols[:3]).reset_index(drop=True)
+    a["listing_id"], b["listing_id"] = a["listing_id"].astype(str), b["listing_id"].astype(str)
+    iguais = len(a) == len(b) and a.astype(str).equals(b.astype(str))
+    crescimento = np.mean(t_inc[-3:]) / np.mean(t_inc[:3])
+    print(f"\nhistórico: {len(hist)} linhas ({(hist['change'] == 'changed').sum()} mudanças de preço) | "
+          f"{'✅ igual' if iguais else '❌ diferente'} ao recalculado do zero ({len(b)} linhas)")
+    print(f"custo do incremental no fim / no começo: {crescimento:.2f}x (limite {GROWTH_BUDGET}x) | "
+          f"recalcular tudo no último dia: {t_naive[-1] / t_inc[-1]:.1f}x mais lento")
+    ok = iguais and crescimento <= GROWTH_BUDGET
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Cold start da API: tempo de import do app.py e tempo até servir / até o modelo estar pronto.
+
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --budget-ms 150 --modes background eager
+
+1. `python -X importtime -c "import app"` em subprocessos: mediana do import do app e, como base,
+   a do próprio framework (fastapi + numpy + pydantic). O que passa da base é custo nosso.
+   Também lista os módulos pesados (pandas, pyarrow, scipy, gcsfs, xgboost...) que o import puxou.
+2. Sobe o uvicorn com um modelo sintético em disco, para cada MODEL_LOAD_MODE: tempo até a primeira
+   resposta em `/`, até `/ready` responder 200 (modelo carregado e aquecido) e o primeiro `/predict`.
+
+Sai com código 1 se o import do app puxar algum módulo pesado ou se o custo acima do framework
+passar de --budget-ms (regressão de import no caminho do cold start).
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+from _synthetic import ROOT, train_synthetic_model
+
+# Não podem ser importados pelo `import app`: só na carga do modelo (thread) ou no uso
+HEAVY_MODULES = ["pandas", "pyarrow", "scipy", "sklearn", "gcsfs", "google.cloud", "joblib", "xgboost",
+                 "treelite", "tl2cgen", "duckdb"]
+FRAMEWORK = "fastapi, fastapi.concurrency, fastapi.responses, numpy, pydantic"
+IMPORT_LINE = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def env_api(**extra) -> dict:
+    # sem bucket: registry, cubo e comps desligados
+    return dict(os.environ, MODEL_REGISTRY_URI="", MARKET_CUBE_URI="", COMPS_INDEX_URI="",
+                MODEL_POLL_SECONDS="0", PREDICTION_CACHE_SIZE="0", **extra)
+
+
+def importtime_ms(code: str, env: dict) -> float:
+    """Soma dos imports de primeiro nível de `code`, sem os do startup do interpretador."""
+    def topo(c):
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", c], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True).stderr
+        return [(m.group(3), int(m.group(1))) for m in map(IMPORT_LINE.match, out.splitlines())
+                if m and m.group(2) == ""]
+    startup = {nome for nome, _ in topo("pass")}
+    return sum(us for nome, us in topo(code) if nome not in startup) / 1000
+
+
+def heavy_imported(env: dict):
+    code = f"import sys, json, app; print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def get(url: str, timeout: float = 2):
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as r:
+            return r.status, json.loads(r.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b"{}")
+    except OSError:
+        return None, None
+
+
+def cold_start(mode: str, port: int, env: dict, timeout: float = 120):
+    """(s até '/', s até /ready 200, ms do primeiro /predict, corpo do /ready)."""
+    url = f"http://127.0.0.1:{port}"
+    t0 = time.perf_counter()
+    srv = subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+                           cwd=ROOT, env={**env, "MODEL_LOAD_MODE": mode},
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    t_home = t_ready = corpo = None
+    try:
+        while time.perf_counter() - t0 < timeout and t_ready is None:
+            if t_home is None and get(url + "/")[0] == 200:
+                t_home = time.perf_counter() - t0
+            status, body = get(url + "/ready")
+            if status == 200:
+                t_ready, corpo = time.perf_counter() - t0, body
+            else:
+                time.sleep(0.01)
+        if t_ready is None:
+            return t_home, None, None, None
+        body = json.dumps({"total_area_m2": 80, "property_type_slug": "APARTMENT"}).encode()
+        req = urllib.request.Request(url + "/predict", data=body, headers={"Content-Type": "application/json"})
+        t1 = time.perf_counter()
+        with urllib.request.urlopen(req, timeout=10) as r:
+            r.read()
+        return t_home, t_ready, (time.perf_counter() - t1) * 1000, corpo
+    finally:
+        srv.terminate()
+        srv.wait(timeout=30)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Cold start da API: import e tempo até /ready")
+    ap.add_argument("--runs", type=int, default=5, help="Repetições do import (mediana)")
+    ap.add_argument("--budget-ms", type=float, default=150, help="Import do app acima do framework (ms)")
+    ap.add_argument("--modes", nargs="+", default=["background", "eager"], help="MODEL_LOAD_MODE medidos")
+    ap.add_argument("--trees", type=int, default=500)
+    ap.add_argument("--port", type=int, default=8766)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_startup_")
+    model_path = os.path.join(tmp, "model_imoveis_xgb.ubj")
+    train_synthetic_model(n=20000, n_estimators=args.trees).save_model(model_path)
+    env = env_api(MODEL_URI=model_path, MODEL_CACHE_DIR=os.path.join(tmp, "cache"))
+
+    base = statistics.median(importtime_ms(f"import {FRAMEWORK}", env) for _ in range(args.runs))
+    app_ms = statistics.median(importtime_ms("import app", env) for _ in range(args.runs))
+    pesados = heavy_imported(env)
+    print(f"📦 import app: {app_ms:.0f} ms | framework (fastapi + numpy + pydantic): {base:.0f} ms | "
+          f"acima do framework: {app_ms - base:.0f} ms (orçamento {args.budget_ms:.0f} ms)")
+    print(f"   módulos pesados no import: {', '.join(pesados) or 'nenhum'}")
+
+    print(f"\n{'modo':>11} {'/ s':>7} {'/ready s':>9} {'1º /predict ms':>15} {'carga s':>8} {'aquecimento s':>14}")
+    for mode in args.modes:
+        t_home, t_ready, t_pred, corpo = cold_start(mode, args.port, env)
+        if t_ready is None:
+            print(f"{mode:>11} não ficou pronto")
+            continue
+        print(f"{mode:>11} {t_home or t_ready:>7.2f} {t_ready:>9.2f} {t_pred:>15.1f} "
+              f"{corpo['load_seconds']:>8.2f} {corpo['warmup_seconds'] or 0:>14.4f}")
+
+    ok = not pesados and app_ms - base <= args.budget_ms
+    print("\n✅ import dentro do orçamento" if ok else "\n❌ import do app acima do orçamento ou com módulos pesados")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
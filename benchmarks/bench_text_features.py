@@ -0,0 +1,134 @@
+"""
+Features de texto por hashing: vazão, memória, paralelismo, incremental e ganho no modelo.
+
+    python benchmarks/bench_text_features.py --rows 200000 --workers 1 4
+
+Uma gold sintética ganha título e descrição; algumas frases ("cobertura", "reformado", "vista")
+mexem no preço. Cada configuração de workers roda num subprocesso (pico de RSS próprio) e grava
+a sua saída. Depois:
+  - as saídas com 1 e N processos precisam ser idênticas (o hashing não tem estado);
+  - com um segundo arquivo de origem, só ele é codificado (as partes do primeiro são reaproveitadas);
+  - XGBoost com e sem as colunas de texto: o MAE com texto precisa ser menor.
+Sai com código 1 se alguma das três checagens falhar.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+from _synthetic import ROOT, synthetic_gold
+
+FRASES = [("Cobertura duplex com terraço gourmet.", 1.35), ("Totalmente reformado, pronto para morar.", 1.15),
+          ("Vista definitiva para o parque.", 1.2), ("Precisa de reforma.", 0.8), ("Imóvel de herança, aceita proposta.", 0.9),
+          ("Próximo a escolas, shopping e parques.", 1.0), ("Condomínio com portaria 24 horas.", 1.0),
+          ("Lazer completo: piscina, academia e salão de festas.", 1.05), ("Aceita financiamento.", 1.0),
+          ("Sol da manhã, andar alto.", 1.05)]
+
+
+def gold_com_texto(rows: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    gold = synthetic_gold(rows, seed)
+    escolhas = [rng.choice(len(FRASES), rng.integers(2, 7), replace=False) for _ in range(rows)]
+    gold["description"] = [" ".join(FRASES[i][0] for i in e) for e in escolhas]
+    gold["title"] = [f"{t.capitalize()} à venda em {b}" for t, b in zip(gold["property_type"], gold["address_neighborhood_raw"])]
+    gold["target_price"] = (gold["target_price"] * [np.prod([FRASES[i][1] for i in e]) for e in escolhas]).round(-2)
+    gold["listing_id"] = (np.arange(rows) + seed * 10**8).astype(str)
+    return gold
+
+
+def filho(sources, out: str, workers: int) -> dict:
+    sys.path.insert(0, ROOT)
+    import text_features
+    return text_features.build_text_features(sources, out, workers=workers)["report"]
+
+
+def rodar(sources, out, workers):
+    out_ = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", out, str(workers), *sources],
+                          capture_output=True, text=True)
+    linhas = [l for l in out_.stdout.splitlines() if l.startswith("{")]
+    if out_.returncode != 0 or not linhas:
+        raise RuntimeError(out_.stderr.strip()[-400:])
+    return json.loads(linhas[-1])
+
+
+def mae_com_e_sem_texto(gold_path: str, out: str, rounds: int):
+    import pandas as pd
+    import xgboost as xgb
+    import text_features
+    from feature_pipeline import FeaturePipeline
+
+    df = pd.read_parquet(gold_path)
+    pipeline = FeaturePipeline.fit(df, numeric=["total_area_m2", "lat", "lon"], categorical=["property_type"])
+    X, y = pipeline.transform(df), df["target_price"].to_numpy()
+    ids, T, _ = text_features.load_text_features(out)
+    XT = text_features.with_dense(X, text_features.align(ids, T, df["listing_id"]))
+    teste = np.random.default_rng(1).random(len(df)) < 0.2
+    maes = []
+    for M in (X, XT):
+        m = xgb.XGBRegressor(n_estimators=rounds, max_depth=6, learning_rate=0.1, tree_method="hist", n_jobs=-1)
+        m.fit(M[~teste], y[~teste])
+        maes.append(float(np.abs(m.predict(M[teste]) - y[teste]).mean()))
+    return maes
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Features de texto por hashing: vazão, memória e paridade")
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 4])
+    ap.add_argument("--row-groups", type=int, default=16, help="Row groups da gold sintética (unidade do paralelismo)")
+    ap.add_argument("--rounds", type=int, default=200, help="n_estimators do XGBoost na comparação de MAE")
+    ap.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        out, workers, *sources = args.child
+        print(json.dumps(filho(sources, out, int(workers))))
+        return
+
+    sys.path.insert(0, ROOT)
+    import text_features
+
+    tmp = tempfile.mkdtemp(prefix="bench_text_")
+    gold_path = os.path.join(tmp, "gold_a.parquet")
+    gold_com_texto(args.rows).to_parquet(gold_path, index=False, row_group_size=max(1, args.rows // args.row_groups))
+
+    falhas = 0
+    print(f"{'workers':>8} {'linhas/s':>10} {'MB/s texto':>11} {'CSR MB':>7} {'nnz/linha':>10} "
+          f"{'RSS MB':>7} {'RSS worker MB':>14} {'tempo s':>8}")
+    saidas = {}
+    for w in args.workers:
+        saidas[w] = os.path.join(tmp, f"text_w{w}")
+        r = rodar([gold_path], saidas[w], w)
+        print(f"{w:>8} {r['rows_per_s']:>10} {r['text_mb_per_s']:>11} {r['matrix_mb']:>7} {r['nnz_per_row']:>10} "
+              f"{r['peak_rss_mb']:>7} {r['peak_rss_worker_mb'] or '-':>14} {r['seconds']:>8}")
+
+    ref_ids, ref, _ = text_features.load_text_features(saidas[args.workers[0]])
+    for w in args.workers[1:]:
+        ids, T, _ = text_features.load_text_features(saidas[w])
+        iguais = np.array_equal(ids, ref_ids) and T.shape == ref.shape and (T != ref).nnz == 0
+        falhas += not iguais
+        print(f"{'✅' if iguais else '❌'} {w} processos x {args.workers[0]}: matrizes {'idênticas' if iguais else 'diferentes'}")
+
+    # incremental: um segundo arquivo (raspagem nova) entra sem recodificar o primeiro
+    novo = os.path.join(tmp, "gold_b.parquet")
+    n_novo = max(1, args.rows // 10)
+    gold_com_texto(n_novo, seed=1).to_parquet(novo, index=False)
+    r = rodar([gold_path, novo], saidas[args.workers[-1]], 1)
+    ok = r["rows_encoded"] == n_novo and r["parts_reused"] == min(args.workers[-1], args.row_groups)
+    falhas += not ok
+    print(f"{'✅' if ok else '❌'} incremental: {r['rows_encoded']} linhas novas codificadas em {r['seconds']}s, "
+          f"{r['parts_reused']} partes reaproveitadas")
+
+    sem, com = mae_com_e_sem_texto(gold_path, saidas[args.workers[0]], args.rounds)
+    ok = com < sem
+    falhas += not ok
+    print(f"{'✅' if ok else '❌'} MAE sem texto R$ {sem:,.0f} | com texto R$ {com:,.0f} ({(1 - com / sem):+.1%})")
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
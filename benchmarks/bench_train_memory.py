@@ -0,0 +1,80 @@
+"""
+Pico de memória e tempo de treino por modo (memory / quantile / external) em vários tamanhos.
+Cada rodada roda num subprocesso próprio, para o pico de RSS de uma não contaminar a outra.
+
+    python benchmarks/bench_train_memory.py --rows 100000 1000000 --rounds 100
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from _synthetic import ROOT
+
+MODES = ["memory", "quantile", "external"]
+
+
+def gerar_gold(path: str, n: int, seed: int = 0):
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    tipos = np.array(["apartment", "home", "unit"], dtype=object)
+    t = rng.integers(0, 3, n)
+    area = rng.uniform(25, 600, n)
+    df = pd.DataFrame({
+        "listing_id": np.arange(n).astype(str),
+        "property_type": tipos[t],
+        "total_area_m2": area,
+        "target_price": area * np.array([6500, 4200, 5200])[t] + rng.normal(0, 20000, n),
+        # colunas que a gold carrega e o treino básico ignora (pesam no modo memory)
+        "title": ["Apartamento à venda com ótima localização"] * n,
+        "address_neighborhood_raw": rng.choice(["Setor Bueno", "Setor Oeste", "Jardim Goiás"], n),
+    })
+    df.to_parquet(path, index=False, row_group_size=100_000)
+
+
+def filho(mode: str, path: str, rounds: int):
+    sys.path.insert(0, ROOT)
+    os.chdir(tempfile.mkdtemp(prefix="bench_train_"))
+    import train_model
+    from train_streaming import peak_rss_mb
+
+    train_model.XGB_PARAMS["n_estimators"] = rounds
+    t0 = time.perf_counter()
+    train_model.train(mode=mode, gold_path=path, upload=False)
+    print(json.dumps({"seconds": round(time.perf_counter() - t0, 2), "peak_rss_mb": round(peak_rss_mb(), 1)}))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Pico de memória x tamanho da gold, por modo de treino")
+    ap.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    ap.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    ap.add_argument("--rounds", type=int, default=100, help="n_estimators (menor = bench mais rápido)")
+    ap.add_argument("--child", nargs=2, metavar=("MODE", "PATH"), help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        return filho(args.child[0], args.child[1], args.rounds)
+
+    tmp = tempfile.mkdtemp(prefix="bench_gold_")
+    print(f"{'linhas':>10} {'modo':>9} {'tempo s':>8} {'pico MB':>8}")
+    for n in args.rows:
+        path = os.path.join(tmp, f"gold_{n}.parquet")
+        gerar_gold(path, n)
+        for mode in args.modes:
+            out = subprocess.run([sys.executable, os.path.abspath(__file__), "--rounds", str(args.rounds),
+                                  "--child", mode, path], capture_output=True, text=True)
+            linhas = [l for l in out.stdout.splitlines() if l.startswith("{")]
+            if out.returncode != 0 or not linhas:
+                print(f"{n:>10} {mode:>9} falhou: {out.stderr.strip()[-200:]}")
+                continue
+            r = json.loads(linhas[-1])
+            print(f"{n:>10} {mode:>9} {r['seconds']:>8} {r['peak_rss_mb']:>8}")
+
+
+if __name__ == "__main__":
+    main()
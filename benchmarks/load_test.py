@@ -0,0 +1,140 @@
+"""
+Teste de carga da API em localhost, variando o número de workers.
+
+Para cada contagem de workers sobe o mesmo comando do start.sh (gunicorn --preload
+quando > 1) com um modelo sintético em disco, dispara requisições em paralelo por
+alguns segundos e mede vazão e memória (RSS somado e PSS somado de mestre + workers;
+o PSS divide as páginas compartilhadas entre os processos, então ele mostra o
+ganho do pre-fork).
+
+    python benchmarks/load_test.py --workers 1 2 4 --seconds 10
+    python benchmarks/load_test.py --url http://localhost:8080 --seconds 10   # servidor já rodando
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import signal
+import subprocess
+import tempfile
+import time
+import urllib.request
+
+from _synthetic import ROOT, train_synthetic_model
+
+SLUGS = ["APARTMENT", "HOME", "UNIT"]
+
+
+def _client(url: str, seconds: float, out):
+    body_tpl = '{"total_area_m2": %.2f, "property_type_slug": "%s"}'
+    fim = time.time() + seconds
+    ok = erros = 0
+    while time.time() < fim:
+        body = (body_tpl % (random.uniform(25, 600), random.choice(SLUGS))).encode()
+        req = urllib.request.Request(url + "/predict", data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req, timeout=10) as r:
+                r.read()
+            ok += 1
+        except Exception:
+            erros += 1
+    out.put((ok, erros))
+
+
+def carga(url: str, seconds: float, clientes: int):
+    out = mp.Queue()
+    procs = [mp.Process(target=_client, args=(url, seconds, out)) for _ in range(clientes)]
+    for p in procs:
+        p.start()
+    res = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    ok = sum(r[0] for r in res)
+    return ok / seconds, sum(r[1] for r in res)
+
+
+def _arvore(pid: int):
+    """pid do mestre + filhos (workers)."""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(c) for c in f.read().split()]
+    except OSError:
+        pass
+    return pids
+
+
+def memoria_mb(pid: int):
+    rss = pss = 0
+    for p in _arvore(pid):
+        try:
+            with open(f"/proc/{p}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Rss:"):
+                        rss += int(line.split()[1])
+                    elif line.startswith("Pss:"):
+                        pss += int(line.split()[1])
+        except OSError:
+            continue
+    return rss / 1024, pss / 1024
+
+
+def esperar_pronto(url: str, timeout: float = 60):
+    fim = time.time() + timeout
+    while time.time() < fim:
+        try:
+            with urllib.request.urlopen(url + "/model", timeout=2) as r:
+                if json.loads(r.read()).get("carregado"):
+                    return True
+        except Exception:
+            pass
+        time.sleep(0.3)
+    return False
+
+
+def subir_servidor(workers: int, port: int, model_path: str):
+    env = dict(os.environ, PORT=str(port), WEB_CONCURRENCY=str(workers), MODEL_URI=model_path,
+               MODEL_REGISTRY_URI="", MODEL_LOAD_MODE="eager", PREDICTION_CACHE_SIZE="0",
+               MODEL_CACHE_DIR=os.path.join(os.path.dirname(model_path), "cache"))
+    return subprocess.Popen(["bash", os.path.join(ROOT, "start.sh")], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Teste de carga com escala de workers")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Contagens de workers a testar")
+    ap.add_argument("--seconds", type=float, default=10, help="Duração de cada rodada")
+    ap.add_argument("--clients", type=int, default=None, help="Processos cliente (padrão: 2x workers)")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--url", default=None, help="Só dispara carga contra um servidor já rodando")
+    args = ap.parse_args()
+
+    if args.url:
+        rps, erros = carga(args.url.rstrip("/"), args.seconds, args.clients or 4)
+        print(f"📊 {rps:,.0f} req/s | erros={erros}")
+        return
+
+    tmp = tempfile.mkdtemp(prefix="loadtest_")
+    model_path = os.path.join(tmp, "model_imoveis_xgb.ubj")
+    train_synthetic_model(n=20000, n_estimators=500).save_model(model_path)
+
+    url = f"http://127.0.0.1:{args.port}"
+    print(f"{'workers':>8} {'req/s':>10} {'erros':>6} {'RSS total MB':>13} {'PSS total MB':>13}")
+    for w in args.workers:
+        srv = subir_servidor(w, args.port, model_path)
+        try:
+            if not esperar_pronto(url):
+                print(f"{w:>8} servidor não ficou pronto")
+                continue
+            time.sleep(1.0)  # workers terminam de subir
+            rps, erros = carga(url, args.seconds, args.clients or 2 * w)
+            rss, pss = memoria_mb(srv.pid)
+            print(f"{w:>8} {rps:>10,.0f} {erros:>6} {rss:>13.1f} {pss:>13.1f}")
+        finally:
+            os.killpg(srv.pid, signal.SIGTERM)
+            srv.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Etapa de features para o treino: monta a matriz larga (float32) a partir da gold + silver_amenities.
+
+Colunas: numéricas da silver (áreas, quartos, suítes, banheiros, vagas, andar, lat/lon),
+tipo do imóvel (código), bairro com target encoding out-of-fold, distância ao centro
+e multi-hot das amenities mais frequentes.
+
+A matriz fica em cache como artefato versionado (X.npy / y.npy + meta.json + pipeline),
+com chave = impressão digital dos arquivos de entrada + configuração. Retreinos e rodadas
+de hiperparâmetros com os mesmos dados reaproveitam o artefato sem reconstruir.
+
+    python build_features.py --gold gold.parquet --amenities silver/silver_amenities.parquet
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from feature_pipeline import FeaturePipeline, target_encode_oof, PIPELINE_FILE
+import storage
+
+FEATURES_CACHE_DIR = os.getenv("FEATURES_CACHE_DIR", "features_cache")
+# Mude quando a lógica de construção mudar: invalida todos os artefatos antigos
+FEATURE_BUILD_VERSION = 1
+
+TARGET = "target_price"
+WIDE_CONFIG = {
+    "numeric": ["total_area_m2", "usable_area_m2", "bedrooms", "suites", "bathrooms",
+                "parking_spaces", "unit_floor", "lat", "lon"],
+    "categorical": ["property_type"],
+    "target_encoded": ["address_neighborhood_raw"],
+    "multi_hot": ["amenities"],
+    "geo": ["lat", "lon"],
+    "te_folds": 5,
+    "te_smoothing": 20.0,
+    "min_amenity_count": 20,
+    "max_amenities": 40,
+}
+
+
+def _input_fingerprint(path: Optional[str]) -> str:
+    if not path:
+        return "-"
+    fs, p = storage.url_to_fs(path)
+    return f"{path}|{storage.fingerprint(fs.info(p))}"
+
+
+def cache_key(gold_path: str, amenities_path: Optional[str], config: dict) -> str:
+    raw = json.dumps({
+        "v": FEATURE_BUILD_VERSION,
+        "gold": _input_fingerprint(gold_path),
+        "amenities": _input_fingerprint(amenities_path),
+        "config": config,
+    }, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+def load_inputs(gold_path: str, amenities_path: Optional[str], config: dict) -> pd.DataFrame:
+    df = storage.read_parquet(gold_path)
+    keep = ["listing_id", TARGET] + [c for c in config["numeric"] + config["categorical"]
+                                     + config["target_encoded"] if c in df.columns]
+    df = df[list(dict.fromkeys(keep))]
+    df = df.dropna(subset=[TARGET, "total_area_m2"]).reset_index(drop=True)
+    for c in config["numeric"]:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+
+    if amenities_path and "amenities" in config["multi_hot"]:
+        dfa = storage.read_parquet(amenities_path, columns=["listing_id", "amenity"])
+        listas = dfa.dropna().groupby(dfa["listing_id"].astype(str))["amenity"].agg(list)
+        df["amenities"] = df["listing_id"].astype(str).map(listas)
+    return df
+
+
+def fit_matrix(df: pd.DataFrame, config: dict) -> Tuple[np.ndarray, np.ndarray, FeaturePipeline]:
+    def present(cols):
+        return [c for c in cols if c in df.columns]
+
+    geo = config["geo"] if all(c in df.columns for c in config["geo"]) else None
+    pipeline = FeaturePipeline.fit(
+        df,
+        numeric=present(config["numeric"]),
+        categorical=present(config["categorical"]),
+        target_encoded=present(config["target_encoded"]), target=TARGET, smoothing=config["te_smoothing"],
+        multi_hot=present(config["multi_hot"]), min_item_count=config["min_amenity_count"],
+        max_items=config["max_amenities"],
+        geo=geo,
+    )
+    X = pipeline.transform(df)
+    y = df[TARGET].to_numpy(dtype=np.float32)
+
+    # No treino o bairro usa a versão out-of-fold; o mapa completo (salvo no pipeline) é o da API
+    cols = pipeline.columns
+    for c in pipeline.target_encoding:
+        X[:, cols.index(f"{c}_te")] = target_encode_oof(
+            df[c], y, n_folds=config["te_folds"], smoothing=config["te_smoothing"])
+    return X, y, pipeline
+
+
+def build_feature_matrix(gold_path: str, amenities_path: Optional[str] = None,
+                         cache_dir: str = FEATURES_CACHE_DIR, config: dict = WIDE_CONFIG,
+                         rebuild: bool = False, write_parquet: bool = False):
+    """
+    Retorna (X, y, pipeline, meta). Usa o artefato em cache se as entradas não mudaram.
+    meta["listing_ids_path"] aponta para os listing_id alinhados às linhas de X (fora do meta.json:
+    o diretório de cache pode mudar de lugar).
+    """
+    key = cache_key(gold_path, amenities_path, config)
+    outdir = os.path.join(cache_dir, key)
+    meta_path = os.path.join(outdir, "meta.json")
+    ids_path = os.path.join(outdir, "listing_id.npy")
+
+    if not rebuild and os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        X = np.load(os.path.join(outdir, "X.npy"), mmap_mode="r")
+        y = np.load(os.path.join(outdir, "y.npy"))
+        pipeline = FeaturePipeline.load(os.path.join(outdir, PIPELINE_FILE))
+        print(f"   ♻️ Matriz de features em cache: {outdir} ({meta['rows']} x {meta['n_features']})")
+        return X, y, pipeline, dict(meta, listing_ids_path=ids_path)
+
+    t0 = time.perf_counter()
+    df = load_inputs(gold_path, amenities_path, config)
+    X, y, pipeline = fit_matrix(df, config)
+
+    os.makedirs(outdir, exist_ok=True)
+    np.save(os.path.join(outdir, "X.npy"), X)
+    np.save(os.path.join(outdir, "y.npy"), y)
+    np.save(ids_path, df["listing_id"].astype(str).to_numpy(dtype="U"))
+    pipeline.save(os.path.join(outdir, PIPELINE_FILE))
+    if write_parquet:
+        pd.DataFrame(X, columns=pipeline.columns).assign(**{TARGET: y}).to_parquet(
+            os.path.join(outdir, "features.parquet"), index=False)
+
+    meta = {
+        "key": key,
+        "build_version": FEATURE_BUILD_VERSION,
+        "rows": int(X.shape[0]),
+        "n_features": int(X.shape[1]),
+        "columns": pipeline.columns,
+        "gold": gold_path,
+        "amenities": amenities_path,
+        "build_seconds": round(time.perf_counter() - t0, 2),
+        "bytes": int(X.nbytes),
+    }
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    print(f"   🧱 Matriz de features gerada: {outdir} ({meta['rows']} x {meta['n_features']}, "
+          f"{meta['bytes'] / 2**20:.1f} MB, {meta['build_seconds']}s)")
+    return X, y, pipeline, dict(meta, listing_ids_path=ids_path)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Monta (ou reaproveita) a matriz de features larga para o treino.")
+    ap.add_argument("--gold", required=True, help="Parquet da gold (listings + target_price)")
+    ap.add_argument("--amenities", default=None, help="silver_amenities.parquet (opcional)")
+    ap.add_argument("--cache-dir", default=FEATURES_CACHE_DIR, help="Diretório dos artefatos de features")
+    ap.add_argument("--rebuild", action="store_true", help="Ignora o cache e reconstrói")
+    ap.add_argument("--parquet", action="store_true", help="Também grava features.parquet (Arrow)")
+    args = ap.parse_args()
+
+    _, _, _, meta = build_feature_matrix(args.gold, args.amenities, args.cache_dir,
+                                         rebuild=args.rebuild, write_parquet=args.parquet)
+    print(f"✅ Features: {meta['n_features']} colunas, {meta['rows']} linhas (chave {meta['key']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Backend de inferência compilado: o booster do XGBoost vira uma biblioteca nativa (tl2cgen).
+
+No treino (`train_model.py --compile`), o treelite lê o booster e o tl2cgen gera C com as árvores
+desenroladas, compilado com gcc numa .so. Os desvios de cada nó são anotados com a frequência vista
+nas linhas do treino (dica de branch prediction para o gcc). A previsão de uma linha deixa de passar
+pelo DMatrix/inplace_predict do XGBoost (validação, threads, cópias) e vira uma chamada C direta.
+Em lotes grandes o booster (que percorre as árvores em blocos de linhas) volta a ganhar: acima de
+COMPILED_MAX_ROWS linhas a API usa o XGBoost mesmo com a .so carregada.
+
+Artefatos, ao lado do modelo (e publicados na mesma versão do registry):
+  model_imoveis_xgb.so             -> preditor compilado (só serve na mesma plataforma: linux-x86_64 no Cloud Run)
+  model_imoveis_xgb.compiled.json  -> plataforma, versões, tempo de compilação e paridade medida no treino
+  model_imoveis_xgb.parity.npz     -> amostra de linhas do treino para a checagem de paridade
+
+A API (model_loader.py) carrega a .so quando ela existe, confere a paridade contra o booster na
+amostra e, se a plataforma não bate, a lib não carrega ou a diferença passa de PARITY_RTOL,
+segue com o XGBoost. INFERENCE_BACKEND=xgboost desliga o backend compilado.
+"""
+import json
+import os
+import platform
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+COMPILED_LIB_FILE = "model_imoveis_xgb.so"
+COMPILED_META_FILE = "model_imoveis_xgb.compiled.json"
+PARITY_SAMPLE_FILE = "model_imoveis_xgb.parity.npz"
+COMPILED_FILES = (COMPILED_LIB_FILE, COMPILED_META_FILE, PARITY_SAMPLE_FILE)
+PARITY_ROWS = 1000
+# Linhas do treino usadas para anotar os desvios
+ANNOTATE_ROWS = 20_000
+# float32 nos dois lados; a diferença vem só da ordem da soma das folhas
+PARITY_RTOL = 1e-5
+# Árvores divididas em N arquivos C, compilados em paralelo pelo gcc
+COMPILE_UNITS = 8
+# 1 thread por processo: o /predict é de uma linha e o gunicorn já escala por workers
+INFERENCE_NTHREAD = int(os.getenv("INFERENCE_NTHREAD", "1"))
+# Acima disso o inplace_predict do XGBoost é mais rápido (benchmarks/bench_inference_backends.py)
+COMPILED_MAX_ROWS = int(os.getenv("COMPILED_MAX_ROWS", "4096"))
+
+
+def platform_tag() -> str:
+    return f"{sys.platform}-{platform.machine()}"
+
+
+def _booster(model):
+    return model.get_booster() if hasattr(model, "get_booster") else model
+
+
+def save_parity_sample(X, expected: np.ndarray, path: str):
+    import scipy.sparse as sp
+    if sp.issparse(X):
+        X = X.tocsr()
+        np.savez(path, data=X.data, indices=X.indices, indptr=X.indptr, shape=np.array(X.shape), expected=expected)
+    else:
+        np.savez(path, X=np.asarray(X, dtype=np.float32), expected=expected)
+
+
+def load_parity_sample(path: str):
+    import scipy.sparse as sp
+    with np.load(path) as z:
+        if "X" in z:
+            return z["X"], z["expected"]
+        return sp.csr_matrix((z["data"], z["indices"], z["indptr"]), shape=tuple(z["shape"])), z["expected"]
+
+
+def max_rel_diff(a: np.ndarray, b: np.ndarray) -> float:
+    a, b = np.asarray(a, dtype=np.float64).ravel(), np.asarray(b, dtype=np.float64).ravel()
+    if a.shape != b.shape:
+        return float("inf")
+    if not len(a):
+        return 0.0
+    return float(np.max(np.abs(a - b)) / max(float(np.max(np.abs(b))), 1.0))
+
+
+class CompiledPredictor:
+    """Mesma interface mínima do caminho do XGBoost: predict(X) -> float32 (n,)."""
+
+    def __init__(self, lib_path: str, nthread: int = INFERENCE_NTHREAD):
+        import tl2cgen
+        self._tl2cgen = tl2cgen
+        self._predictor = tl2cgen.Predictor(lib_path, nthread=nthread)
+        self.num_feature = self._predictor.num_feature
+
+    def predict(self, X) -> np.ndarray:
+        return self._predictor.predict(self._tl2cgen.DMatrix(X)).reshape(-1)
+
+
+def compile_model(model, out_dir: str, X_sample) -> List[str]:
+    """
+    Gera a .so, a amostra de paridade e o meta em `out_dir`. Retorna os caminhos dos três arquivos.
+    `X_sample` são linhas do treino: até ANNOTATE_ROWS anotam os desvios, as primeiras PARITY_ROWS
+    viram a amostra de paridade. Levanta RuntimeError se o compilado não bater com o booster.
+    """
+    import tempfile
+
+    import scipy.sparse as sp
+    import tl2cgen
+    import treelite
+
+    booster = _booster(model)
+    lib, meta_path, sample_path = (os.path.join(out_dir, f) for f in COMPILED_FILES)
+    X_sample = X_sample[:ANNOTATE_ROWS] if sp.issparse(X_sample) else np.asarray(X_sample[:ANNOTATE_ROWS], dtype=np.float32)
+    t0 = time.perf_counter()
+    tl_model = treelite.frontend.from_xgboost(booster)
+    with tempfile.TemporaryDirectory() as tmp:
+        annotation = os.path.join(tmp, "annotation.json")
+        tl2cgen.annotate_branch(tl_model, tl2cgen.DMatrix(X_sample), path=annotation, verbose=False)
+        tl2cgen.export_lib(tl_model, toolchain="gcc", libpath=lib, verbose=False,
+                           params={"parallel_comp": COMPILE_UNITS, "annotate_in": annotation})
+    compile_seconds = time.perf_counter() - t0
+
+    annotated_rows = int(X_sample.shape[0])
+    X_sample = X_sample[:PARITY_ROWS]
+    expected = booster.inplace_predict(X_sample)
+    diff = max_rel_diff(CompiledPredictor(lib).predict(X_sample), expected)
+    if diff > PARITY_RTOL:
+        raise RuntimeError(f"preditor compilado diverge do XGBoost (diferença relativa {diff:.2e})")
+    save_parity_sample(X_sample, expected, sample_path)
+
+    import xgboost as xgb
+    meta = {
+        "platform": platform_tag(),
+        "xgboost": xgb.__version__, "treelite": treelite.__version__, "tl2cgen": tl2cgen.__version__,
+        "num_feature": int(booster.num_features()),
+        "num_trees": len(booster.get_dump()),
+        "compile_seconds": round(compile_seconds, 1),
+        "annotated_rows": annotated_rows,
+        "parity_rows": int(X_sample.shape[0]),
+        "parity_max_rel_diff": diff,
+        "lib_bytes": os.path.getsize(lib),
+    }
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return [lib, meta_path, sample_path]
+
+
+def load_compiled(lib_path: str, meta_path: str, sample_path: str, model) -> Tuple[Optional[CompiledPredictor], Dict[str, Any]]:
+    """
+    (preditor, info) se a .so é desta plataforma e reproduz o booster na amostra; senão (None, info com o erro).
+    """
+    with open(meta_path, encoding="utf-8") as f:
+        meta = json.load(f)
+    info = {"backend": "xgboost", "compiled": meta}
+    if meta.get("platform") != platform_tag():
+        info["backend_error"] = f"compilado para {meta.get('platform')}, esta instância é {platform_tag()}"
+        return None, info
+    t0 = time.perf_counter()
+    predictor = CompiledPredictor(lib_path)
+    X, expected = load_parity_sample(sample_path)
+    live = _booster(model).inplace_predict(X)
+    diff = max(max_rel_diff(predictor.predict(X), live), max_rel_diff(live, expected))
+    info["parity_max_rel_diff"] = diff
+    info["parity_seconds"] = round(time.perf_counter() - t0, 4)
+    if diff > PARITY_RTOL:
+        info["backend_error"] = f"paridade falhou (diferença relativa {diff:.2e} > {PARITY_RTOL:.0e})"
+        return None, info
+    info["backend"] = "tl2cgen"
+    return predictor, info
@@ -0,0 +1,339 @@
+"""
+Índice de imóveis comparáveis ("comps"): os k anúncios ativos mais próximos de um imóvel.
+
+Espaço de busca (tudo em "km equivalentes", para uma única métrica euclidiana):
+  x, y  -> lat/lon projetados em km (equirretangular em torno do centro da gold)
+  área  -> log(área) * AREA_KM        (área 25% maior ~ 0,7 km)
+  quartos -> quartos * BEDROOM_KM
+A API monta um cKDTree sobre points.npy aberto com mmap (copy_data=False: a árvore só guarda índices).
+
+Layout publicado (diretório local ou gs://), com o mesmo ponteiro `latest` do registry do modelo:
+  <índice>/latest                  -> nome da versão ativa
+  <índice>/<versão>/meta.json      -> parâmetros do espaço, centro da projeção e categorias
+  <índice>/<versão>/points.npy     -> float64 [n, 4]: x_km, y_km, área, quartos (já escalados)
+  <índice>/<versão>/<coluna>.npy   -> dados de cada anúncio, na mesma ordem (ids, preço, área, ...)
+
+    python comps.py --gold "gold/*.parquet" --index stats/comps_index
+    python comps.py --index stats/comps_index --query lat=-16.69 lon=-49.26 area=80 bedrooms=3
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import storage
+from market_stats import AREA_COLUMNS
+from model_loader import publish_model, read_latest, REGISTRY_POINTER
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+KM_PER_DEG = 111.32
+AREA_KM = 3.0
+BEDROOM_KM = 1.0
+BEDROOMS_CAP = 10
+ACTIVE_STATUSES = ("active",)  # status da silver (snake_case); sem a coluna, entram todos
+DEFAULT_K = 10
+MAX_K = 100
+# Com filtro de tipo, busca k * OVERSAMPLE vizinhos e dobra até achar k do tipo pedido
+OVERSAMPLE = 4
+# Muda quando o espaço de busca ou os arquivos mudam (invalida as versões já publicadas)
+INDEX_FORMAT = 1
+GOLD_COLUMNS = ["listing_id", "lat", "lon", "bedrooms", "target_price", "property_type",
+                "address_neighborhood_raw", "status", *AREA_COLUMNS]
+PAYLOAD = ("listing_id", "price", "area", "bedrooms", "lat", "lon", "property_type", "neighborhood")
+INDEX_FILES = ("meta.json", "points.npy") + tuple(f"{c}.npy" for c in PAYLOAD)
+
+
+def project(lat: np.ndarray, lon: np.ndarray, area: np.ndarray, bedrooms: np.ndarray,
+            center: Dict[str, float]) -> np.ndarray:
+    """Pontos no espaço de busca, [n, 4] float64 contíguo."""
+    cos_lat = np.cos(np.radians(center["lat"]))
+    return np.ascontiguousarray(np.column_stack([
+        (np.asarray(lon, dtype=np.float64) - center["lon"]) * cos_lat * KM_PER_DEG,
+        (np.asarray(lat, dtype=np.float64) - center["lat"]) * KM_PER_DEG,
+        np.log(np.asarray(area, dtype=np.float64)) * AREA_KM,
+        np.minimum(np.asarray(bedrooms, dtype=np.float64), BEDROOMS_CAP) * BEDROOM_KM,
+    ]))
+
+
+def _codes(s: "pd.Series") -> Tuple[np.ndarray, List[str]]:
+    import pandas as pd
+    codes, cats = pd.factorize(s.astype("string").str.strip().str.lower())
+    return codes.astype(np.int32), [str(c) for c in cats]
+
+
+def load_gold(paths: List[str]) -> "pd.DataFrame":
+    """Anúncios ativos com preço, lat/lon, área e quartos válidos (último arquivo vence no listing_id)."""
+    # pandas/pyarrow só na construção do índice: a API (CompsIndex) não os importa
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    frames = []
+    for p in paths:
+        local = storage.local_path(p)
+        names = pq.read_schema(local).names
+        frames.append(pd.read_parquet(local, columns=[c for c in GOLD_COLUMNS if c in names]))
+    df = pd.concat(frames, ignore_index=True).drop_duplicates("listing_id", keep="last")
+
+    area = pd.Series(np.nan, index=df.index)
+    for col in reversed(AREA_COLUMNS):
+        if col in df.columns:
+            a = pd.to_numeric(df[col], errors="coerce")
+            area = a.where(a > 0, area)
+    df = df.assign(
+        area=area,
+        price=pd.to_numeric(df["target_price"], errors="coerce"),
+        bedrooms=pd.to_numeric(df["bedrooms"], errors="coerce") if "bedrooms" in df.columns else np.nan,
+        lat=pd.to_numeric(df["lat"], errors="coerce"),
+        lon=pd.to_numeric(df["lon"], errors="coerce"),
+    )
+    ok = (df["price"] > 0) & (df["area"] > 0) & (df["bedrooms"] >= 0) \
+        & df["lat"].between(-90, 90) & df["lon"].between(-180, 180)
+    if "status" in df.columns:
+        ok &= df["status"].astype("string").str.lower().isin(ACTIVE_STATUSES).fillna(False)
+    return df[ok.fillna(False)].reset_index(drop=True)
+
+
+def _version(paths: List[str]) -> str:
+    idents = []
+    for p in paths:
+        fs, path = storage.url_to_fs(p)
+        idents.append(f"{p}|{storage.fingerprint(fs.info(path))}")
+    params = f"{INDEX_FORMAT}|{AREA_KM}|{BEDROOM_KM}|{BEDROOMS_CAP}|{ACTIVE_STATUSES}"
+    return "comps-" + hashlib.sha256("|".join(idents + [params]).encode()).hexdigest()[:12]
+
+
+def build_index(gold_paths: List[str], index_uri: str) -> str:
+    """Reconstrói o índice a partir da gold; gold inalterada não publica nada. Retorna a versão."""
+    import pandas as pd
+
+    t0 = time.perf_counter()
+    paths = sorted({p for pattern in gold_paths for p in storage.glob(pattern)})
+    if not paths:
+        raise FileNotFoundError(f"Nenhum arquivo da gold encontrado em {gold_paths}")
+    version = _version(paths)
+    previous = read_latest(index_uri)
+    if previous == version:
+        print(f"   ♻️ Gold sem mudanças: índice de comps {version} mantido ({time.perf_counter() - t0:.2f}s)")
+        return version
+
+    df = load_gold(paths)
+    if df.empty:
+        raise ValueError(f"Nenhum anúncio ativo com preço, área, quartos e lat/lon em {paths}")
+    center = {"lat": float(df["lat"].median()), "lon": float(df["lon"].median())}
+    types, type_cats = _codes(df["property_type"]) if "property_type" in df.columns \
+        else (np.full(len(df), -1, dtype=np.int32), [])
+    hoods, hood_cats = _codes(df["address_neighborhood_raw"]) if "address_neighborhood_raw" in df.columns \
+        else (np.full(len(df), -1, dtype=np.int32), [])
+    arrays = {
+        "points": project(df["lat"], df["lon"], df["area"], df["bedrooms"], center),
+        "listing_id": df["listing_id"].astype(str).to_numpy().astype("S"),
+        "price": df["price"].to_numpy(dtype=np.float64),
+        "area": df["area"].to_numpy(dtype=np.float32),
+        "bedrooms": df["bedrooms"].to_numpy(dtype=np.int16),
+        "lat": df["lat"].to_numpy(dtype=np.float64),
+        "lon": df["lon"].to_numpy(dtype=np.float64),
+        "property_type": types,
+        "neighborhood": hoods,
+    }
+    meta = {
+        "version": version,
+        "built_at": pd.Timestamp.now(tz="UTC").isoformat(),
+        "gold": paths,
+        "n": len(df),
+        "center": center,
+        "space": {"km_per_deg": KM_PER_DEG, "area_km": AREA_KM, "bedroom_km": BEDROOM_KM,
+                  "bedrooms_cap": BEDROOMS_CAP},
+        "property_types": type_cats,
+        "neighborhoods": hood_cats,
+    }
+    tmp = tempfile.mkdtemp(prefix="comps_")
+    try:
+        files = [os.path.join(tmp, name) for name in INDEX_FILES]
+        with open(files[0], "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), arr)
+        publish_model(files, index_uri, version)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    fs, base = storage.url_to_fs(index_uri.rstrip("/"))
+    for p in fs.ls(base, detail=False):
+        name = os.path.basename(p.rstrip("/"))
+        if name not in (REGISTRY_POINTER, version, previous) and fs.isdir(p):
+            fs.rm(p, recursive=True)
+    print(f"   🏘️ Índice de comps {version}: {len(df)} anúncios ativos | {time.perf_counter() - t0:.2f}s")
+    return version
+
+
+# ---------- leitura (API) ----------
+
+class CompsIndex:
+    """
+    Índice publicado aberto com mmap + cKDTree montado na carga. start_polling() troca de
+    versão quando `latest` muda; a consulta usa sempre a versão ativa no momento da chamada.
+    """
+
+    def __init__(self, uri: str, cache_dir: str = storage.DATA_CACHE_DIR):
+        self.uri = uri
+        self.cache_dir = cache_dir
+        self.error: Optional[str] = None
+        self.reloads = 0
+        self._active: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def version(self) -> Optional[str]:
+        active = self._active
+        return active["version"] if active else None
+
+    def _open(self, version: str) -> Dict[str, Any]:
+        from scipy.spatial import cKDTree
+
+        t0 = time.perf_counter()
+        base = f"{self.uri.rstrip('/')}/{version}"
+        local = {name: storage.local_path(f"{base}/{name}", self.cache_dir) for name in INDEX_FILES}
+        with open(local["meta.json"], encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {name[:-4]: np.load(local[name], mmap_mode="r") for name in INDEX_FILES if name.endswith(".npy")}
+        tree = cKDTree(arrays["points"], copy_data=False, balanced_tree=False)
+        return {"version": version, "meta": meta, "tree": tree, **arrays,
+                "load_seconds": round(time.perf_counter() - t0, 3)}
+
+    def reload_if_newer(self) -> bool:
+        with self._lock:
+            latest = read_latest(self.uri)
+            if not latest:
+                raise FileNotFoundError(f"Índice de comps sem ponteiro '{REGISTRY_POINTER}' em {self.uri}")
+            if latest == self.version:
+                return False
+            antigo = self.version
+            self._active = self._open(latest)  # troca atômica: consultas em curso seguem na versão antiga
+            self.error = None
+            if antigo:
+                self.reloads += 1
+                print(f"   🔄 Índice de comps trocado: {antigo} -> {latest}")
+            return True
+
+    def start(self, background: bool = True):
+        def _load():
+            try:
+                self.reload_if_newer()
+                print(f"   🏘️ Índice de comps {self.version} carregado ({self._active['load_seconds']}s)")
+            except Exception as e:
+                self.error = str(e)
+                print(f"   ⚠️ Índice de comps indisponível: {e}")
+
+        if background:
+            threading.Thread(target=_load, name="comps-loader", daemon=True).start()
+        else:
+            _load()
+
+    def start_polling(self, interval_seconds: float):
+        if interval_seconds <= 0:
+            return
+
+        def _loop():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.reload_if_newer()
+                except Exception as e:
+                    print(f"   ⚠️ Falha no polling do índice de comps: {e}")
+
+        threading.Thread(target=_loop, name="comps-poll", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def query(self, lat: float, lon: float, area: float, bedrooms: float, k: int = DEFAULT_K,
+              property_type: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Os k anúncios mais próximos (None se o índice não estiver carregado)."""
+        active = self._active
+        if active is None:
+            return None
+        meta = active["meta"]
+        n = meta["n"]
+        k = max(1, min(int(k), MAX_K, n))
+        alvo = project([lat], [lon], [area], [bedrooms], meta["center"])[0]
+
+        tipo = None
+        if property_type:
+            cats = meta["property_types"]
+            tipo = cats.index(property_type.strip().lower()) if property_type.strip().lower() in cats else -2
+        fetch = k if tipo is None else min(k * OVERSAMPLE, n)
+        while True:
+            dist, idx = active["tree"].query(alvo, k=fetch)
+            dist, idx = np.atleast_1d(dist), np.atleast_1d(idx)
+            if tipo is not None:
+                keep = active["property_type"][idx] == tipo
+                dist, idx = dist[keep], idx[keep]
+            if len(idx) >= k or fetch >= n or tipo == -2:
+                break
+            fetch = min(fetch * 2, n)
+        dist, idx = dist[:k], idx[:k]
+
+        pts = active["points"][idx]
+        geo_km = np.hypot(pts[:, 0] - alvo[0], pts[:, 1] - alvo[1])
+        price, area_m2 = active["price"][idx], active["area"][idx].astype(np.float64)
+        types, hoods = meta["property_types"], meta["neighborhoods"]
+        comps = [{
+            "listing_id": active["listing_id"][i].decode(),
+            "preco": round(float(price[j]), 2),
+            "area_m2": round(float(area_m2[j]), 2),
+            "preco_m2": round(float(price[j] / area_m2[j]), 2),
+            "quartos": int(active["bedrooms"][i]),
+            "tipo": types[active["property_type"][i]] if active["property_type"][i] >= 0 else None,
+            "bairro": hoods[active["neighborhood"][i]] if active["neighborhood"][i] >= 0 else None,
+            "lat": float(active["lat"][i]),
+            "lon": float(active["lon"][i]),
+            "distancia_km": round(float(geo_km[j]), 3),
+            "score": round(float(dist[j]), 3),
+        } for j, i in enumerate(idx.tolist())]
+        return {
+            "versao": active["version"],
+            "k": len(comps),
+            "preco_m2_mediana": round(float(np.median(price / area_m2)), 2) if comps else None,
+            "comps": comps,
+        }
+
+    def info(self) -> Dict[str, Any]:
+        active = self._active
+        if active is None:
+            return {"carregado": False, "uri": self.uri, "erro": self.error}
+        meta = active["meta"]
+        return {"carregado": True, "uri": self.uri, "versao": active["version"], "anuncios": meta["n"],
+                "construido_em": meta.get("built_at"), "reloads": self.reloads,
+                "load_seconds": active["load_seconds"], "erro": self.error}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Índice de imóveis comparáveis (gold -> KD-tree sobre mmap)")
+    ap.add_argument("--index", required=True, help="Diretório ou prefixo gs:// do índice")
+    ap.add_argument("--gold", nargs="+", default=None, help="Parquet(s) da gold (aceita glob) para (re)construir")
+    ap.add_argument("--query", nargs="*", default=None, metavar="CAMPO=VALOR",
+                    help="Consulta o índice publicado (lat, lon, area, bedrooms, k, property_type)")
+    args = ap.parse_args()
+
+    if args.gold:
+        build_index(args.gold, args.index)
+    if args.query is not None:
+        idx = CompsIndex(args.index)
+        idx.reload_if_newer()
+        q = dict(item.split("=", 1) for item in args.query)
+        print(json.dumps(idx.query(float(q["lat"]), float(q["lon"]), float(q["area"]), float(q["bedrooms"]),
+                                   int(q.get("k", DEFAULT_K)), q.get("property_type")),
+                         ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -51,42 +51,78 @@ RANDOM_JITTER_MAX  = 0.6
 RETRIES            = 5
 USE_BROWSER_COOKIES = False  # mude para True se precisar importar cookies do navegador
 
-# includeFields (contrato v4). Pode colar exatamente o mesmo que o navegador gerou.
-INCLUDE_FIELDS = (
-    "expansion(search(result(listings(listing("
-    "expansionType,contractType,listingsCount,propertyDevelopers,sourceId,displayAddressType,amenities,usableAreas,"
-    "constructionStatus,listingType,description,title,stamps,createdAt,floors,unitTypes,nonActivationReason,providerId,"
-    "propertyType,unitSubTypes,unitsOnTheFloor,legacyId,id,portal,unitFloor,parkingSpaces,updatedAt,address,suites,"
-    "publicationType,externalId,bathrooms,usageTypes,totalAreas,advertiserId,advertiserContact,whatsappNumber,bedrooms,"
-    "acceptExchange,pricingInfos,showPrice,resale,buildings,capacityLimit,status,priceSuggestion,condominiumName,modality,"
-    "enhancedDevelopment),account(id,name,logoUrl,licenseNumber,showAddress,legacyVivarealId,legacyZapId,createdDate,tier,"
-    "trustScore,totalCountByFilter,totalCountByAdvertiser),medias,accountLink,link,children(id,usableAreas,totalAreas,"
-    "bedrooms,bathrooms,parkingSpaces,pricingInfos))),totalCount)),fullUriFragments,nearby(search(result(listings(listing("
-    "expansionType,contractType,listingsCount,propertyDevelopers,sourceId,displayAddressType,amenities,usableAreas,"
-    "constructionStatus,listingType,description,title,stamps,createdAt,floors,unitTypes,nonActivationReason,providerId,"
-    "propertyType,unitSubTypes,unitsOnTheFloor,legacyId,id,portal,unitFloor,parkingSpaces,updatedAt,address,suites,"
-    "publicationType,externalId,bathrooms,usageTypes,totalAreas,advertiserId,advertiserContact,whatsappNumber,bedrooms,"
-    "acceptExchange,pricingInfos,showPrice,resale,buildings,capacityLimit,status,priceSuggestion,condominiumName,modality,"
-    "enhancedDevelopment),account(id,name,logoUrl,licenseNumber,showAddress,legacyVivarealId,legacyZapId,createdDate,tier,"
-    "trustScore,totalCountByFilter,totalCountByAdvertiser),medias,accountLink,link,children(id,usableAreas,totalAreas,"
-    "bedrooms,bathrooms,parkingSpaces,pricingInfos))),totalCount)),page,search(result(listings(listing("
-    "expansionType,contractType,listingsCount,propertyDevelopers,sourceId,displayAddressType,amenities,usableAreas,"
-    "constructionStatus,listingType,description,title,stamps,createdAt,floors,unitTypes,nonActivationReason,providerId,"
-    "propertyType,unitSubTypes,unitsOnTheFloor,legacyId,id,portal,unitFloor,parkingSpaces,updatedAt,address,suites,"
-    "publicationType,externalId,bathrooms,usageTypes,totalAreas,advertiserId,advertiserContact,whatsappNumber,bedrooms,"
-    "acceptExchange,pricingInfos,showPrice,resale,buildings,capacityLimit,status,priceSuggestion,condominiumName,modality,"
-    "enhancedDevelopment),account(id,name,logoUrl,licenseNumber,showAddress,legacyVivarealId,legacyZapId,createdDate,tier,"
-    "trustScore,totalCountByFilter,totalCountByAdvertiser),medias,accountLink,link,children(id,usableAreas,totalAreas,"
-    "bedrooms,bathrooms,parkingSpaces,pricingInfos))),totalCount),topoFixo(search(result(listings(listing("
-    "expansionType,contractType,listingsCount,propertyDevelopers,sourceId,displayAddressType,amenities,usableAreas,"
-    "constructionStatus,listingType,description,title,stamps,createdAt,floors,unitTypes,nonActivationReason,providerId,"
-    "propertyType,unitSubTypes,unitsOnTheFloor,legacyId,id,portal,unitFloor,parkingSpaces,updatedAt,address,suites,"
-    "publicationType,externalId,bathrooms,usageTypes,totalAreas,advertiserId,advertiserContact,whatsappNumber,bedrooms,"
-    "acceptExchange,pricingInfos,showPrice,resale,buildings,capacityLimit,status,priceSuggestion,condominiumName,modality,"
-    "enhancedDevelopment),account(id,name,logoUrl,licenseNumber,showAddress,legacyVivarealId,legacyZapId,createdDate,tier,"
-    "trustScore,totalCountByFilter,totalCountByAdvertiser),medias,accountLink,link,children(id,usableAreas,totalAreas,"
-    "bedrooms,bathrooms,parkingSpaces,pricingInfos))),totalCount))"
-)
+# includeFields (contrato v4). O perfil "full" reproduz exatamente o que o navegador gera;
+# "training-minimal" pede só a seção search e apenas os campos que bronze/silver usam.
+FIELDS_PROFILE = "full"   # "full" | "training-minimal"
+
+LISTING_FIELDS_FULL = [
+    "expansionType", "contractType", "listingsCount", "propertyDevelopers", "sourceId", "displayAddressType",
+    "amenities", "usableAreas", "constructionStatus", "listingType", "description", "title", "stamps", "createdAt",
+    "floors", "unitTypes", "nonActivationReason", "providerId", "propertyType", "unitSubTypes", "unitsOnTheFloor",
+    "legacyId", "id", "portal", "unitFloor", "parkingSpaces", "updatedAt", "address", "suites", "publicationType",
+    "externalId", "bathrooms", "usageTypes", "totalAreas", "advertiserId", "advertiserContact", "whatsappNumber",
+    "bedrooms", "acceptExchange", "pricingInfos", "showPrice", "resale", "buildings", "capacityLimit", "status",
+    "priceSuggestion", "condominiumName", "modality", "enhancedDevelopment",
+]
+ACCOUNT_FIELDS_FULL = [
+    "id", "name", "logoUrl", "licenseNumber", "showAddress", "legacyVivarealId", "legacyZapId", "createdDate",
+    "tier", "trustScore", "totalCountByFilter", "totalCountByAdvertiser",
+]
+CHILDREN_FIELDS_FULL = ["id", "usableAreas", "totalAreas", "bedrooms", "bathrooms", "parkingSpaces", "pricingInfos"]
+
+# Campos que chegam à silver (listings_cols_keep, pricing, medias, amenities e as datas *_ts do bronze).
+# Contato do anunciante, logo, stamps, children etc. são descartados lá, então não precisam trafegar.
+LISTING_FIELDS_TRAINING = [
+    "id", "sourceId", "providerId", "portal", "status", "listingType", "publicationType", "modality",
+    "contractType", "propertyType", "usableAreas", "totalAreas", "bedrooms", "suites", "bathrooms",
+    "parkingSpaces", "unitFloor", "unitsOnTheFloor", "buildings", "floors", "createdAt", "updatedAt",
+    "address", "title", "description", "showPrice", "acceptExchange", "pricingInfos", "amenities",
+]
+ACCOUNT_FIELDS_TRAINING = ["id"]
+
+FIELD_PROFILES: Dict[str, Dict[str, Any]] = {
+    "full": {
+        "sections": ["expansion", "fullUriFragments", "nearby", "page", "search", "topoFixo"],
+        "listing": LISTING_FIELDS_FULL,
+        "account": ACCOUNT_FIELDS_FULL,
+        "extras": ["medias", "accountLink", "link"],
+        "children": CHILDREN_FIELDS_FULL,
+    },
+    # extract_listings só lê search.result.listings, então as demais seções são puro tráfego
+    "training-minimal": {
+        "sections": ["search"],
+        "listing": LISTING_FIELDS_TRAINING,
+        "account": ACCOUNT_FIELDS_TRAINING,
+        "extras": ["medias"],
+        "children": [],
+    },
+}
+
+def build_include_fields(profile: str = FIELDS_PROFILE) -> str:
+    """Monta o parâmetro includeFields a partir de um perfil de projeção de campos."""
+    if profile not in FIELD_PROFILES:
+        raise ValueError(f"Perfil de campos desconhecido: {profile} (use {', '.join(FIELD_PROFILES)})")
+    spec = FIELD_PROFILES[profile]
+
+    parts = [f"listing({','.join(spec['listing'])})"]
+    if spec["account"]:
+        parts.append(f"account({','.join(spec['account'])})")
+    parts.extend(spec["extras"])
+    if spec["children"]:
+        parts.append(f"children({','.join(spec['children'])})")
+    search = f"search(result(listings({','.join(parts)})),totalCount)"
+
+    out = []
+    for sec in spec["sections"]:
+        if sec == "search":
+            out.append(search)
+        elif sec in ("expansion", "nearby", "topoFixo"):
+            out.append(f"{sec}({search})")
+        else:
+            out.append(sec)  # campos escalares (page, fullUriFragments)
+    return ",".join(out)
+
+INCLUDE_FIELDS = build_include_fields(FIELDS_PROFILE)
 
 # ===================== Logging =====================
 
@@ -173,6 +209,50 @@ def looks_like_html(text: str) -> bool:
     t = text.lstrip()
     return t.startswith("<") or t.lower().startswith("<!doctype")
 
+# ===================== Dedup (id -> updatedAt) =====================
+
+class SeenIndex:
+    """
+    Índice de ids já coletados nesta execução, com o último updatedAt visto.
+    As faixas de preço se sobrepõem (pmax de uma == pmin da próxima) e as seções
+    expansion/nearby repetem anúncios, então o mesmo id volta várias vezes.
+    Guardamos a posição da linha em `rows` para substituir a cópia antiga quando
+    chega uma versão mais nova do anúncio.
+    """
+
+    NEW = "new"
+    UPDATED = "updated"
+    DUPLICATE = "duplicate"
+
+    def __init__(self):
+        self._seen: Dict[str, tuple] = {}  # id -> (updatedAt, posição em rows)
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def offer(self, lin: Dict[str, Any], rows: List[Dict[str, Any]]) -> str:
+        lid = lin.get("id")
+        if lid is None:
+            # sem id não há como deduplicar; mantém a linha
+            rows.append(lin)
+            return self.NEW
+
+        lid = str(lid)
+        upd = lin.get("updatedAt") or ""
+        prev = self._seen.get(lid)
+        if prev is None:
+            self._seen[lid] = (upd, len(rows))
+            rows.append(lin)
+            return self.NEW
+
+        prev_upd, pos = prev
+        # updatedAt vem em ISO-8601, então a comparação de string respeita a ordem temporal
+        if upd and upd > prev_upd:
+            rows[pos] = lin
+            self._seen[lid] = (upd, pos)
+            return self.UPDATED
+        return self.DUPLICATE
+
 def extract_listings(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
     # tenta caminhos conhecidos
     exp = (((payload or {}).get("expansion") or {})
@@ -250,11 +330,18 @@ def run_pipeline() -> Optional[pd.DataFrame]:
         base_params["addressPointLon"] = str(ADDRESS_LON)
 
     rows: List[Dict[str, Any]] = []
+    seen = SeenIndex()
+    total_recebidos = 0
+    total_duplicados = 0
+    total_bytes = 0
+    total_parse_s = 0.0
 
     # 4) Varredura por FAIXAS (priceMin/priceMax)
     for pmin in range(PRICE_MIN_START, PRICE_MAX_END, PRICE_STEP):
         pmax = min(pmin + PRICE_STEP, PRICE_MAX_END)
         logger.info(f"🔎 Faixa R$ {pmin} .. R$ {pmax}")
+        faixa_recebidos = 0
+        faixa_duplicados = 0
 
         # 4a) paginação por offset (from) até esgotar ou bater limite
         for from_v in range(0, FROM_MAX, SIZE):
@@ -283,6 +370,9 @@ def run_pipeline() -> Optional[pd.DataFrame]:
                 # em bloqueio/HTML, pare a faixa para não martelar
                 break
 
+            # bytes trafegados (já descomprimidos) e custo do decode JSON por página
+            page_bytes = len(r.content or b"")
+            t0 = time.perf_counter()
             try:
                 data = r.json()
             except Exception as e:
@@ -292,21 +382,33 @@ def run_pipeline() -> Optional[pd.DataFrame]:
                 time.sleep(random.uniform(1.0, 2.2))
                 continue
 
+            parse_s = time.perf_counter() - t0
+            total_bytes += page_bytes
+            total_parse_s += parse_s
+
             listings = extract_listings(data)
             if not listings:
                 logger.info("ℹ️ Nenhum listing retornado; encerrando paginação desta faixa.")
                 break
 
             # Achata cada item numa linha (preservando a estrutura principal)
+            # e descarta na hora os ids repetidos (mantendo o updatedAt mais novo)
+            page_dups = 0
             for it in listings:
                 lin = it.get("listing") or {}
                 lin["account"] = it.get("account")
                 lin["medias"] = it.get("medias")
                 lin["accountLink"] = it.get("accountLink")
                 lin["link"] = it.get("link")
-                rows.append(lin)
-
-            logger.info(f"✔️ page={page} from={from_v} registros={len(listings)}")
+                if seen.offer(lin, rows) == SeenIndex.DUPLICATE:
+                    page_dups += 1
+
+            faixa_recebidos += len(listings)
+            faixa_duplicados += page_dups
+            logger.info(
+                f"✔️ page={page} from={from_v} registros={len(listings)} duplicados={page_dups} "
+                f"bytes={page_bytes} ({page_bytes // len(listings)} B/listing) parse={parse_s * 1000:.1f}ms"
+            )
             polite_sleep()
 
             # heurística de última página (lista menor que SIZE)
@@ -314,9 +416,27 @@ def run_pipeline() -> Optional[pd.DataFrame]:
                 logger.info("ℹ️ Página final detectada (menos que SIZE).")
                 break
 
+        total_recebidos += faixa_recebidos
+        total_duplicados += faixa_duplicados
+        if faixa_recebidos:
+            logger.info(
+                f"🧹 Dedup faixa {pmin}-{pmax}: recebidos={faixa_recebidos} "
+                f"duplicados={faixa_duplicados} ({faixa_duplicados / faixa_recebidos:.1%})"
+            )
+
         # pausa entre faixas
         time.sleep(random.uniform(1.2, 2.5))
 
+    if total_recebidos:
+        logger.info(
+            f"🧹 Dedup total: recebidos={total_recebidos} únicos={len(seen)} "
+            f"duplicados={total_duplicados} ({total_duplicados / total_recebidos:.1%})"
+        )
+        logger.info(
+            f"📦 Transferência (perfil {FIELDS_PROFILE}): {total_bytes / 1e6:.2f} MB "
+            f"| {total_bytes // total_recebidos} B/listing | parse JSON total={total_parse_s:.2f}s"
+        )
+
     if not rows:
         logger.warning("⚠️ Nenhum dado coletado.")
         return None
@@ -0,0 +1,326 @@
+"""
+Pipeline de features compartilhado entre treino (train_model.py) e API (app.py).
+
+É ajustado no treino e salvo em JSON ao lado do modelo. Guarda a ordem das colunas
+e o vocabulário de cada coluna categórica, então o código que a API gera para
+'APARTMENT' é exatamente o mesmo que o modelo viu no treino.
+
+Blocos de colunas, nesta ordem:
+  - numéricas (passam direto, NaN = missing);
+  - categóricas -> código pelo vocabulário (<col>_code);
+  - target encoding (<col>_te): média suavizada do alvo por categoria;
+  - geo (dist_center_km): distância até o centro (mediana lat/lon do treino);
+  - multi-hot de listas (<prefixo>_<item>), ex.: amenities.
+Opcional, fora da matriz densa: texto (título + descrição) por hashing, em CSR (text_features.py).
+O bloco `text` guarda só a configuração; `with_text` junta as colunas de texto depois das densas.
+"""
+import json
+import math
+import re
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+PIPELINE_FILE = "feature_pipeline.json"
+PIPELINE_FORMAT_VERSION = 3
+
+
+def is_null(v: Any) -> bool:
+    """None, NaN e pd.NA (o único que não compara consigo mesmo sem erro)."""
+    try:
+        return v is None or bool(v != v)
+    except TypeError:
+        return True
+
+
+def norm_category(v: Any) -> Optional[str]:
+    """Mesma normalização da silver (_snake): 'APARTMENT' -> 'apartment', 'Casa de Vila' -> 'casa_de_vila'."""
+    if is_null(v):
+        return None
+    s = re.sub(r"[^a-z0-9]+", "_", str(v).strip().lower()).strip("_")
+    return s or None
+
+
+def haversine_km(lat, lon, lat0: float, lon0: float):
+    lat, lon = np.radians(lat), np.radians(lon)
+    lat0, lon0 = math.radians(lat0), math.radians(lon0)
+    a = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat) * math.cos(lat0) * np.sin((lon - lon0) / 2) ** 2
+    return 2 * 6371.0 * np.arcsin(np.sqrt(a))
+
+
+def _smoothed_means(keys, y, prior: float, smoothing: float) -> Dict[str, float]:
+    import pandas as pd
+    g = pd.DataFrame({"k": keys, "y": y}).dropna(subset=["k"]).groupby("k")["y"].agg(["sum", "count"])
+    enc = (g["sum"] + prior * smoothing) / (g["count"] + smoothing)
+    return {str(k): float(v) for k, v in enc.items()}
+
+
+def target_encode_oof(values, y, n_folds: int = 5, smoothing: float = 20.0, seed: int = 42) -> np.ndarray:
+    """
+    Target encoding out-of-fold: cada linha recebe a média calculada sem o seu próprio fold,
+    para o modelo não ver o alvo vazado na feature durante o treino.
+    """
+    keys = np.array([norm_category(v) for v in values], dtype=object)
+    y = np.asarray(y, dtype=np.float64)
+    out = np.empty(len(y), dtype=np.float32)
+    folds = np.random.default_rng(seed).integers(0, n_folds, len(y))
+    for f in range(n_folds):
+        fit_mask = folds != f
+        prior = float(y[fit_mask].mean()) if fit_mask.any() else float(y.mean())
+        enc = _smoothed_means(keys[fit_mask], y[fit_mask], prior, smoothing)
+        out[~fit_mask] = [enc.get(k, prior) for k in keys[~fit_mask]]
+    return out
+
+
+class FeaturePipeline:
+    def __init__(self, numeric: List[str], categorical: Dict[str, List[str]],
+                 target_encoding: Optional[Dict[str, Dict[str, Any]]] = None,
+                 multi_hot: Optional[Dict[str, List[str]]] = None,
+                 geo: Optional[Dict[str, float]] = None, text: Optional[Dict[str, Any]] = None):
+        self.numeric = list(numeric)
+        self.categorical = {c: list(v) for c, v in categorical.items()}
+        self.target_encoding = dict(target_encoding or {})
+        self.multi_hot = {c: list(v) for c, v in (multi_hot or {}).items()}
+        self.geo = dict(geo) if geo else None
+        self.text = dict(text) if text else None
+        self._vectorizer = None
+
+        self._index = {c: {cat: float(i) for i, cat in enumerate(v)} for c, v in self.categorical.items()}
+        self._mh_index = {c: {item: i for i, item in enumerate(v)} for c, v in self.multi_hot.items()}
+        self._columns = (
+            self.numeric
+            + [f"{c}_code" for c in self.categorical]
+            + [f"{c}_te" for c in self.target_encoding]
+            + (["dist_center_km"] if self.geo else [])
+            + [f"{c}_{item}" for c, v in self.multi_hot.items() for item in v]
+        )
+
+    @property
+    def columns(self) -> List[str]:
+        """Nomes das colunas da matriz, na ordem em que o modelo as recebe."""
+        return list(self._columns)
+
+    @property
+    def n_features(self) -> int:
+        return len(self._columns)
+
+    @property
+    def input_columns(self) -> List[str]:
+        """Colunas de entrada que o pipeline lê (útil para montar o ImovelInput / a leitura do Parquet)."""
+        cols = self.numeric + list(self.categorical) + list(self.target_encoding) + list(self.multi_hot)
+        if self.geo:
+            cols += [self.geo["lat_col"], self.geo["lon_col"]]
+        if self.text:
+            cols += self.text["columns"]
+        return list(dict.fromkeys(cols))
+
+    @property
+    def n_model_features(self) -> int:
+        """Colunas que o modelo recebe: as densas + as de texto (se houver)."""
+        return self.n_features + (self.text["n_features"] if self.text else 0)
+
+    # ---------- ajuste ----------
+
+    @classmethod
+    def fit(cls, df, numeric: Sequence[str], categorical: Sequence[str],
+            target_encoded: Sequence[str] = (), target: Optional[str] = None, smoothing: float = 20.0,
+            multi_hot: Sequence[str] = (), min_item_count: int = 20, max_items: int = 40,
+            geo: Optional[Sequence[str]] = None) -> "FeaturePipeline":
+        """Vocabulário = categorias normalizadas, em ordem alfabética (como o cat.codes antigo)."""
+        vocab = {}
+        for c in categorical:
+            valores = {norm_category(v) for v in df[c].dropna().unique()}
+            vocab[c] = sorted(v for v in valores if v)
+
+        te = {}
+        if target_encoded:
+            y = df[target].to_numpy(dtype=np.float64)
+            prior = float(np.nanmean(y))
+            for c in target_encoded:
+                keys = [norm_category(v) for v in df[c]]
+                te[c] = {"prior": prior, "smoothing": smoothing, "map": _smoothed_means(keys, y, prior, smoothing)}
+
+        mh = {}
+        for c in multi_hot:
+            counts: Dict[str, int] = {}
+            for items in df[c]:
+                if items is None or isinstance(items, float):
+                    continue
+                for it in {norm_category(i) for i in items}:
+                    if it:
+                        counts[it] = counts.get(it, 0) + 1
+            frequentes = sorted((k for k, n in counts.items() if n >= min_item_count), key=lambda k: (-counts[k], k))
+            mh[c] = sorted(frequentes[:max_items])
+
+        geo_cfg = None
+        if geo:
+            lat_col, lon_col = geo
+            geo_cfg = {
+                "lat_col": lat_col, "lon_col": lon_col,
+                "center_lat": float(df[lat_col].median()), "center_lon": float(df[lon_col].median()),
+            }
+
+        return cls(list(numeric), vocab, te, mh, geo_cfg)
+
+    # ---------- transformação ----------
+
+    @staticmethod
+    def _lookup(values, index: Mapping[str, float], default: float) -> np.ndarray:
+        # vetorizado: normaliza só os valores distintos e espalha com o índice inverso
+        vals = np.asarray(values, dtype=object).ravel()
+        out = np.full(vals.size, default, dtype=np.float32)
+        # nulos direto no default (como no transform_one): no astype(str) virariam 'None'/'nan'
+        ok = ~np.frompyfunc(is_null, 1, 1)(vals).astype(bool) if vals.size else np.zeros(0, dtype=bool)
+        if ok.any():
+            uniq, inv = np.unique(vals[ok].astype(str), return_inverse=True)
+            out[ok] = np.array([index.get(norm_category(u), default) for u in uniq], dtype=np.float32)[inv]
+        return out
+
+    def _codes(self, col: str, values) -> np.ndarray:
+        return self._lookup(values, self._index[col], np.nan)
+
+    def _code_one(self, col: str, value: Any) -> float:
+        return self._index[col].get(norm_category(value), np.nan)
+
+    def transform(self, data: Mapping[str, Any]) -> np.ndarray:
+        """
+        `data` é um DataFrame ou dict coluna -> valores. Devolve float32 (n, n_features).
+        Categoria desconhecida (ou ausente) vira NaN, que o XGBoost trata como missing.
+        """
+        n = len(data[next(c for c in self.input_columns if c in data)])
+        X = np.empty((n, self.n_features), dtype=np.float32)
+        j = 0
+        for c in self.numeric:
+            X[:, j] = np.asarray(data[c], dtype=np.float32) if c in data else np.nan
+            j += 1
+        for c in self.categorical:
+            X[:, j] = self._codes(c, data[c]) if c in data else np.nan
+            j += 1
+        for c, te in self.target_encoding.items():
+            X[:, j] = self._lookup(data[c], te["map"], te["prior"]) if c in data else te["prior"]
+            j += 1
+        if self.geo:
+            g = self.geo
+            if g["lat_col"] in data and g["lon_col"] in data:
+                lat = np.asarray(data[g["lat_col"]], dtype=np.float64)
+                lon = np.asarray(data[g["lon_col"]], dtype=np.float64)
+                X[:, j] = haversine_km(lat, lon, g["center_lat"], g["center_lon"])
+            else:
+                X[:, j] = np.nan
+            j += 1
+        for c, vocab in self.multi_hot.items():
+            block = X[:, j:j + len(vocab)]
+            block[:] = 0.0
+            if c in data:
+                index = self._mh_index[c]
+                for i, items in enumerate(data[c]):
+                    if items is None or isinstance(items, float):
+                        continue
+                    for it in items:
+                        k = index.get(norm_category(it))
+                        if k is not None:
+                            block[i, k] = 1.0
+            j += len(vocab)
+        return X
+
+    def transform_one(self, record: Mapping[str, Any], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Caminho de uma linha só (sem np.unique), escrevendo num buffer pré-alocado se houver."""
+        if out is None:
+            out = np.empty((1, self.n_features), dtype=np.float32)
+        row = out[0]
+        j = 0
+        for c in self.numeric:
+            v = record.get(c)
+            row[j] = np.nan if v is None else v
+            j += 1
+        for c in self.categorical:
+            row[j] = self._code_one(c, record.get(c))
+            j += 1
+        for c, te in self.target_encoding.items():
+            row[j] = te["map"].get(norm_category(record.get(c)), te["prior"])
+            j += 1
+        if self.geo:
+            g = self.geo
+            lat, lon = record.get(g["lat_col"]), record.get(g["lon_col"])
+            row[j] = np.nan if lat is None or lon is None else haversine_km(lat, lon, g["center_lat"], g["center_lon"])
+            j += 1
+        if self.multi_hot:
+            row[j:] = 0.0
+            for c, vocab in self.multi_hot.items():
+                index = self._mh_index[c]
+                for it in record.get(c) or ():
+                    k = index.get(norm_category(it))
+                    if k is not None:
+                        row[j + k] = 1.0
+                j += len(vocab)
+        return out
+
+    def with_text(self, X: np.ndarray, data: Mapping[str, Any]):
+        """Sem bloco de texto devolve X; com ele, a CSR [X | hashing do título + descrição]."""
+        if not self.text:
+            return X
+        import text_features
+        if self._vectorizer is None:
+            self._vectorizer = text_features.make_vectorizer(self.text)
+        T = text_features.encode(self.text, data, X.shape[0], self._vectorizer)
+        return text_features.with_dense(X, T)
+
+    # ---------- persistência ----------
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "format_version": PIPELINE_FORMAT_VERSION,
+            "numeric": self.numeric,
+            "categorical": self.categorical,
+            "target_encoding": self.target_encoding,
+            "multi_hot": self.multi_hot,
+            "geo": self.geo,
+            "text": self.text,
+            "columns": self.columns,
+        }
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "FeaturePipeline":
+        # format_version 1 não tinha os blocos extras (nem a 2, o texto); os .get() mantêm compatibilidade
+        return cls(d["numeric"], d["categorical"], d.get("target_encoding"), d.get("multi_hot"), d.get("geo"),
+                   d.get("text"))
+
+    @classmethod
+    def load(cls, path: str) -> "FeaturePipeline":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def legacy(cls) -> "FeaturePipeline":
+        """Para modelos antigos, salvos sem o artefato: reproduz o mapeamento fixo que a API usava."""
+        return LegacyPipeline(["total_area_m2"], {"property_type": ["apartment", "home", "unit"]})
+
+
+class LegacyPipeline(FeaturePipeline):
+    """
+    Mapeamento da API antiga (anterior ao feature_pipeline.json): substring no slug em maiúsculas,
+    HOME/CASA -> 1, UNIT/CONJUNTO -> 2, qualquer outro (inclusive ausente) -> 0.
+    """
+
+    RULES = (("HOME", 1.0), ("CASA", 1.0), ("UNIT", 2.0), ("CONJUNTO", 2.0))
+    DEFAULT_CODE = 0.0
+
+    @classmethod
+    def _legacy_code(cls, value: Any) -> float:
+        tipo = "" if is_null(value) else str(value).upper()
+        return next((code for sub, code in cls.RULES if sub in tipo), cls.DEFAULT_CODE)
+
+    def _codes(self, col: str, values) -> np.ndarray:
+        vals = np.asarray(values, dtype=object).ravel()
+        if not vals.size:
+            return np.empty(0, dtype=np.float32)
+        uniq, inv = np.unique(np.where(np.frompyfunc(is_null, 1, 1)(vals).astype(bool), "", vals.astype(str)),
+                              return_inverse=True)
+        return np.array([self._legacy_code(u) for u in uniq], dtype=np.float32)[inv]
+
+    def _code_one(self, col: str, value: Any) -> float:
+        return self._legacy_code(value)
@@ -0,0 +1,25 @@
+"""
+Configuração do gunicorn no modo multi-worker (start.sh com WEB_CONCURRENCY > 1, sempre com --preload).
+
+Com --preload o modelo é carregado uma vez no mestre e os workers o herdam no fork (copy-on-write).
+Por isso os workers não fazem polling do registry: cada hot reload num worker criaria uma cópia privada
+do booster, e a memória deixaria de ser compartilhada. Versão nova entra com um HUP no mestre:
+
+    kill -HUP <pid do mestre>
+
+O gunicorn não reimporta um app pré-carregado no HUP. O on_reload troca o modelo no mestre antes de
+refazer os workers, e eles nascem já com a versão nova, de novo compartilhada. O cubo de estatísticas
+e o índice de comps são abertos no lifespan de cada worker: os workers novos já leem o `latest` do momento.
+"""
+
+
+def on_reload(server):
+    import app  # já importado pelo --preload: o mesmo loader que os workers herdam
+
+    try:
+        trocou = app.loader.reload_if_newer()
+    except Exception as e:
+        print(f"   ⚠️ HUP: falha ao recarregar o modelo no mestre ({e}); workers seguem com {app.loader.version}")
+        return
+    if not trocou:
+        print(f"   🔁 HUP: modelo já está na última versão ({app.loader.version}); só os workers são refeitos")
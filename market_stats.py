@@ -0,0 +1,463 @@
+"""
+Cubo de estatísticas de mercado pré-computado a partir da gold.
+
+Dimensões: cidade, bairro, tipo do imóvel e quartos (5 ou mais agrupados em "5+"). Cada célula guarda
+contagem, somas e um histograma em escala logarítmica do preço e do preço/m². O histograma é o sketch
+de quantis: a mediana sai com erro relativo de no máximo SKETCH_GAMMA - 1. Como histogramas somam,
+os rollups ("*" numa dimensão = todas) e a reconstrução incremental são só somas de células.
+Os histogramas são esparsos (só os bins com contagem), em CSR: offsets por célula + bins + contagens.
+
+Layout publicado (diretório local ou gs://), com o mesmo ponteiro `latest` do registry do modelo:
+  <cubo>/latest                     -> nome da versão ativa (movido só depois dos arquivos)
+  <cubo>/<versão>/index.json        -> dimensões, parâmetros do sketch e chave da célula -> linha
+  <cubo>/<versão>/totals.npy        -> float64 [células, 4]: n, soma do preço, n com área, soma do preço/m²
+  <cubo>/<versão>/{price,ppm2}_{offsets,bins,counts}.npy -> histogramas em CSR
+  <cubo>/parts/<chave>.npz          -> células base de cada arquivo da gold, pela versão do arquivo
+
+Na reconstrução, arquivos da gold que não mudaram reaproveitam a parte salva; a versão do cubo é
+derivada das partes, então gold inalterada não publica nada. A API abre os .npy com mmap: só as
+páginas das células consultadas vão para a memória.
+
+    python market_stats.py --gold "gold/*.parquet" --cube stats/market_cube
+    python market_stats.py --cube stats/market_cube --query city=goiânia property_type=apartment
+"""
+import argparse
+import functools
+import hashlib
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import storage
+from model_loader import publish_model, read_latest, REGISTRY_POINTER
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DIMENSIONS = ("city", "neighborhood", "property_type", "bedrooms")
+DIM_COLUMNS = {
+    "city": "address_city_raw",
+    "neighborhood": "address_neighborhood_raw",
+    "property_type": "property_type",
+    "bedrooms": "bedrooms",
+}
+AREA_COLUMNS = ("total_area_m2", "usable_area_m2")  # a primeira preenchida vale
+ALL = "*"
+BEDROOMS_CAP = 5
+# Bins de largura relativa constante: erro relativo dos quantis <= SKETCH_GAMMA - 1
+SKETCH_GAMMA = 1.03
+PRICE_RANGE = (1e2, 1e8)   # cobre aluguel mensal e venda
+PPM2_RANGE = (1.0, 1e5)
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9)
+# Muda quando o conteúdo das partes muda (invalida as partes já salvas)
+PARTS_FORMAT = 1
+PARTS_DIR = "parts"
+HISTS = ("price", "ppm2")
+CSR_ARRAYS = ("offsets", "bins", "counts")
+CUBE_FILES = ("index.json", "totals.npy") + tuple(f"{h}_{a}.npy" for h in HISTS for a in CSR_ARRAYS)
+
+
+def n_bins(lo: float, hi: float, gamma: float = SKETCH_GAMMA) -> int:
+    return int(np.ceil(np.log(hi / lo) / np.log(gamma)))
+
+
+def _bin_index(values: np.ndarray, lo: float, n: int, gamma: float = SKETCH_GAMMA) -> np.ndarray:
+    # fora da faixa vai para o primeiro/último bin
+    return np.clip(np.floor(np.log(values / lo) / np.log(gamma)), 0, n - 1).astype(np.int64)
+
+
+def sketch_quantiles(bins: np.ndarray, counts: np.ndarray, lo: float, gamma: float = SKETCH_GAMMA,
+                     qs=QUANTILES) -> List[Optional[float]]:
+    """Quantis a partir do histograma esparso (bins crescentes), interpolando geometricamente no bin."""
+    cum = np.cumsum(counts, dtype=np.int64)
+    total = int(cum[-1]) if len(cum) else 0
+    if total == 0:
+        return [None] * len(qs)
+    ranks = np.asarray(qs, dtype=np.float64) * total
+    k = np.minimum(np.searchsorted(cum, ranks, side="left"), len(cum) - 1)
+    before = np.where(k > 0, cum[k - 1], 0)
+    frac = (ranks - before) / counts[k]
+    return (lo * gamma ** (bins[k] + frac)).tolist()
+
+
+def normalize_value(dim: str, value: Any) -> str:
+    """Valor de uma dimensão na chave da célula ("" = desconhecido)."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    if dim == "bedrooms":
+        try:
+            n = int(float(str(value).rstrip("+")))
+        except ValueError:
+            return ""
+        if n < 0:
+            return ""
+        return f"{BEDROOMS_CAP}+" if n >= BEDROOMS_CAP else str(n)
+    return str(value).strip().lower().replace("|", "/")
+
+
+def _normalize_column(dim: str, s: Optional["pd.Series"], n: int) -> np.ndarray:
+    import pandas as pd
+    if s is None:
+        return np.full(n, "", dtype=object)
+    if dim == "bedrooms":
+        v = np.floor(pd.to_numeric(s, errors="coerce").to_numpy(dtype=np.float64))
+        out = np.full(n, "", dtype=object)
+        ok = np.isfinite(v) & (v >= 0)
+        out[ok] = [f"{BEDROOMS_CAP}+" if x >= BEDROOMS_CAP else str(int(x)) for x in v[ok]]
+        return out
+    s = s.astype("string").str.strip().str.lower().str.replace("|", "/", regex=False)
+    return s.fillna("").to_numpy(dtype=object)
+
+
+def cell_key(values: Dict[str, Any]) -> str:
+    """Chave da célula para uma consulta: dimensão ausente = rollup ("*")."""
+    return "|".join(ALL if values.get(d) in (None, "", ALL) else normalize_value(d, values[d])
+                    for d in DIMENSIONS)
+
+
+def _sparse_hist(codes: np.ndarray, bins: np.ndarray, n: int):
+    """Contagem por (célula, bin), só dos pares presentes, ordenada por célula e bin."""
+    pares, counts = np.unique(codes.astype(np.int64) * n + bins, return_counts=True)
+    return pares // n, (pares % n).astype(np.uint16), counts.astype(np.uint32)
+
+
+def base_cells(df: "pd.DataFrame") -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """
+    Células do nível mais fino (sem '*') de um DataFrame da gold.
+    Retorna (chaves, arrays): totals [k, 4] e, por histograma, <h>_cell/<h>_bin/<h>_count (COO).
+    """
+    # pandas só na construção do cubo: a API (MarketCube) não o importa
+    import pandas as pd
+
+    n = len(df)
+    price = pd.to_numeric(df["target_price"], errors="coerce").to_numpy(dtype=np.float64)
+    area = np.full(n, np.nan)
+    for col in reversed(AREA_COLUMNS):
+        if col in df.columns:
+            a = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)
+            area = np.where(np.isfinite(a) & (a > 0), a, area)
+    ok = np.isfinite(price) & (price > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ppm2 = price / area
+    ok_m2 = ok & np.isfinite(ppm2) & (ppm2 > 0)
+
+    dims = [_normalize_column(d, df[DIM_COLUMNS[d]] if DIM_COLUMNS[d] in df.columns else None, n)
+            for d in DIMENSIONS]
+    keys = functools.reduce(lambda a, b: a + "|" + b, dims) if n else np.array([], dtype=object)
+    codes, uniques = pd.factorize(keys[ok])
+    k = len(uniques)
+    m2_codes = pd.Categorical(keys[ok_m2], categories=uniques).codes.astype(np.int64)
+
+    cells = {"totals": np.stack([
+        np.bincount(codes, minlength=k).astype(np.float64),
+        np.bincount(codes, weights=price[ok], minlength=k),
+        np.bincount(m2_codes, minlength=k).astype(np.float64),
+        np.bincount(m2_codes, weights=ppm2[ok_m2], minlength=k),
+    ], axis=1)}
+    for h, c, v, (lo, hi) in (("price", codes, price[ok], PRICE_RANGE), ("ppm2", m2_codes, ppm2[ok_m2], PPM2_RANGE)):
+        nb = n_bins(lo, hi)
+        cells[f"{h}_cell"], cells[f"{h}_bin"], cells[f"{h}_count"] = _sparse_hist(c, _bin_index(v, lo, nb), nb)
+    return np.asarray(uniques, dtype=object), cells
+
+
+def _group_sum(keys: np.ndarray, cells: Dict[str, np.ndarray]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Soma as células de mesma chave (ordem da primeira aparição); histogramas somam por bin."""
+    import pandas as pd
+    codes, uniques = pd.factorize(keys)
+    k = len(uniques)
+    out = {"totals": np.stack([np.bincount(codes, weights=cells["totals"][:, j], minlength=k)
+                               for j in range(cells["totals"].shape[1])], axis=1)
+           if k else cells["totals"][:0]}
+    for h in HISTS:
+        nb = int(cells[f"{h}_bin"].max()) + 1 if len(cells[f"{h}_bin"]) else 1
+        pares, inv = np.unique(codes[cells[f"{h}_cell"]] * nb + cells[f"{h}_bin"], return_inverse=True)
+        out[f"{h}_cell"] = pares // nb
+        out[f"{h}_bin"] = (pares % nb).astype(np.uint16)
+        out[f"{h}_count"] = np.bincount(inv, weights=cells[f"{h}_count"], minlength=len(pares)).astype(np.uint32)
+    return np.asarray(uniques, dtype=object), out
+
+
+def _concat_cells(keys_list: List[np.ndarray], cells_list: List[Dict[str, np.ndarray]]):
+    """Empilha conjuntos de células, deslocando os índices de célula dos histogramas."""
+    offsets = np.cumsum([0] + [len(k) for k in keys_list[:-1]])
+    out = {"totals": np.concatenate([c["totals"] for c in cells_list])}
+    for h in HISTS:
+        out[f"{h}_cell"] = np.concatenate([c[f"{h}_cell"] + off for c, off in zip(cells_list, offsets)])
+        out[f"{h}_bin"] = np.concatenate([c[f"{h}_bin"] for c in cells_list])
+        out[f"{h}_count"] = np.concatenate([c[f"{h}_count"] for c in cells_list])
+    return np.concatenate(keys_list), out
+
+
+def rollup(keys: np.ndarray, cells: Dict[str, np.ndarray]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+    """Acrescenta as 2^len(DIMENSIONS) - 1 agregações com '*' às células base."""
+    parts = np.array([k.split("|") for k in keys], dtype=object).reshape(len(keys), len(DIMENSIONS))
+    all_col = np.full(len(keys), ALL, dtype=object)
+    out_keys, out_cells = [], []
+    for rolled in itertools.product((False, True), repeat=len(DIMENSIONS)):
+        cols = [all_col if r else parts[:, i] for i, r in enumerate(rolled)]
+        k2, c2 = _group_sum(functools.reduce(lambda a, b: a + "|" + b, cols), cells)
+        out_keys.append(k2)
+        out_cells.append(c2)
+    return _concat_cells(out_keys, out_cells)
+
+
+def to_csr(cells: Dict[str, np.ndarray], n_cells: int) -> Dict[str, np.ndarray]:
+    """COO (célula, bin, contagem), já ordenado por célula, -> offsets/bins/counts por histograma."""
+    out = {"totals": cells["totals"]}
+    for h in HISTS:
+        out[f"{h}_offsets"] = np.searchsorted(cells[f"{h}_cell"], np.arange(n_cells + 1)).astype(np.int64)
+        out[f"{h}_bins"] = cells[f"{h}_bin"]
+        out[f"{h}_counts"] = cells[f"{h}_count"]
+    return out
+
+
+# ---------- construção (gold -> cubo) ----------
+
+def _part_key(gold_uri: str) -> str:
+    fs, path = storage.url_to_fs(gold_uri)
+    params = f"{PARTS_FORMAT}|{SKETCH_GAMMA}|{PRICE_RANGE}|{PPM2_RANGE}|{BEDROOMS_CAP}"
+    ident = f"{gold_uri}|{storage.fingerprint(fs.info(path))}|{params}"
+    return hashlib.sha256(ident.encode()).hexdigest()[:16]
+
+
+def _gold_part(gold_uri: str, parts_uri: str) -> Tuple[str, np.ndarray, Dict[str, np.ndarray], bool]:
+    """(chave, chaves das células, arrays, reaproveitada?) de um arquivo da gold."""
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    key = _part_key(gold_uri)
+    part_uri = storage.join(parts_uri, f"{key}.npz")
+    if storage.glob(part_uri):
+        with np.load(storage.local_path(part_uri)) as z:
+            return key, z["keys"].astype(object), {name: z[name] for name in z.files if name != "keys"}, True
+
+    local = storage.local_path(gold_uri)
+    names = pq.read_schema(local).names
+    wanted = ["target_price", *AREA_COLUMNS, *DIM_COLUMNS.values()]
+    keys, cells = base_cells(pd.read_parquet(local, columns=[c for c in wanted if c in names]))
+
+    tmp = tempfile.mkdtemp(prefix="cube_part_")
+    try:
+        f = os.path.join(tmp, f"{key}.npz")
+        np.savez(f, keys=keys.astype(str), **cells)
+        storage.put(f, part_uri)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return key, keys, cells, False
+
+
+def _cleanup(cube_uri: str, keep_parts: List[str], keep_versions: List[str]):
+    """Remove partes de arquivos que saíram/mudaram e versões antigas (mantém a atual e a anterior)."""
+    fs, base = storage.url_to_fs(cube_uri)
+    for p in fs.ls(f"{base.rstrip('/')}/{PARTS_DIR}", detail=False):
+        if os.path.basename(p).rsplit(".", 1)[0] not in keep_parts:
+            fs.rm(p)
+    for p in fs.ls(base, detail=False):
+        name = os.path.basename(p.rstrip("/"))
+        if name not in (PARTS_DIR, REGISTRY_POINTER, *keep_versions) and fs.isdir(p):
+            fs.rm(p, recursive=True)
+
+
+def build_cube(gold_paths: List[str], cube_uri: str) -> str:
+    """Reconstrói o cubo a partir da gold (reaproveitando as partes que não mudaram). Retorna a versão."""
+    import pandas as pd
+
+    t0 = time.perf_counter()
+    paths = sorted({p for pattern in gold_paths for p in storage.glob(pattern)})
+    if not paths:
+        raise FileNotFoundError(f"Nenhum arquivo da gold encontrado em {gold_paths}")
+    parts_uri = storage.join(cube_uri, PARTS_DIR)
+
+    parts = [_gold_part(p, parts_uri) for p in paths]
+    reused = sum(p[3] for p in parts)
+    part_keys = sorted(p[0] for p in parts)
+    version = "cube-" + hashlib.sha256("|".join(part_keys).encode()).hexdigest()[:12]
+    previous = read_latest(cube_uri)
+    if previous == version:
+        print(f"   ♻️ Gold sem mudanças: cubo {version} mantido ({time.perf_counter() - t0:.2f}s)")
+        return version
+
+    keys, cells = _group_sum(*_concat_cells([p[1] for p in parts], [p[2] for p in parts]))
+    n_base = len(keys)
+    keys, cells = rollup(keys, cells)
+    arrays = to_csr(cells, len(keys))
+
+    index = {
+        "version": version,
+        "built_at": pd.Timestamp.now(tz="UTC").isoformat(),
+        "gold": paths,
+        "dimensions": list(DIMENSIONS),
+        "all": ALL,
+        "bedrooms_cap": BEDROOMS_CAP,
+        "sketch": {"gamma": SKETCH_GAMMA, "price_lo": PRICE_RANGE[0], "ppm2_lo": PPM2_RANGE[0],
+                   "quantiles": list(QUANTILES)},
+        "cells": {k: i for i, k in enumerate(keys)},
+    }
+    tmp = tempfile.mkdtemp(prefix="cube_")
+    try:
+        files = [os.path.join(tmp, name) for name in CUBE_FILES]
+        with open(files[0], "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(arr))
+        publish_model(files, cube_uri, version)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    _cleanup(cube_uri, part_keys, [version] + ([previous] if previous else []))
+    print(f"   📊 Cubo {version}: {n_base} células base, {len(keys)} com rollups | "
+          f"{len(parts) - reused}/{len(parts)} arquivos da gold processados | {time.perf_counter() - t0:.2f}s")
+    return version
+
+
+# ---------- leitura (API) ----------
+
+class MarketCube:
+    """
+    Cubo publicado aberto com mmap. A consulta é uma busca no dicionário de células e um
+    cumsum sobre uma linha do histograma. start_polling() troca de versão quando `latest` muda.
+    """
+
+    def __init__(self, uri: str, cache_dir: str = storage.DATA_CACHE_DIR):
+        self.uri = uri
+        self.cache_dir = cache_dir
+        self.error: Optional[str] = None
+        self.reloads = 0
+        self._active: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @property
+    def version(self) -> Optional[str]:
+        active = self._active
+        return active["version"] if active else None
+
+    def _open(self, version: str) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        base = f"{self.uri.rstrip('/')}/{version}"
+        local = {name: storage.local_path(f"{base}/{name}", self.cache_dir) for name in CUBE_FILES}
+        with open(local["index.json"], encoding="utf-8") as f:
+            index = json.load(f)
+        arrays = {name[:-4]: np.load(local[name], mmap_mode="r") for name in CUBE_FILES if name.endswith(".npy")}
+        return {
+            "version": version,
+            "index": index,
+            "cells": index.pop("cells"),
+            **arrays,
+            "load_seconds": round(time.perf_counter() - t0, 3),
+        }
+
+    def reload_if_newer(self) -> bool:
+        with self._lock:
+            latest = read_latest(self.uri)
+            if not latest:
+                raise FileNotFoundError(f"Cubo sem ponteiro '{REGISTRY_POINTER}' em {self.uri}")
+            if latest == self.version:
+                return False
+            antigo = self.version
+            self._active = self._open(latest)  # troca atômica: consultas em curso seguem na versão antiga
+            self.error = None
+            if antigo:
+                self.reloads += 1
+                print(f"   🔄 Cubo de estatísticas trocado: {antigo} -> {latest}")
+            return True
+
+    def start(self, background: bool = True):
+        def _load():
+            try:
+                self.reload_if_newer()
+                print(f"   📊 Cubo de estatísticas {self.version} carregado ({self._active['load_seconds']}s)")
+            except Exception as e:
+                self.error = str(e)
+                print(f"   ⚠️ Cubo de estatísticas indisponível: {e}")
+
+        if background:
+            threading.Thread(target=_load, name="market-cube-loader", daemon=True).start()
+        else:
+            _load()
+
+    def start_polling(self, interval_seconds: float):
+        if interval_seconds <= 0:
+            return
+
+        def _loop():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.reload_if_newer()
+                except Exception as e:
+                    print(f"   ⚠️ Falha no polling do cubo de estatísticas: {e}")
+
+        threading.Thread(target=_loop, name="market-cube-poll", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def query(self, **filters) -> Optional[Dict[str, Any]]:
+        """Estatísticas da célula (None se o cubo não estiver carregado). Sem linhas: n = 0."""
+        active = self._active
+        if active is None:
+            return None
+        key = cell_key(filters)
+        out: Dict[str, Any] = {"versao": active["version"], "filtros": dict(zip(DIMENSIONS, key.split("|")))}
+        row = active["cells"].get(key)
+        if row is None:
+            return {**out, "n": 0, "preco": None, "preco_m2": None}
+        sk = active["index"]["sketch"]
+        n, soma, n_m2, soma_m2 = active["totals"][row].tolist()
+        return {
+            **out,
+            "n": int(n),
+            "preco": _summary(n, soma, _hist_row(active, "price", row), sk["price_lo"], sk),
+            "preco_m2": _summary(n_m2, soma_m2, _hist_row(active, "ppm2", row), sk["ppm2_lo"], sk),
+        }
+
+    def info(self) -> Dict[str, Any]:
+        active = self._active
+        if active is None:
+            return {"carregado": False, "uri": self.uri, "erro": self.error}
+        return {"carregado": True, "uri": self.uri, "versao": active["version"], "celulas": len(active["cells"]),
+                "construido_em": active["index"].get("built_at"), "reloads": self.reloads,
+                "load_seconds": active["load_seconds"], "erro": self.error}
+
+
+def _hist_row(active: Dict[str, Any], h: str, row: int) -> Tuple[np.ndarray, np.ndarray]:
+    start, end = active[f"{h}_offsets"][row:row + 2]
+    return active[f"{h}_bins"][start:end], active[f"{h}_counts"][start:end]
+
+
+def _summary(n: float, soma: float, hist: Tuple[np.ndarray, np.ndarray], lo: float,
+             sketch: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if n <= 0:
+        return None
+    qs = sketch["quantiles"]
+    valores = sketch_quantiles(hist[0], hist[1], lo, sketch["gamma"], qs)
+    return {"n": int(n), "media": round(soma / n, 2),
+            **{f"p{int(round(q * 100))}": round(v, 2) for q, v in zip(qs, valores)}}
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Cubo de estatísticas de mercado (gold -> agregados com rollups)")
+    ap.add_argument("--cube", required=True, help="Diretório ou prefixo gs:// do cubo")
+    ap.add_argument("--gold", nargs="+", default=None, help="Parquet(s) da gold (aceita glob) para (re)construir")
+    ap.add_argument("--query", nargs="*", default=None, metavar="DIM=VALOR",
+                    help=f"Consulta o cubo publicado (dimensões: {', '.join(DIMENSIONS)})")
+    args = ap.parse_args()
+
+    if args.gold:
+        build_cube(args.gold, args.cube)
+    if args.query is not None:
+        cube = MarketCube(args.cube)
+        cube.reload_if_newer()
+        filtros = dict(q.split("=", 1) for q in args.query)
+        print(json.dumps(cube.query(**filtros), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Métricas da API no formato texto do Prometheus (GET /metrics), sem dependência externa.
+
+Contadores, gauges e histogramas com buckets fixos: observar é um bisect + duas somas sob um
+lock (as observações de inferência vêm das threads do run_in_threadpool). O middleware é ASGI
+puro (sem BaseHTTPMiddleware): só lê o status do `http.response.start` e a rota que o FastAPI
+deixa no scope, então o rótulo é o template (`/predict`), nunca o caminho cru.
+
+Com gunicorn (WEB_CONCURRENCY > 1) cada worker tem as suas métricas: o scrape vê um worker por vez.
+
+    curl localhost:8080/metrics
+"""
+import bisect
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+# Latência de requisição (s): do sub-milissegundo do /stats ao lote grande do /predict/batch
+REQUEST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Inferência e serialização (s): uma linha no preditor compilado fica na casa dos 50 µs
+STAGE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+BATCH_BUCKETS = (1, 10, 100, 1000, 10_000, 100_000)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Rótulo das requisições que não casaram com nenhuma rota (404): evita um rótulo por caminho
+UNMATCHED_ROUTE = "<sem rota>"
+
+
+def _escape(v: str) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pares = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + ([extra] if extra else [])
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _num(v: float) -> str:
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            itens = list(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in itens]
+
+    def render(self) -> str:
+        return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()])
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def set_total(self, value: float, *labels: str):
+        """Espelha um contador mantido por outro objeto (cache, loader), lido na hora do scrape."""
+        with self._lock:
+            self._values[labels] = value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = REQUEST_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # por rótulo: [contagem por bucket (+Inf no fim), soma, total]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            itens = [(k, list(s[0]), s[1], s[2]) for k, s in self._series.items()]
+        out = []
+        for k, counts, soma, total in itens:
+            acumulado = 0
+            for le, c in zip([*map(_num, self.buckets), "+Inf"], counts):
+                acumulado += c
+                le_label = 'le="%s"' % le
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, k, le_label)} {acumulado}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, k)} {_num(soma)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, k)} {total}")
+        return out
+
+
+REGISTRY: List[_Metric] = []
+
+REQUESTS = Counter("api_requests_total", "Requisições HTTP por rota e status.", ["method", "route", "status"])
+REQUEST_SECONDS = Histogram("api_request_duration_seconds", "Latência das requisições HTTP (s), de ponta a ponta.",
+                            ["method", "route"], REQUEST_BUCKETS)
+IN_FLIGHT = Gauge("api_requests_in_flight", "Requisições HTTP em andamento.")
+INFERENCE_SECONDS = Histogram("api_inference_duration_seconds", "Tempo só da previsão do modelo (s), por endpoint.",
+                              ["endpoint"], STAGE_BUCKETS)
+SERIALIZATION_SECONDS = Histogram("api_serialization_duration_seconds",
+                                  "Tempo montando e codificando a resposta JSON (s), por endpoint.",
+                                  ["endpoint"], STAGE_BUCKETS)
+BATCH_ROWS = Histogram("api_batch_rows", "Itens por chamada do /predict/batch.", [], BATCH_BUCKETS)
+MODEL_INFO = Gauge("api_model_info", "Modelo ativo (valor 1), com versão e backend de inferência.", ["version", "backend"])
+MODEL_LOADED = Gauge("api_model_loaded", "1 com modelo carregado e aquecido, 0 caso contrário.")
+MODEL_LOAD_SECONDS = Gauge("api_model_load_seconds", "Tempo de carga do modelo ativo (s).")
+MODEL_WARMUP_SECONDS = Gauge("api_model_warmup_seconds", "Tempo da previsão de aquecimento do modelo ativo (s).")
+MODEL_RELOADS = Counter("api_model_reloads_total", "Trocas de modelo por hot reload desde o início do processo.")
+CACHE_EVENTS = Counter("api_prediction_cache_events_total", "Acertos e faltas do cache de previsões do /predict.", ["result"])
+CACHE_SIZE = Gauge("api_prediction_cache_size", "Itens no cache de previsões do /predict.")
+
+
+def render() -> str:
+    return "\n".join(m.render() for m in REGISTRY) + "\n"
+
+
+class MetricsMiddleware:
+    """Latência, status e requisições em andamento de cada requisição HTTP (ASGI puro)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        t0 = time.perf_counter()
+        status = 500  # exceção sem resposta: o ServerErrorMiddleware devolve 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", UNMATCHED_ROUTE)
+            REQUEST_SECONDS.observe(time.perf_counter() - t0, scope["method"], path)
+            REQUESTS.inc(scope["method"], path, str(status))
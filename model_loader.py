@@ -0,0 +1,347 @@
+"""
+Carregamento do modelo com cache local endereçado por conteúdo.
+
+O arquivo remoto (gs://... ou um diretório local fazendo papel de bucket) é
+identificado pela impressão digital que o próprio storage expõe (md5/ETag/generation
+no GCS, tamanho+mtime no disco local). Se o cache já tem aquela versão, o cold start
+não baixa nada: só lê do disco local. O cache em si (validação, descarte por tamanho,
+download em partes) é o do storage.py, o mesmo que os scripts de dados usam.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import fsspec
+import numpy as np
+
+from compiled_model import COMPILED_FILES, COMPILED_LIB_FILE, COMPILED_MAX_ROWS, load_compiled
+from feature_pipeline import FeaturePipeline, PIPELINE_FILE
+from storage import fetch_cached, fingerprint, latest_cached  # noqa: F401 (fingerprint reexportado)
+
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join("/tmp", "model_cache"))
+# auto = preditor compilado (compiled_model.py) quando publicado e aprovado na paridade; xgboost = sempre o booster
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "auto")
+
+# Falha na carga (registry/GCS fora do ar): get() tenta de novo, com espera dobrando até o teto
+MODEL_RETRY_SECONDS = float(os.getenv("MODEL_RETRY_SECONDS", "2"))
+MODEL_RETRY_MAX_SECONDS = float(os.getenv("MODEL_RETRY_MAX_SECONDS", "60"))
+
+# Formatos nativos do XGBoost: mais rápidos de carregar e sem executar código (ao contrário do pickle)
+NATIVE_EXTS = (".ubj", ".json")
+
+
+def load_model_file(local_path: str):
+    """Carrega o modelo conforme a extensão: formato nativo do XGBoost ou pickle (joblib)."""
+    if local_path.endswith(NATIVE_EXTS):
+        import xgboost as xgb
+        model = xgb.XGBRegressor()
+        model.load_model(local_path)
+        return model
+    import joblib
+    return joblib.load(local_path)
+
+
+# ---------- Registry versionado ----------
+# Layout:  <registry>/latest              -> texto com o nome da versão ativa
+#          <registry>/<versão>/<modelo>  -> artefatos daquela versão
+REGISTRY_POINTER = "latest"
+REGISTRY_MODEL_FILES = ("model_imoveis_xgb.ubj", "model_imoveis_xgb.pkl")
+
+
+def load_pipeline_for(model_uri: str, cache_dir: str = MODEL_CACHE_DIR) -> FeaturePipeline:
+    """Lê o feature_pipeline.json que fica ao lado do modelo; modelos antigos caem no mapeamento legado."""
+    uri = model_uri.rsplit("/", 1)[0] + "/" + PIPELINE_FILE if "/" in model_uri else PIPELINE_FILE
+    fs, path = fsspec.core.url_to_fs(uri)
+    try:
+        if not fs.exists(path):
+            print(f"   ⚠️ {PIPELINE_FILE} não encontrado ao lado do modelo; usando mapeamento legado.")
+            return FeaturePipeline.legacy()
+    except Exception:
+        pass  # sem rede: fetch_cached tenta o cache local
+    local, _ = fetch_cached(uri, cache_dir)
+    return FeaturePipeline.load(local)
+
+
+def load_backend_for(model_uri: str, model, cache_dir: str = MODEL_CACHE_DIR, mode: str = INFERENCE_BACKEND):
+    """(preditor compilado ou None, info). Qualquer falha cai no XGBoost, com o motivo em backend_error."""
+    if mode == "xgboost" or "/" not in model_uri:
+        return None, {"backend": "xgboost"}
+    base = model_uri.rsplit("/", 1)[0]
+    try:
+        fs, path = fsspec.core.url_to_fs(f"{base}/{COMPILED_LIB_FILE}")
+        if not fs.exists(path):
+            return None, {"backend": "xgboost"}
+        locais = [fetch_cached(f"{base}/{name}", cache_dir)[0] for name in COMPILED_FILES]
+        predictor, info = load_compiled(*locais, model)
+    except Exception as e:
+        predictor, info = None, {"backend": "xgboost", "backend_error": str(e)}
+    if predictor is None and "backend_error" in info:
+        print(f"   ⚠️ Backend compilado descartado ({info['backend_error']}); usando o XGBoost.")
+    return predictor, info
+
+
+def read_latest(registry_uri: str) -> Optional[str]:
+    fs, path = fsspec.core.url_to_fs(registry_uri.rstrip("/") + "/" + REGISTRY_POINTER)
+    try:
+        with fs.open(path, "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def publish_model(local_files: List[str], registry_uri: str, version: str) -> str:
+    """
+    Sobe os artefatos para <registry>/<versão>/ e só então move o ponteiro `latest`.
+    Quem faz polling nunca enxerga uma versão incompleta.
+    """
+    base = registry_uri.rstrip("/")
+    fs, _ = fsspec.core.url_to_fs(base)
+    for local in local_files:
+        _, dest = fsspec.core.url_to_fs(f"{base}/{version}/{os.path.basename(local)}")
+        fs.makedirs(os.path.dirname(dest), exist_ok=True)
+        fs.put(local, dest)
+    _, pointer = fsspec.core.url_to_fs(f"{base}/{REGISTRY_POINTER}")
+    with fs.open(pointer, "w") as f:
+        f.write(version)
+    return f"{base}/{version}"
+
+
+def _rss_mb() -> float:
+    """RSS atual do processo (Linux); fora do Linux cai no pico do getrusage."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class LoadedModel:
+    """Modelo + pipeline de features + metadados, trocados juntos numa única atribuição (swap atômico)."""
+
+    __slots__ = ("model", "pipeline", "version", "info", "predictor")
+
+    def __init__(self, model, version: str, info: Dict[str, Any], pipeline: Optional[FeaturePipeline] = None,
+                 predictor=None):
+        self.model = model
+        self.pipeline = pipeline or FeaturePipeline.legacy()
+        self.version = version
+        self.info = info
+        self.predictor = predictor
+
+    def predict(self, X):
+        """
+        Preditor compilado (se carregado) até COMPILED_MAX_ROWS linhas; senão uma única chamada ao
+        booster (sem DataFrame intermediário), que ganha nos lotes grandes.
+        """
+        if self.predictor is not None and X.shape[0] <= COMPILED_MAX_ROWS:
+            return self.predictor.predict(X)
+        return self.model.get_booster().inplace_predict(X)
+
+    def warm_up(self) -> Dict[str, Any]:
+        """
+        Uma previsão descartada (linha toda missing) antes de o modelo virar o ativo: os imports
+        tardios (texto, sklearn) e a primeira chamada do booster/.so saem da primeira requisição.
+        """
+        t0 = time.perf_counter()
+        try:
+            X = np.full((1, self.pipeline.n_features), np.nan, dtype=np.float32)
+            if self.pipeline.text:
+                X = self.pipeline.with_text(X, {c: [""] for c in self.pipeline.text["columns"]})
+            self.predict(X)
+        except Exception as e:
+            print(f"   ⚠️ Aquecimento do modelo falhou: {e}")
+            return {"warmup_error": str(e)}
+        return {"warmup_seconds": round(time.perf_counter() - t0, 4)}
+
+
+class ModelLoader:
+    """
+    Resolve o modelo (registry versionado ou lista de URIs fixos), passa pelo cache e carrega.
+
+    Modos:
+      - "eager": carrega dentro do startup (comportamento antigo);
+      - "background": carrega numa thread, a API responde '/' imediatamente;
+      - "lazy": só carrega na primeira chamada de get().
+
+    `ready` quer dizer "uma carga terminou com sucesso". Se a carga falha, `error` guarda o motivo e
+    get() tenta de novo depois de MODEL_RETRY_SECONDS (dobrando a cada falha, até MODEL_RETRY_MAX_SECONDS):
+    uma falha transitória do registry/GCS não deixa o processo sem modelo até reiniciar.
+
+    Com `registry_uri`, start_polling() verifica o ponteiro `latest` periodicamente,
+    carrega a versão nova numa thread e troca `active` de uma vez. Requisições em
+    andamento continuam com a referência antiga até terminarem.
+    """
+
+    def __init__(self, uris: List[str], cache_dir: str = MODEL_CACHE_DIR, registry_uri: Optional[str] = None):
+        self.uris = uris
+        self.cache_dir = cache_dir
+        self.registry_uri = registry_uri
+        self.active: Optional[LoadedModel] = None
+        self.error: Optional[str] = None
+        self.reloads = 0
+        self.ready = threading.Event()
+        self.failures = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    # atalhos de leitura (sempre a partir de um único snapshot de `active`)
+    @property
+    def model(self):
+        active = self.active
+        return active.model if active else None
+
+    @property
+    def version(self) -> Optional[str]:
+        active = self.active
+        return active.version if active else None
+
+    @property
+    def info(self) -> Dict[str, Any]:
+        active = self.active
+        return active.info if active else {}
+
+    def _load_version(self, uri: str, registry_version: Optional[str]) -> LoadedModel:
+        t0 = time.perf_counter()
+        rss0 = _rss_mb()
+        local, hit = fetch_cached(uri, self.cache_dir)
+        t_fetch = time.perf_counter() - t0
+        model = load_model_file(local)
+        pipeline = load_pipeline_for(uri, self.cache_dir)
+        predictor, backend = load_backend_for(uri, model, self.cache_dir)
+        # sem registry, o diretório do cache já é o hash da versão remota
+        version = registry_version or os.path.basename(os.path.dirname(local))
+        loaded = LoadedModel(model, version, {
+            "version": version,
+            "source": uri,
+            "local_path": local,
+            "cache_hit": hit,
+            "format": os.path.splitext(local)[1].lstrip("."),
+            "features": pipeline.columns,
+            "fetch_seconds": round(t_fetch, 4),
+            "load_seconds": round(time.perf_counter() - t0, 4),
+            "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "rss_mb": round(_rss_mb(), 1),
+            "rss_delta_mb": round(_rss_mb() - rss0, 1),
+            **backend,
+        }, pipeline, predictor)
+        loaded.info.update(loaded.warm_up())
+        return loaded
+
+    def load(self):
+        with self._lock:
+            # quem esperou o lock atrás de uma carga que falhou não tenta de novo antes da hora
+            if self.active is not None or time.monotonic() < self._retry_at:
+                return self.active
+            try:
+                self.active = self._load_version(*self._resolve())
+                self.error = None
+                self.failures = 0
+                self.ready.set()
+            except Exception as e:
+                self.error = str(e)
+                self.failures += 1
+                espera = min(MODEL_RETRY_SECONDS * 2 ** (self.failures - 1), MODEL_RETRY_MAX_SECONDS)
+                self._retry_at = time.monotonic() + espera
+                print(f"   ❌ Falha ao carregar modelo (tentativa {self.failures}, nova tentativa em {espera:.0f}s): {e}")
+            return self.active
+
+    def _resolve(self) -> Tuple[str, Optional[str]]:
+        """Retorna (uri, versão_do_registry). Registry primeiro; URIs fixos como fallback."""
+        if self.registry_uri:
+            try:
+                version = read_latest(self.registry_uri)
+            except Exception as e:
+                print(f"   ⚠️ Registry indisponível ({e}); tentando URIs fixos.")
+                version = None
+            if version:
+                base = f"{self.registry_uri.rstrip('/')}/{version}"
+                for name in REGISTRY_MODEL_FILES:
+                    fs, path = fsspec.core.url_to_fs(f"{base}/{name}")
+                    if fs.exists(path):
+                        return f"{base}/{name}", version
+
+        for uri in self.uris:
+            fs, path = fsspec.core.url_to_fs(uri)
+            try:
+                if fs.exists(path):
+                    return uri, None
+            except Exception:
+                # sem rede: deixa fetch_cached decidir pelo cache local
+                if latest_cached(self.cache_dir, os.path.basename(path)):
+                    return uri, None
+        raise FileNotFoundError(f"Modelo não encontrado em: {', '.join(self.uris)}")
+
+    def start(self, mode: str = "eager"):
+        if mode == "eager":
+            self.load()
+        elif mode == "background":
+            threading.Thread(target=self.load, name="model-loader", daemon=True).start()
+        elif mode != "lazy":
+            raise ValueError(f"MODEL_LOAD_MODE inválido: {mode}")
+
+    def get(self) -> Optional[LoadedModel]:
+        if self.active is None and time.monotonic() >= self._retry_at:
+            # lazy, background ainda rodando ou nova tentativa depois de uma falha: bloqueia até a carga terminar
+            self.load()
+        return self.active
+
+    # ---------- hot reload ----------
+
+    def reload_if_newer(self) -> bool:
+        """Carrega a versão apontada pelo registry se for diferente da ativa. Retorna True se trocou."""
+        if not self.registry_uri:
+            return False
+        latest = read_latest(self.registry_uri)
+        if not latest or latest == self.version:
+            return False
+        uri, version = self._resolve()
+        if version != latest:
+            return False
+        novo = self._load_version(uri, version)  # carrega fora do lock: requisições seguem atendidas
+        antigo = self.version
+        self.active = novo  # swap atômico (uma atribuição de referência)
+        self.reloads += 1
+        self.ready.set()
+        print(f"   🔄 Modelo trocado: {antigo} -> {novo.version} ({novo.info['load_seconds']:.3f}s)")
+        return True
+
+    def start_polling(self, interval_seconds: float):
+        if not self.registry_uri or interval_seconds <= 0:
+            return
+
+        def _loop():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    self.reload_if_newer()
+                except Exception as e:
+                    print(f"   ⚠️ Falha no polling do registry: {e}")
+
+        threading.Thread(target=_loop, name="model-registry-poll", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Baixa/carrega o modelo via cache local e mede o cold start.")
+    ap.add_argument("--uri", default=[], nargs="+", help="URI(s) do modelo (gs://... ou caminho local)")
+    ap.add_argument("--cache-dir", default=MODEL_CACHE_DIR, help="Diretório do cache local")
+    ap.add_argument("--registry", default=None, help="Registry versionado (diretório ou prefixo gs:// com 'latest')")
+    args = ap.parse_args()
+
+    loader = ModelLoader(args.uri, args.cache_dir, args.registry)
+    loader.load()
+    if loader.model is None:
+        raise SystemExit(1)
+    hit = "HIT" if loader.info["cache_hit"] else "MISS"
+    print(f"✅ Modelo {loader.version} carregado ({hit}) em {loader.info['load_seconds']:.3f}s: "
+          f"{loader.info['local_path']}")
+
+
+if __name__ == "__main__":
+    main()
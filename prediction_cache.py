@@ -0,0 +1,88 @@
+"""
+Cache de previsões em memória (LRU + TTL) para a API.
+
+A chave é o vetor de features normalizado (área arredondada + código do tipo).
+Cada entrada pertence a uma versão do modelo: ao trocar a versão, o cache é
+esvaziado automaticamente na próxima consulta.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+class PredictionCache:
+    def __init__(self, maxsize: int = 50000, ttl_seconds: float = 3600.0, area_decimals: int = 1):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self.area_decimals = area_decimals
+        self.version: Optional[str] = None
+        self._data: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def normalize_area(self, area: float) -> float:
+        # com o cache desligado não há chave a compartilhar: mantém a área exata
+        if self.maxsize <= 0:
+            return float(area)
+        return round(float(area), self.area_decimals)
+
+    def _check_version(self, version: Optional[str]):
+        if version != self.version:
+            if self._data:
+                self.invalidations += 1
+            self._data.clear()
+            self.version = version
+
+    def get(self, key: Hashable, version: Optional[str]) -> Optional[float]:
+        if self.maxsize <= 0:
+            return None
+        with self._lock:
+            self._check_version(version)
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: float, version: Optional[str]):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._check_version(version)
+            self._data[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl_seconds,
+            "area_decimals": self.area_decimals,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "model_version": self.version,
+        }
@@ -3,6 +3,19 @@
 # Define onde está a chave (dentro do container, ela estará na raiz /app)
 export GOOGLE_APPLICATION_CREDENTIALS="trabalho-pdm-imoveis-3775c96e52ca.json"
 
-# Inicia o Uvicorn
+# Número de workers (processos). 1 = modo antigo, um único uvicorn.
+WORKERS="${WEB_CONCURRENCY:-1}"
+
+# Inicia o servidor
 # O $PORT é injetado automaticamente pelo Google Cloud Run (geralmente 8080)
-uvicorn app:app --host 0.0.0.0 --port $PORT
\ No newline at end of file
+if [ "$WORKERS" -gt 1 ]; then
+  # Modelo carregado no mestre antes do fork (--preload): os workers compartilham a memória do booster.
+  # Uma thread OpenMP por worker para não disputar os núcleos entre processos.
+  # Sem polling nos workers: versão nova de modelo/cubo/comps entra com `kill -HUP` no mestre (gunicorn.conf.py).
+  export MODEL_PRELOAD=1
+  export OMP_NUM_THREADS="${OMP_NUM_THREADS:-1}"
+  exec gunicorn app:app -c gunicorn.conf.py --preload -w "$WORKERS" -k uvicorn.workers.UvicornWorker \
+    --bind "0.0.0.0:$PORT" --timeout 120
+else
+  exec uvicorn app:app --host 0.0.0.0 --port $PORT
+fi
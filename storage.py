@@ -0,0 +1,258 @@
+"""
+Acesso ao data lake (gs://, diretório local ou qualquer filesystem do fsspec) num lugar só.
+
+- `fetch_cached`: cache local read-through, endereçado pela versão do objeto
+  (md5/ETag/generation no GCS, tamanho+mtime no disco). Confere tamanho e md5 antes de
+  publicar no cache e revalida o tamanho a cada hit. Objetos grandes descem em partes,
+  em paralelo. O cache tem limite de bytes e descarta primeiro o que foi usado há mais tempo.
+- `local_path`: caminho local para ler (arquivos locais passam direto, remotos via cache).
+- `read_parquet` / `write_parquet` / `put` / `glob` / `join` / `ensure_dir`: substituem os
+  `if path.startswith("gs://")` espalhados pelos scripts.
+- `PARQUET_PROFILES`: perfis de escrita (codec, row group, dicionário, estatísticas, ordenação)
+  escolhidos por camada nas CLIs com `--parquet-profile`.
+
+Para testar sem GCS basta apontar para um diretório local ou para `memory://...`.
+"""
+import base64
+import glob as _glob
+import hashlib
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import fsspec
+
+DATA_CACHE_DIR = os.getenv("DATA_CACHE_DIR", os.path.join("/tmp", "datalake_cache"))
+DATA_CACHE_MAX_BYTES = int(os.getenv("DATA_CACHE_MAX_BYTES", str(20 * 2**30)))
+
+# Download em partes: só vale a pena para objetos grandes
+MULTIPART_MIN_BYTES = int(os.getenv("STORAGE_MULTIPART_MIN_BYTES", str(64 * 2**20)))
+PART_BYTES = int(os.getenv("STORAGE_PART_BYTES", str(32 * 2**20)))
+DOWNLOAD_WORKERS = int(os.getenv("STORAGE_DOWNLOAD_WORKERS", "8"))
+
+_evict_lock = threading.Lock()
+
+
+def url_to_fs(uri: str):
+    return fsspec.core.url_to_fs(uri)
+
+
+def is_local(uri: str) -> bool:
+    fs, _ = url_to_fs(uri)
+    protocols = fs.protocol if isinstance(fs.protocol, (tuple, list)) else (fs.protocol,)
+    return "file" in protocols or "local" in protocols
+
+
+def join(base: str, *parts: str) -> str:
+    """os.path.join para caminhos locais; '/' para URIs (gs://, memory://)."""
+    if "://" in base:
+        return "/".join([base.rstrip("/")] + [p.strip("/") for p in parts])
+    return os.path.join(base, *parts)
+
+
+def ensure_dir(uri: str):
+    """Cria o diretório se for local. Em object storage não existem pastas: nada a fazer."""
+    if is_local(uri):
+        os.makedirs(url_to_fs(uri)[1], exist_ok=True)
+
+
+def ensure_parent(uri: str):
+    parent = uri.rsplit("/", 1)[0] if "://" in uri else os.path.dirname(uri)
+    if parent:
+        ensure_dir(parent)
+
+
+def glob(pattern: str) -> List[str]:
+    """Glob local ou remoto; os resultados remotos mantêm o protocolo (gs://...)."""
+    if is_local(pattern):
+        return sorted(_glob.glob(pattern))
+    fs, p = url_to_fs(pattern)
+    if not _glob.has_magic(p):
+        return [pattern] if fs.exists(p) else []
+    return sorted(fs.unstrip_protocol(m) for m in fs.glob(p))
+
+
+def put(local: str, uri: str):
+    ensure_parent(uri)
+    fs, path = url_to_fs(uri)
+    fs.put(local, path)
+
+
+def fingerprint(info: Dict[str, Any]) -> str:
+    """Identidade da versão do objeto remoto, na ordem de preferência do storage."""
+    for key in ("md5Hash", "etag", "ETag", "generation"):
+        if info.get(key):
+            return f"{key}:{info[key]}"
+    return f"size:{info.get('size')}:mtime:{info.get('mtime') or info.get('created')}"
+
+
+def _md5_b64(path: str) -> str:
+    h = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return base64.b64encode(h.digest()).decode("ascii")
+
+
+def _download(fs, path: str, tmp: str, size: Optional[int]):
+    """fs.get para objetos pequenos; acima de MULTIPART_MIN_BYTES, faixas de bytes em paralelo."""
+    if not size or size < MULTIPART_MIN_BYTES or DOWNLOAD_WORKERS <= 1 or not hasattr(os, "pwrite"):
+        fs.get(path, tmp)
+        return
+
+    with open(tmp, "wb") as f:
+        f.truncate(size)
+    fd = os.open(tmp, os.O_WRONLY)
+
+    def parte(start: int):
+        end = min(start + PART_BYTES, size)
+        data = fs.cat_file(path, start=start, end=end)
+        if len(data) != end - start:
+            raise IOError(f"Parte {start}-{end} de {path} veio com {len(data)} bytes")
+        os.pwrite(fd, data, start)
+
+    try:
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as ex:
+            list(ex.map(parte, range(0, size, PART_BYTES)))
+    finally:
+        os.close(fd)
+
+
+def _entries(cache_dir: str) -> List[Tuple[float, int, str]]:
+    """(último uso, bytes, diretório) de cada entrada do cache."""
+    out = []
+    for d in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, d)
+        if not os.path.isdir(entry):
+            continue
+        files = [os.path.join(entry, f) for f in os.listdir(entry)]
+        files = [f for f in files if os.path.isfile(f)]
+        if files:
+            out.append((max(os.path.getmtime(f) for f in files), sum(os.path.getsize(f) for f in files), entry))
+    return out
+
+
+def evict(cache_dir: str, max_bytes: int, keep: Optional[str] = None) -> int:
+    """Remove as entradas usadas há mais tempo até o cache caber em `max_bytes`. Retorna bytes liberados."""
+    if max_bytes <= 0 or not os.path.isdir(cache_dir):
+        return 0
+    with _evict_lock:
+        entries = sorted(_entries(cache_dir))
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, entry in entries:
+            if total <= max_bytes:
+                break
+            if keep and os.path.dirname(keep) == entry:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)  # quem já abriu o arquivo continua lendo (Linux)
+            total -= size
+            freed += size
+        return freed
+
+
+def latest_cached(cache_dir: str, name: str) -> Optional[str]:
+    if not os.path.isdir(cache_dir):
+        return None
+    found = [os.path.join(cache_dir, d, name) for d in os.listdir(cache_dir)]
+    found = [p for p in found if os.path.exists(p)]
+    return max(found, key=os.path.getmtime) if found else None
+
+
+def fetch_cached(uri: str, cache_dir: str = DATA_CACHE_DIR,
+                 max_bytes: int = DATA_CACHE_MAX_BYTES) -> Tuple[str, bool]:
+    """
+    Garante uma cópia local e validada de `uri` dentro de `cache_dir`.
+    Retorna (caminho_local, cache_hit).
+    """
+    fs, path = url_to_fs(uri)
+    name = os.path.basename(path)
+
+    try:
+        info = fs.info(path)
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        # Storage fora do ar: usa a versão mais recente que já estiver no cache
+        local = latest_cached(cache_dir, name)
+        if local:
+            print(f"   ⚠️ Storage indisponível ({e}); usando cópia em cache {local}")
+            return local, True
+        raise
+
+    size = info.get("size")
+    key = hashlib.sha256(f"{uri}|{fingerprint(info)}".encode()).hexdigest()[:16]
+    local = os.path.join(cache_dir, key, name)
+    if os.path.exists(local):
+        if size is None or os.path.getsize(local) == size:
+            os.utime(local)  # marca o uso para o descarte por LRU
+            return local, True
+        print(f"   ⚠️ Cópia em cache de {uri} com tamanho divergente; baixando de novo.")
+        os.remove(local)
+
+    os.makedirs(os.path.dirname(local), exist_ok=True)
+    tmp = f"{local}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        _download(fs, path, tmp, size)
+        if size is not None and os.path.getsize(tmp) != size:
+            raise IOError(f"Tamanho divergente ao baixar {uri}")
+        # No GCS o md5Hash vem em base64; confere antes de publicar no cache
+        if info.get("md5Hash") and _md5_b64(tmp) != info["md5Hash"]:
+            raise IOError(f"Checksum divergente ao baixar {uri}")
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    os.replace(tmp, local)  # atômico: outro processo nunca vê arquivo pela metade
+    evict(cache_dir, max_bytes, keep=local)
+    return local, False
+
+
+def local_path(uri: str, cache_dir: str = DATA_CACHE_DIR) -> str:
+    """Caminho local para leitura: arquivos locais passam direto; remotos passam pelo cache."""
+    if is_local(uri):
+        return url_to_fs(uri)[1]
+    local, hit = fetch_cached(uri, cache_dir)
+    print(f"   {'♻️ Cache local' if hit else '⬇️ Baixado para o cache'}: {uri} -> {local}")
+    return local
+
+
+def read_parquet(uri: str, **kwargs):
+    import pandas as pd
+    return pd.read_parquet(local_path(uri), **kwargs)
+
+
+# ---------- Perfis de escrita Parquet ----------
+# "default" = padrões do pyarrow (snappy, dicionário, estatísticas), o comportamento de sempre.
+# "fast-write": snappy sem dicionário nem estatísticas, row groups grandes; para a bronze/intermediários.
+# "archive": zstd 9 + dicionário, ordenado por listing_id (row groups menores com min/max úteis).
+#   Acima do nível 9 o arquivo quase não diminui e a escrita fica bem mais lenta.
+PARQUET_PROFILES: Dict[str, Dict[str, Any]] = {
+    "default": {},
+    "fast-write": {"compression": "snappy", "use_dictionary": False, "write_statistics": False,
+                   "row_group_size": 1_000_000},
+    "archive": {"compression": "zstd", "compression_level": 9, "use_dictionary": True,
+                "row_group_size": 128_000, "sort_by": ("listing_id", "id")},
+}
+
+
+def parquet_options(df, profile: str = "default"):
+    """Aplica o perfil: devolve (df, kwargs do to_parquet). `sort_by` usa a primeira coluna que existir."""
+    if profile not in PARQUET_PROFILES:
+        raise ValueError(f"Perfil Parquet desconhecido: {profile} (use {', '.join(PARQUET_PROFILES)})")
+    opts = dict(PARQUET_PROFILES[profile])
+    sort_by = opts.pop("sort_by", ())
+    col = next((c for c in sort_by if c in df.columns), None)
+    if col is not None:
+        df = df.sort_values(col, kind="mergesort")
+    return df, opts
+
+
+def write_parquet(df, uri: str, profile: str = "default", **kwargs):
+    ensure_parent(uri)
+    df, opts = parquet_options(df, profile)
+    df.to_parquet(uri, **{**opts, **kwargs})
+    return uri
@@ -0,0 +1,30 @@
+"""
+Testes rápidos (dados sintéticos pequenos) das propriedades que os benchmarks medem em escala:
+paridade entre engines, orçamentos de memória/overhead e correção em falhas.
+
+    python -m pytest -q tests
+"""
+import importlib
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for p in (ROOT, os.path.join(ROOT, "Medallion"), os.path.join(ROOT, "benchmarks")):
+    if p not in sys.path:
+        sys.path.insert(0, p)
+
+# API sem bucket (registry, cubo e comps desligados) e sem cache de previsões: toda chamada chega ao modelo
+API_ENV = {"PREDICTION_CACHE_SIZE": "0", "MODEL_REGISTRY_URI": "", "MARKET_CUBE_URI": "", "COMPS_INDEX_URI": ""}
+
+
+@pytest.fixture(scope="module")
+def api():
+    """Módulo `app` recarregado com API_ENV; o ambiente volta ao original no fim do módulo de teste."""
+    with pytest.MonkeyPatch.context() as mp:
+        for k, v in API_ENV.items():
+            mp.setenv(k, v)
+        mp.delenv("MODEL_PRELOAD", raising=False)
+        import app
+        yield importlib.reload(app)
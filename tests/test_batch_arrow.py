@@ -0,0 +1,68 @@
+import asyncio
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pytest
+
+import bench_metrics_overhead as bench
+from _synthetic import install_model, train_synthetic_model
+
+ARROW = "application/vnd.apache.arrow.stream"
+
+
+def stream(**cols) -> bytes:
+    table = pa.table(cols)
+    sink = pa.BufferOutputStream()
+    with ipc.new_stream(sink, table.schema) as w:
+        w.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def test_arrow_valido_igual_ao_json(api):
+    body = stream(total_area_m2=pa.array([80, 120], pa.int32()),
+                  property_type_slug=pa.array(["APARTMENT", "HOME"]).dictionary_encode(),
+                  bedrooms=pa.array([2.0, None]), amenities=pa.array([["POOL"], None]))
+    cols = api.parse_batch_body(body, ARROW)
+    json_cols = api.parse_batch_body(b'[{"total_area_m2": 80, "property_type_slug": "APARTMENT", "bedrooms": 2,'
+                                     b' "amenities": ["POOL"]}, {"total_area_m2": 120, "property_type_slug": "HOME"}]',
+                                     "application/json")
+    assert cols["total_area_m2"].dtype == np.float64 and list(cols["total_area_m2"]) == json_cols["total_area_m2"]
+    assert cols["property_type_slug"] == json_cols["property_type_slug"]
+    assert cols["amenities"] == json_cols["amenities"]
+    assert cols["bedrooms"][0] == 2.0 and np.isnan(cols["bedrooms"][1])
+
+
+@pytest.mark.parametrize("cols, erro", [
+    ({"total_area_m2": pa.array([80.0, None])}, ValueError),                # nulo em campo obrigatório
+    ({"total_area_m2": pa.array(["80", "grande"])}, ValueError),            # texto não numérico
+    ({"total_area_m2": pa.array([[80.0]])}, TypeError),                     # tipo errado
+    ({"total_area_m2": pa.array([80.0]), "property_type_slug": pa.array([None], pa.string())}, ValueError),
+    ({"total_area_m2": pa.array([80.0]), "property_type_slug": pa.array([1])}, TypeError),
+    ({"total_area_m2": pa.array([80.0]), "amenities": pa.array([[1, 2]])}, TypeError),
+])
+def test_arrow_invalido(api, cols, erro):
+    with pytest.raises(erro):
+        api.parse_batch_body(stream(**cols), ARROW)
+
+
+def test_arrow_invalido_responde_422_como_o_json(api):
+    install_model(api, train_synthetic_model(n=500, n_estimators=5))
+
+    async def post(body, content_type):
+        escopo = bench.scope("POST", "/predict/batch")
+        escopo["headers"] = [(b"content-type", content_type.encode())]
+        out = {}
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                out["status"] = message["status"]
+
+        await api.app(escopo, receive, send)
+        return out["status"]
+
+    assert asyncio.run(post(stream(total_area_m2=pa.array([80.0, None])), ARROW)) == 422
+    assert asyncio.run(post(b'[{"total_area_m2": null}]', "application/json")) == 422
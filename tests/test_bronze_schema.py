@@ -0,0 +1,25 @@
+import os
+
+import bronze_dataframe
+from _synthetic import synthetic_raw_csv
+from bench_bronze_schema import diferencas
+
+
+def test_schema_igual_ao_caminho_completo_lendo_o_csv_uma_vez(tmp_path, monkeypatch):
+    csv = synthetic_raw_csv(str(tmp_path / "raw.csv"), 120)
+    schemas = str(tmp_path / "schemas")
+    leituras = []
+    read_csv = bronze_dataframe._read_csv
+    monkeypatch.setattr(bronze_dataframe, "_read_csv", lambda *a, **kw: leituras.append(kw) or read_csv(*a, **kw))
+
+    full = bronze_dataframe.bronze_ingest(csv, str(tmp_path / "full"), use_schema=False)
+    saidas = {}
+    for modo in ("cold", "cached"):
+        leituras.clear()
+        saidas[modo] = bronze_dataframe.bronze_ingest(csv, str(tmp_path / modo), schema_dir=schemas)
+        assert len(leituras) == 1, f"{modo}: CSV lido {len(leituras)} vezes"
+        assert diferencas(full, saidas[modo]) == []
+
+    # a primeira ingestão grava o schema; a segunda lê com os dtypes dele
+    assert len(os.listdir(schemas)) == 1
+    assert leituras[0].get("dtype")
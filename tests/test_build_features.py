@@ -0,0 +1,23 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from bench_train_memory import gerar_gold
+from build_features import FEATURES_CACHE_DIR, build_feature_matrix
+
+
+def test_listing_ids_vem_do_cache_dir_pedido(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # o FEATURES_CACHE_DIR padrão (relativo) cairia aqui se fosse usado
+    gold = str(tmp_path / "gold.parquet")
+    gerar_gold(gold, 500)
+    cache = str(tmp_path / "outro_cache")
+    esperado = pd.read_parquet(gold)["listing_id"].to_numpy()
+
+    for _ in range(2):  # a primeira chamada gera a matriz, a segunda sai do cache
+        X, _, _, meta = build_feature_matrix(gold, cache_dir=cache)
+        ids = np.load(meta["listing_ids_path"])
+        assert meta["listing_ids_path"].startswith(cache)
+        assert len(ids) == X.shape[0]
+        np.testing.assert_array_equal(ids, esperado)
+    assert not os.path.exists(FEATURES_CACHE_DIR)
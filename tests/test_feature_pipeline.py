@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+from feature_pipeline import FeaturePipeline
+
+
+def _pipeline():
+    df = pd.DataFrame({"total_area_m2": [50.0, 80.0, 120.0, 200.0],
+                       "property_type": ["APARTMENT", "HOME", "UNIT", "HOME"],
+                       "address_neighborhood_raw": ["Setor Bueno", "Centro", "Centro", "Marista"],
+                       "target_price": [3e5, 5e5, 4e5, 9e5]})
+    return FeaturePipeline.fit(df, numeric=["total_area_m2"], categorical=["property_type"],
+                               target_encoded=["address_neighborhood_raw"], target="target_price")
+
+
+def test_lote_e_uma_linha_iguais_com_nulos():
+    p = _pipeline()
+    tipos = ["APARTMENT", None, np.nan, pd.NA, "nan", "None", "castelo", "home"]
+    bairros = ["Centro", None, np.nan, pd.NA, "nan", "none", "Nova", "marista"]
+    data = {"total_area_m2": [70.0] * len(tipos), "property_type": tipos, "address_neighborhood_raw": bairros}
+    lote = p.transform(data)
+    um = np.vstack([p.transform_one({k: v[i] for k, v in data.items()}) for i in range(len(tipos))])
+    np.testing.assert_array_equal(lote, um)
+    assert np.isnan(lote[1:4, 1]).all()
+    prior = p.target_encoding["address_neighborhood_raw"]["prior"]
+    np.testing.assert_allclose(lote[1:4, 2], prior)
+
+
+def test_legacy_reproduz_o_mapeamento_por_substring():
+    p = FeaturePipeline.legacy()
+    tipos = ["APARTMENT", "HOME", "casa_de_vila", "CONJUNTO_COMERCIAL", "UNIT", "TERRENO", None, "PENTHOUSE"]
+    esperado = [0, 1, 1, 2, 2, 0, 0, 0]
+    lote = p.transform({"total_area_m2": [80.0] * len(tipos), "property_type": tipos})
+    assert p.columns == ["total_area_m2", "property_type_code"]
+    assert lote[:, 1].tolist() == esperado
+    assert [p.transform_one({"total_area_m2": 80.0, "property_type": t})[0, 1] for t in tipos] == esperado
+
+
+def test_encode_one_devolve_linha_nova_a_cada_chamada(api):
+    p = _pipeline()
+    a = api.encode_one(p, {"total_area_m2": 50.0, "property_type": "HOME"})
+    b = api.encode_one(p, {"total_area_m2": 90.0, "property_type": "UNIT"})
+    # a inferência roda em outra thread: a linha de uma requisição não pode ser reescrita pela seguinte
+    assert not np.shares_memory(a, b)
+    assert a[0, 0] == 50.0 and b[0, 0] == 90.0
@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+duckdb = pytest.importorskip("duckdb")
+
+import bronze_dataframe  # noqa: E402
+import gold_dataframe  # noqa: E402
+import silver_dataframe  # noqa: E402
+from _synthetic import synthetic_raw_csv  # noqa: E402
+from bench_medallion_engines import SILVER_TABLES, compare  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def saidas(tmp_path_factory):
+    """Silver e gold (venda e aluguel) de um bronze sintético pequeno, em cada engine."""
+    tmp = str(tmp_path_factory.mktemp("engines"))
+    csv = synthetic_raw_csv(os.path.join(tmp, "raw.csv"), 150)
+    bronze = [bronze_dataframe.bronze_ingest(csv, os.path.join(tmp, "bronze"))]
+    for engine in silver_dataframe.ENGINES:
+        silver = os.path.join(tmp, f"silver_{engine}")
+        silver_dataframe.build_silver_tables(bronze, silver, engine=engine)
+        gold_dataframe.join_listings_pricing(silver, os.path.join(tmp, f"gold_{engine}.parquet"), engine=engine)
+        gold_dataframe.join_listings_pricing(silver, os.path.join(tmp, f"gold_rental_{engine}.parquet"),
+                                             business_type="rental", engine=engine)
+    return tmp
+
+
+@pytest.mark.parametrize("tabela", SILVER_TABLES)
+def test_silver_igual_nas_duas_engines(saidas, tabela):
+    assert compare(os.path.join(saidas, "silver_pandas", tabela), os.path.join(saidas, "silver_duckdb", tabela)) == []
+
+
+@pytest.mark.parametrize("gold", ["gold", "gold_rental"])
+def test_gold_igual_nas_duas_engines(saidas, gold):
+    problemas = compare(os.path.join(saidas, f"{gold}_pandas.parquet"), os.path.join(saidas, f"{gold}_duckdb.parquet"))
+    assert problemas == []
+
+
+def test_duckdb_fecha_conexoes_e_aceita_aspas_no_temp_dir(saidas, tmp_path, monkeypatch):
+    import duckdb_engine
+
+    monkeypatch.setattr(duckdb_engine, "DUCKDB_TEMP_DIR", str(tmp_path / "spill d'água"))
+    abertas = []
+    connect = duckdb_engine.connect
+    monkeypatch.setattr(duckdb_engine, "connect", lambda: abertas.append(connect()) or abertas[-1])
+
+    bronze = [os.path.join(saidas, "bronze", f) for f in os.listdir(os.path.join(saidas, "bronze"))
+              if f.endswith(".parquet")]
+    silver = str(tmp_path / "silver")
+    duckdb_engine.build_silver_tables_duckdb(bronze, silver)
+    duckdb_engine.join_listings_pricing_duckdb(silver, str(tmp_path / "gold.parquet"))
+
+    assert len(abertas) == 2
+    for con in abertas:
+        with pytest.raises(duckdb.ConnectionException):
+            con.execute("SELECT 1")
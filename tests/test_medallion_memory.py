@@ -0,0 +1,75 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import bench_medallion_memory as bench
+from _synthetic import ROOT
+import silver_dataframe
+
+ROWS, BRONZE_ROWS = 2000, 300
+
+
+@pytest.fixture(scope="module")
+def entrada(tmp_path_factory):
+    tmp = str(tmp_path_factory.mktemp("medallion_memory"))
+    bench.preparar(tmp, ROWS, BRONZE_ROWS)
+    return tmp
+
+
+@pytest.mark.parametrize("func", list(bench.BUDGET_MB_PER_10K))
+def test_pico_dentro_do_orcamento(entrada, func):
+    """Mesmo orçamento do bench_medallion_memory.py (base + MB por 10 mil linhas), numa entrada pequena."""
+    out = subprocess.run([sys.executable, bench.__file__, "--child", func, entrada],
+                         capture_output=True, text=True, timeout=300)
+    linhas = [l for l in out.stdout.splitlines() if l.startswith("{")]
+    assert out.returncode == 0 and linhas, out.stderr[-500:]
+    r = json.loads(linhas[-1])
+    orcamento = bench.BUDGET_BASE_MB + bench.BUDGET_MB_PER_10K[func] * r["rows"] / 10_000
+    assert r["delta_mb"] <= orcamento, f"{func}: cresceu {r['delta_mb']} MB (orçamento {orcamento:.0f} MB)"
+
+
+def test_silver_le_colunas_aninhadas_uma_de_cada_vez(entrada, tmp_path, monkeypatch):
+    """O bronze inteiro nunca é carregado: escalares primeiro, depois cada *_arr sozinha."""
+    leituras = []
+    read_parquet = silver_dataframe.pd.read_parquet
+
+    def registrar(path, columns=None, **kwargs):
+        leituras.append(columns)
+        return read_parquet(path, columns=columns, **kwargs)
+
+    monkeypatch.setattr(silver_dataframe.pd, "read_parquet", registrar)
+    silver_dataframe.build_silver_tables([os.path.join(entrada, "bronze.parquet")], str(tmp_path / "silver"))
+
+    assert leituras and None not in leituras
+    escalares, *aninhadas = leituras
+    assert not set(escalares) & set(silver_dataframe.NESTED_BRONZE_COLS)
+    assert aninhadas and all(len(c) == 1 and c[0] in silver_dataframe.NESTED_BRONZE_COLS for c in aninhadas)
+
+
+def test_copy_on_write_so_durante_as_transformacoes_no_pandas_2(tmp_path):
+    """Com pandas < 3 a opção global não muda no import; cada camada liga só enquanto roda."""
+    codigo = f"""
+import contextlib, sys
+sys.path[:0] = {[ROOT, os.path.join(ROOT, "Medallion")]!r}
+import pandas as pd
+pd.__version__ = "2.2.3"
+chamadas = []
+pd.set_option = lambda *a: chamadas.append(("set_option",) + a)
+pd.option_context = contextlib.contextmanager(lambda *a: (yield chamadas.append(("option_context",) + a)))
+import bronze_dataframe, silver_dataframe, gold_dataframe
+assert chamadas == [], chamadas
+faltando = {str(tmp_path / "nao_existe")!r}
+for f, args in [(bronze_dataframe.bronze_ingest, (faltando + ".csv", faltando)),
+                (silver_dataframe.build_silver_tables, ([faltando + ".parquet"], faltando)),
+                (gold_dataframe.join_listings_pricing, (faltando, faltando + ".parquet"))]:
+    try:
+        f(*args)
+    except Exception:
+        pass
+assert chamadas == [("option_context", "mode.copy_on_write", True)] * 3, chamadas
+"""
+    out = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr[-1000:]
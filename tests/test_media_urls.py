@@ -0,0 +1,26 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from media_urls import MediaUrls, split_urls
+
+URLS = ["https://cdn.x/fit-in/870x653/named.images.sp/0a1b2c3d4e5f60718293a4b5c6d7e8f9/foto.jpg",
+        None,
+        "https://cdn.x/fit-in/870x653/named.images.sp/nao-hex/foto.jpg",
+        "sem-barras"]
+
+
+@pytest.fixture
+def urls():
+    return MediaUrls(*split_urls(pd.Series(URLS, dtype=object)))
+
+
+def test_reconstroi_as_urls(urls):
+    assert [urls[i] for i in range(len(urls))] == URLS
+    assert urls.take([0, 2, 3]) == [URLS[0], URLS[2], URLS[3]]
+
+
+@pytest.mark.parametrize("acesso", [lambda m: [m[1]], lambda m: [m[np.int64(1)]], lambda m: m[1:2],
+                                    lambda m: m.take([1]), lambda m: m.take(np.array([1]))])
+def test_url_nula_e_none_em_todo_acesso(urls, acesso):
+    assert acesso(urls) == [None]  # [nan] != [None]
@@ -0,0 +1,66 @@
+import asyncio
+import json
+import statistics
+
+import numpy as np
+import pytest
+
+import bench_metrics_overhead as bench
+from _synthetic import install_model, train_synthetic_model
+
+# Só o custo relativo: µs absolutos dependem da máquina (o orçamento em µs fica no benchmark)
+BUDGET_PCT = 3
+RODADAS = 5
+CORPO = json.dumps({"total_area_m2": 80.0, "property_type_slug": "APARTMENT"}).encode()
+
+
+@pytest.fixture(scope="module")
+def api_com_modelo(api):
+    install_model(api, train_synthetic_model(n=2000, n_estimators=50))
+    return api
+
+
+def test_custo_relativo_dentro_do_orcamento(api_com_modelo):
+    import metrics
+    api = api_com_modelo
+
+    async def rodada():
+        bare = await bench.por_chamada(bench.vazio, 1000, rodadas=3)
+        wrapped = await bench.por_chamada(metrics.MetricsMiddleware(bench.vazio), 1000, rodadas=3)
+        tempos = []
+        for _ in range(200):
+            t0 = bench.time.perf_counter()
+            await bench.call(api.app, "POST", "/predict", CORPO)
+            tempos.append(bench.time.perf_counter() - t0)
+        custo = max(0.0, wrapped - bare) + bench.observacoes_us(metrics, 1000)
+        return custo / (float(np.percentile(tempos, 50)) * 1e6) * 100
+
+    async def medir():
+        for _ in range(100):  # aquecimento
+            await bench.call(api.app, "POST", "/predict", CORPO)
+        return [await rodada() for _ in range(RODADAS)]
+
+    pct = statistics.median(asyncio.run(medir()))
+    assert pct <= BUDGET_PCT, f"métricas custam {pct:.2f}% da p50 do /predict (mediana de {RODADAS} rodadas)"
+
+
+def test_exposicao_no_formato_do_prometheus(api_com_modelo):
+    import metrics
+    api = api_com_modelo
+
+    async def rodar(n):
+        metrics.REQUESTS.clear()
+        for _ in range(n):
+            status, _ = await bench.call(api.app, "POST", "/predict", CORPO)
+            assert status == 200
+        await bench.call(api.app, "GET", "/rota-que-nao-existe")
+        return await bench.call(api.app, "GET", "/metrics")
+
+    status, texto = asyncio.run(rodar(25))
+    linhas = texto.decode().splitlines()
+    assert status == 200
+    assert [l for l in linhas if l and not l.startswith("# ") and not bench.SAMPLE_LINE.match(l)] == []
+    assert 'api_requests_total{method="POST",route="/predict",status="200"} 25' in linhas
+    # 404 sai com o rótulo fixo, nunca com o caminho cru
+    assert not any("rota-que-nao-existe" in l for l in linhas)
+    assert any(f'route="{metrics.UNMATCHED_ROUTE}",status="404"' in l for l in linhas)
@@ -0,0 +1,42 @@
+import numpy as np
+import xgboost as xgb
+
+import model_loader
+from model_loader import ModelLoader
+
+
+def _salvar_modelo(path: str):
+    rng = np.random.default_rng(0)
+    X = rng.uniform(25, 600, (200, 2)).astype(np.float32)
+    xgb.XGBRegressor(n_estimators=5, max_depth=2).fit(X, X[:, 0] * 5000).save_model(path)
+
+
+def test_falha_transitoria_tenta_de_novo_com_espera(tmp_path, monkeypatch):
+    uri = str(tmp_path / "model_imoveis_xgb.ubj")
+    loader = ModelLoader([uri], str(tmp_path / "cache"))
+    tentativas = []
+    resolve = loader._resolve
+    monkeypatch.setattr(loader, "_resolve", lambda: tentativas.append(1) or resolve())
+
+    monkeypatch.setattr(model_loader, "MODEL_RETRY_SECONDS", 3600)
+    assert loader.get() is None  # modelo ainda não publicado
+    assert loader.get() is None  # dentro da espera: não tenta de novo
+    assert len(tentativas) == 1 and loader.error and not loader.ready.is_set()
+
+    _salvar_modelo(uri)
+    loader._retry_at = 0.0  # a espera passou
+    assert loader.get() is not None
+    assert len(tentativas) == 2 and loader.ready.is_set() and loader.error is None and loader.failures == 0
+
+
+def test_espera_dobra_a_cada_falha(tmp_path, monkeypatch):
+    loader = ModelLoader([str(tmp_path / "nao_existe.ubj")], str(tmp_path / "cache"))
+    monkeypatch.setattr(model_loader, "MODEL_RETRY_SECONDS", 1)
+    monkeypatch.setattr(model_loader, "MODEL_RETRY_MAX_SECONDS", 3)
+    esperas = []
+    for _ in range(4):
+        antes = model_loader.time.monotonic()
+        loader._retry_at = 0.0
+        loader.get()
+        esperas.append(round(loader._retry_at - antes))
+    assert esperas == [1, 2, 3, 3]
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import time
+import urllib.request
+
+import numpy as np
+import pytest
+import xgboost as xgb
+
+from _synthetic import ROOT
+from model_loader import publish_model
+
+
+class Registro:
+    """Fake de loader/cubo/índice: só anota o que o lifespan chamou."""
+
+    def __init__(self):
+        self.chamadas = []
+        self.model = self.error = self.version = None
+
+    def __getattr__(self, nome):
+        return lambda *a, **kw: self.chamadas.append(nome)
+
+
+@pytest.mark.parametrize("preload, polling", [(False, True), (True, False)])
+def test_polling_por_worker_so_sem_preload(api, monkeypatch, preload, polling):
+    fakes = {"loader": Registro(), "market_cube": Registro(), "comps_index": Registro()}
+    for nome, fake in fakes.items():
+        monkeypatch.setattr(api, nome, fake)
+    monkeypatch.setattr(api, "MODEL_PRELOAD", preload)
+
+    async def subir_e_descer():
+        async with api.lifespan(api.app):
+            pass
+
+    asyncio.run(subir_e_descer())
+    for nome, fake in fakes.items():
+        assert ("start_polling" in fake.chamadas) == polling, nome
+        assert "start" in fake.chamadas, nome
+
+
+def _publicar(registry: str, tmp, versao: str, fator: float):
+    rng = np.random.default_rng(0)
+    X = rng.uniform(25, 600, (300, 2)).astype(np.float32)
+    path = os.path.join(tmp, versao, "model_imoveis_xgb.ubj")
+    os.makedirs(os.path.dirname(path))
+    xgb.XGBRegressor(n_estimators=5, max_depth=2).fit(X, X[:, 0] * fator).save_model(path)
+    publish_model([path], registry, versao)
+
+
+def _versao(url: str):
+    try:
+        with urllib.request.urlopen(url + "/ready", timeout=2) as r:
+            return json.loads(r.read())["versao"]
+    except OSError:
+        return None
+
+
+@pytest.mark.skipif(shutil.which("gunicorn") is None, reason="gunicorn não instalado")
+def test_hup_troca_o_modelo_no_mestre_e_refaz_os_workers(tmp_path):
+    registry = str(tmp_path / "registry")
+    _publicar(registry, str(tmp_path), "v1", 5000)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    env = dict(os.environ, WEB_CONCURRENCY="2", PORT=str(port), MODEL_REGISTRY_URI=registry,
+               MODEL_URI=str(tmp_path / "sem_fallback.ubj"), MODEL_CACHE_DIR=str(tmp_path / "cache"),
+               MODEL_POLL_SECONDS="0.2", MARKET_CUBE_URI="", COMPS_INDEX_URI="")
+    url = f"http://127.0.0.1:{port}"
+    srv = subprocess.Popen(["bash", os.path.join(ROOT, "start.sh")], cwd=ROOT, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        limite = time.time() + 60
+        while _versao(url) != "v1":
+            assert time.time() < limite and srv.poll() is None, "gunicorn não ficou pronto"
+            time.sleep(0.1)
+
+        _publicar(registry, str(tmp_path), "v2", 6000)
+        time.sleep(1)  # vários intervalos de MODEL_POLL_SECONDS: com --preload os workers não fazem polling
+        assert {_versao(url) for _ in range(10)} == {"v1"}
+
+        srv.send_signal(signal.SIGHUP)  # o exec do start.sh deixa o mestre do gunicorn neste pid
+        limite = time.time() + 60
+        while {_versao(url) for _ in range(10)} != {"v2"}:
+            assert time.time() < limite, "workers não passaram para a v2 depois do HUP"
+            time.sleep(0.2)
+    finally:
+        srv.terminate()
+        srv.wait(timeout=30)
@@ -0,0 +1,73 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import price_history
+import storage
+
+PRICING_TYPE = pa.list_(pa.struct([("businessType", pa.string()), ("price", pa.string())]))
+
+
+def escrever_lote(path: str, ids, precos, dia: str):
+    ts = pd.Timestamp(dia, tz="UTC")
+    pq.write_table(pa.table({
+        "id": pa.array([str(i) for i in ids]),
+        "updatedAt_ts": pa.array([ts] * len(ids), pa.timestamp("us", tz="UTC")),
+        "bronze_ingestion_ts": pa.array([ts] * len(ids), pa.timestamp("us", tz="UTC")),
+        "pricinginfos_arr": pa.array([[{"businessType": "SALE", "price": str(p)}] for p in precos], PRICING_TYPE),
+    }), path)
+
+
+@pytest.fixture
+def lotes(tmp_path):
+    bronze = tmp_path / "bronze"
+    bronze.mkdir()
+    ids = np.arange(200)
+    precos = 100_000 + ids * 1000
+    escrever_lote(str(bronze / "listings_bronze_20250101.parquet"), ids, precos, "2025-01-01")
+    precos2 = precos.copy()
+    precos2[::7] += 5000
+    escrever_lote(str(bronze / "listings_bronze_20250102.parquet"), np.arange(220), np.r_[precos2, np.arange(20)], "2025-01-02")
+    return str(bronze / "*.parquet"), tmp_path
+
+
+def ler(silver: str):
+    hist = pd.read_parquet(os.path.join(silver, price_history.HISTORY_DIR))
+    hist = hist.drop(columns=["bronze_batch"]).sort_values(price_history.KEY + ["observed_at"]).reset_index(drop=True)
+    estado = pd.concat([pd.read_parquet(p) for p in sorted(glob.glob(os.path.join(
+        silver, price_history.HISTORY_DIR, price_history.STATE_DIR, "state_*.parquet")))])
+    return hist, estado.sort_values(price_history.KEY).reset_index(drop=True)
+
+
+def test_lote_interrompido_no_estado_e_reaplicado_sem_perder_mudancas(lotes, monkeypatch):
+    pattern, tmp = lotes
+    ref, crash = str(tmp / "silver_ref"), str(tmp / "silver_crash")
+    price_history.update_price_history([pattern], ref)
+
+    primeiro = sorted(glob.glob(pattern))[:1]
+    price_history.update_price_history(primeiro, crash)
+    original = storage.write_parquet
+    chamadas = []
+
+    def cai_no_segundo_balde(df, uri, *args, **kwargs):
+        chamadas.append(uri)
+        if sum("state_" in u for u in chamadas) == 2:
+            raise RuntimeError("queda simulada")
+        return original(df, uri, *args, **kwargs)
+
+    monkeypatch.setattr(storage, "write_parquet", cai_no_segundo_balde)
+    with pytest.raises(RuntimeError):
+        price_history.update_price_history([pattern], crash)
+    monkeypatch.setattr(storage, "write_parquet", original)
+    price_history.update_price_history([pattern], crash)
+
+    hist_ref, estado_ref = ler(ref)
+    hist, estado = ler(crash)
+    assert (hist_ref["change"] == "changed").sum() == 29
+    pd.testing.assert_frame_equal(hist, hist_ref)
+    pd.testing.assert_frame_equal(estado, estado_ref)
@@ -0,0 +1,31 @@
+import glob
+import os
+import tempfile
+
+import pytest
+
+import train_streaming
+from bench_train_memory import gerar_gold
+
+
+def _extmem_dirs():
+    return set(glob.glob(os.path.join(tempfile.gettempdir(), "xgb_extmem_*")))
+
+
+@pytest.mark.parametrize("falha", [False, True])
+def test_external_apaga_as_paginas_em_disco(tmp_path, monkeypatch, falha):
+    gold = str(tmp_path / "gold.parquet")
+    gerar_gold(gold, 3000)
+    antes = _extmem_dirs()
+    if falha:
+        def treino_quebrado(*a, **kw):
+            assert len(_extmem_dirs() - antes) == 1  # as páginas existiam durante o treino
+            raise RuntimeError("falha no meio do treino")
+        monkeypatch.setattr(train_streaming.xgb, "train", treino_quebrado)
+        with pytest.raises(RuntimeError):
+            train_streaming.train_streaming(gold, {"max_depth": 3}, num_boost_round=5, mode="external", batch_rows=1000)
+    else:
+        _, _, report = train_streaming.train_streaming(gold, {"max_depth": 3}, num_boost_round=5,
+                                                       mode="external", batch_rows=1000)
+        assert report["rows_train"] > 0
+    assert _extmem_dirs() == antes
@@ -0,0 +1,267 @@
+"""
+Features de texto (título + descrição) por hashing: uma matriz esparsa CSR salva em .npz.
+
+O HashingVectorizer não tem vocabulário: cada token/bigrama vai direto para uma coluna
+pelo hash. Não há passada de ajuste, então:
+  - os lotes do Parquet são codificados um a um (a tabela inteira nunca fica em memória);
+  - os row groups podem ser divididos entre processos e cada um grava a sua parte;
+  - um arquivo novo só codifica o que é novo (as partes dos arquivos que não mudaram são reaproveitadas);
+  - a API monta a mesma linha a partir do texto só com a configuração (n_features, n-gramas), sem artefato.
+
+Layout do diretório de saída:
+  meta.json                 -> configuração + lista ordenada das partes (fonte, linhas, nnz)
+  part-<chave>-<k>.npz      -> CSR float32 (n_linhas x n_features), scipy.sparse.save_npz
+  part-<chave>-<k>.ids.npy  -> listing_id de cada linha da parte
+A chave de uma parte = impressão digital do arquivo de origem + configuração.
+
+    python text_features.py --source gold.parquet --out features_cache/text --workers 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import resource
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+
+import storage
+
+TEXT_COLUMNS = ["title", "description"]
+ID_COLUMN = "listing_id"
+# 2^16 colunas: colisões raras para o vocabulário de anúncios; no XGBoost (hist) o custo segue o nnz
+TEXT_N_FEATURES = 2 ** 16
+TEXT_NGRAM_RANGE = (1, 2)
+TEXT_BATCH_ROWS = 20_000
+TEXT_META_FILE = "meta.json"
+# Mude quando a tokenização mudar: invalida as partes antigas
+TEXT_BUILD_VERSION = 1
+
+# Sem acento, por tabela (Latin-1 + Latin Extended-A): um translate por texto no lugar do
+# strip_accents="unicode" do sklearn, que normaliza caractere a caractere (metade do tempo do lote)
+_FOLD = {c: unicodedata.normalize("NFKD", chr(c)).encode("ascii", "ignore").decode() or chr(c)
+         for c in range(0xC0, 0x180)}
+
+
+def text_config(n_features: int = TEXT_N_FEATURES, ngram_range: Sequence[int] = TEXT_NGRAM_RANGE) -> Dict[str, Any]:
+    """Tudo o que define a codificação. Vai para o meta.json e para o feature_pipeline.json do modelo."""
+    return {"columns": list(TEXT_COLUMNS), "n_features": int(n_features), "ngram_range": list(ngram_range),
+            "version": TEXT_BUILD_VERSION}
+
+
+def make_vectorizer(config: Mapping[str, Any]):
+    from sklearn.feature_extraction.text import HashingVectorizer
+    # sem sinal alternado: as colunas ficam >= 0 (contagem normalizada por L2 na linha)
+    # minúsculas e acentos já saem do join_text
+    return HashingVectorizer(n_features=config["n_features"], ngram_range=tuple(config["ngram_range"]),
+                             alternate_sign=False, norm="l2", lowercase=False, dtype=np.float32)
+
+
+def _as_text(v) -> str:
+    if isinstance(v, str):
+        return v
+    try:
+        return "" if v is None or v != v else str(v)  # None e NaN
+    except TypeError:  # pd.NA
+        return ""
+
+
+def join_text(data: Mapping[str, Any], columns: Sequence[str], n: int) -> List[str]:
+    """
+    Título + descrição numa string por linha, em minúsculas e sem acento; coluna ausente ou nula vira ''.
+    Sem pandas: é o caminho do /predict com texto (e o mesmo do treino).
+    """
+    partes = [[v if isinstance(v, str) else _as_text(v) for v in np.asarray(data[c], dtype=object)]
+              for c in columns if c in data]
+    if not partes:
+        return [""] * n
+    return [" ".join(valores).lower().translate(_FOLD) for valores in zip(*partes)]
+
+
+def encode(config: Mapping[str, Any], data: Mapping[str, Any], n: int, vectorizer=None) -> sp.csr_matrix:
+    """CSR (n x n_features) de um dict coluna -> valores (ou DataFrame)."""
+    vectorizer = vectorizer or make_vectorizer(config)
+    return vectorizer.transform(join_text(data, config["columns"], n)).tocsr()
+
+
+def with_dense(X: np.ndarray, T: sp.csr_matrix) -> sp.csr_matrix:
+    """
+    [X denso | T texto] em CSR. X entra com todas as células guardadas (zeros explícitos): no XGBoost
+    só a célula ausente é missing, então 0 continua 0 e NaN continua missing, como na matriz densa.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    n, d = X.shape
+    dense = sp.csr_matrix((X.ravel(), np.tile(np.arange(d, dtype=np.int32), n),
+                           np.arange(0, n * d + 1, d, dtype=np.int64)), shape=(n, d))
+    return sp.hstack([dense, T.astype(np.float32)], format="csr")
+
+
+# ---------- construção em lotes / processos ----------
+
+def _part_key(path: str, config: Mapping[str, Any]) -> str:
+    fs, p = storage.url_to_fs(path)
+    raw = json.dumps({"src": f"{path}|{storage.fingerprint(fs.info(p))}", "config": config}, sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+def _encode_part(local: str, row_groups: List[int], config: Dict[str, Any], batch_rows: int,
+                 out_prefix: str) -> Dict[str, Any]:
+    """Codifica alguns row groups, lote a lote, e grava a parte. Roda num processo do pool."""
+    import pyarrow.parquet as pq
+
+    t0 = time.perf_counter()
+    pf = pq.ParquetFile(local)
+    cols = [c for c in [ID_COLUMN] + config["columns"] if c in pf.schema_arrow.names]
+    vectorizer = make_vectorizer(config)
+    blocos, ids, text_bytes = [], [], 0
+    for batch in pf.iter_batches(batch_size=batch_rows, row_groups=row_groups, columns=cols):
+        data = {c: batch.column(c).to_numpy(zero_copy_only=False) for c in cols}
+        textos = join_text(data, config["columns"], batch.num_rows)
+        text_bytes += sum(map(len, textos))
+        blocos.append(vectorizer.transform(textos).tocsr())
+        ids.append(np.asarray(data[ID_COLUMN], dtype=object).astype(str) if ID_COLUMN in data
+                   else np.full(batch.num_rows, "", dtype=object))
+    X = sp.vstack(blocos, format="csr") if blocos else sp.csr_matrix((0, config["n_features"]), dtype=np.float32)
+    sp.save_npz(out_prefix + ".npz", X, compressed=False)
+    np.save(out_prefix + ".ids.npy", np.concatenate(ids).astype("U") if ids else np.empty(0, dtype="U1"))
+    return {"file": os.path.basename(out_prefix), "rows": int(X.shape[0]), "nnz": int(X.nnz),
+            "text_bytes": int(text_bytes), "seconds": round(time.perf_counter() - t0, 3),
+            "matrix_bytes": int(X.data.nbytes + X.indices.nbytes + X.indptr.nbytes)}
+
+
+def _read_meta(out_dir: str) -> Dict[str, Any]:
+    path = os.path.join(out_dir, TEXT_META_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def build_text_features(sources: List[str], out_dir: str, config: Optional[Dict[str, Any]] = None,
+                        batch_rows: int = TEXT_BATCH_ROWS, workers: int = 1) -> Dict[str, Any]:
+    """
+    Codifica os Parquets (gold ou silver_listings, aceita glob) em partes CSR. Fontes que não mudaram
+    desde a última execução (mesma impressão digital e configuração) não são relidas.
+    Retorna o meta com as partes na ordem das fontes e o relatório de memória/vazão desta execução.
+    """
+    import pyarrow.parquet as pq
+
+    config = config or text_config()
+    paths = sorted({p for pattern in sources for p in storage.glob(pattern)})
+    if not paths:
+        raise FileNotFoundError("Nenhum Parquet de origem encontrado pelos padrões fornecidos.")
+    os.makedirs(out_dir, exist_ok=True)
+    antigo = {p["file"]: p for p in _read_meta(out_dir).get("parts", [])}
+
+    t0 = time.perf_counter()
+    tarefas, partes = [], []
+    for path in paths:
+        key = _part_key(path, config)
+        reaproveitadas = [p for p in antigo.values() if p["key"] == key]
+        if reaproveitadas:
+            partes.append(sorted(reaproveitadas, key=lambda p: p["file"]))
+            continue
+        local = storage.local_path(path)
+        n_rg = pq.ParquetFile(local).num_row_groups
+        # row groups contíguos por processo: a ordem das linhas se mantém ao juntar as partes
+        grupos = [g.tolist() for g in np.array_split(np.arange(n_rg), max(1, min(workers, n_rg))) if len(g)]
+        partes.append([])
+        for k, rgs in enumerate(grupos):
+            tarefas.append((len(partes) - 1, path, (local, rgs, config, batch_rows,
+                                                    os.path.join(out_dir, f"part-{key}-{k:04d}"))))
+
+    pool_usado = workers > 1 and len(tarefas) > 1
+    if pool_usado:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futuros = [(i, path, pool.submit(_encode_part, *args)) for i, path, args in tarefas]
+            novos = [(i, path, f.result()) for i, path, f in futuros]
+    else:
+        novos = [(i, path, _encode_part(*args)) for i, path, args in tarefas]
+    for i, path, r in novos:
+        partes[i].append({**r, "key": r["file"].split("-")[1], "source": path})
+
+    seconds = time.perf_counter() - t0
+    meta = {"config": config, "parts": [p for grupo in partes for p in grupo]}
+    # partes de fontes que saíram da lista não são mais carregadas
+    atuais = {p["file"] for p in meta["parts"]}
+    for p in antigo.values():
+        if p["file"] not in atuais:
+            for ext in (".npz", ".ids.npy"):
+                if os.path.exists(os.path.join(out_dir, p["file"] + ext)):
+                    os.remove(os.path.join(out_dir, p["file"] + ext))
+    with open(os.path.join(out_dir, TEXT_META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+
+    rows = sum(r["rows"] for _, _, r in novos)
+    text_mb = sum(r["text_bytes"] for _, _, r in novos) / 2**20
+    meta["report"] = {
+        "rows_encoded": rows, "parts_reused": len(meta["parts"]) - len(novos), "seconds": round(seconds, 3),
+        "rows_per_s": round(rows / seconds) if rows else 0, "text_mb_per_s": round(text_mb / seconds, 1) if rows else 0,
+        "matrix_mb": round(sum(p["matrix_bytes"] for p in meta["parts"]) / 2**20, 1),
+        "nnz_per_row": round(sum(p["nnz"] for p in meta["parts"]) / max(1, sum(p["rows"] for p in meta["parts"])), 1),
+        # ru_maxrss em KB no Linux; os processos do pool entram em RUSAGE_CHILDREN (o maior deles)
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_rss_worker_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1)
+        if pool_usado else None,
+    }
+    return meta
+
+
+# ---------- leitura ----------
+
+def load_text_features(out_dir: str) -> Tuple[np.ndarray, sp.csr_matrix, Dict[str, Any]]:
+    """(listing_ids, CSR, meta), com as partes empilhadas na ordem do meta.json."""
+    meta = _read_meta(out_dir)
+    if not meta:
+        raise FileNotFoundError(f"{TEXT_META_FILE} não encontrado em {out_dir}")
+    blocos = [sp.load_npz(os.path.join(out_dir, p["file"] + ".npz")) for p in meta["parts"]]
+    ids = [np.load(os.path.join(out_dir, p["file"] + ".ids.npy")) for p in meta["parts"]]
+    if not blocos:
+        return np.empty(0, dtype="U1"), sp.csr_matrix((0, meta["config"]["n_features"]), dtype=np.float32), meta
+    return np.concatenate(ids), sp.vstack(blocos, format="csr"), meta
+
+
+def align(ids: np.ndarray, T: sp.csr_matrix, listing_ids: Sequence[Any]) -> sp.csr_matrix:
+    """
+    Linhas de T na ordem de `listing_ids`. Id repetido entre partes: vale a última (a fonte mais nova).
+    Id sem texto vira linha vazia (todas as colunas de texto missing).
+    """
+    import pandas as pd
+
+    pos = pd.Series(np.arange(len(ids)), index=pd.Index(ids, dtype=object))
+    pos = pos[~pos.index.duplicated(keep="last")]
+    alvo = pos.reindex(pd.Index(np.asarray(listing_ids).astype(str), dtype=object)).to_numpy()
+    ok = ~np.isnan(alvo)
+    out = T[np.where(ok, alvo, 0).astype(np.int64)]
+    if not ok.all():
+        out = (sp.diags(ok.astype(np.float32)) @ out).tocsr()
+        out.eliminate_zeros()
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Features de texto (título + descrição) por hashing -> CSR .npz")
+    ap.add_argument("--source", required=True, nargs="+", help="Parquet(s) com listing_id, title, description (aceita glob)")
+    ap.add_argument("--out", required=True, help="Diretório das partes .npz + meta.json")
+    ap.add_argument("--n-features", type=int, default=TEXT_N_FEATURES, help="Colunas do hashing (potência de 2)")
+    ap.add_argument("--ngram-max", type=int, default=TEXT_NGRAM_RANGE[1], help="Maior n-grama (1 = só palavras)")
+    ap.add_argument("--batch-rows", type=int, default=TEXT_BATCH_ROWS, help="Linhas por lote lido do Parquet")
+    ap.add_argument("--workers", type=int, default=1, help="Processos (cada um codifica uma faixa de row groups)")
+    args = ap.parse_args()
+
+    meta = build_text_features(args.source, args.out, text_config(args.n_features, (1, args.ngram_max)),
+                               args.batch_rows, args.workers)
+    r = meta["report"]
+    print(f"✅ Texto: {r['rows_encoded']} linhas codificadas ({r['parts_reused']} partes reaproveitadas) em "
+          f"{r['seconds']}s | {r['rows_per_s']} linhas/s, {r['text_mb_per_s']} MB/s de texto")
+    workers = f", {r['peak_rss_worker_mb']} MB (maior worker)" if r["peak_rss_worker_mb"] else ""
+    print(f"   🧮 CSR {r['matrix_mb']} MB, {r['nnz_per_row']} não-zeros por linha | pico de RSS "
+          f"{r['peak_rss_mb']} MB (processo){workers}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,131 @@
 import pandas as pd
-import gcsfs
 import joblib
 import os
 import xgboost as xgb
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score, mean_squared_error
 import numpy as np
+import argparse
+import json
+import time
+import pyarrow.parquet as pq
+from datetime import datetime, timezone
+
+from build_features import build_feature_matrix
+from compiled_model import ANNOTATE_ROWS, COMPILED_FILES, compile_model
+from feature_pipeline import FeaturePipeline, PIPELINE_FILE
+from model_loader import publish_model
+import storage
+from text_features import align, load_text_features, with_dense
+from train_streaming import train_streaming, peak_rss_mb
+from tune_model import tune, best_params
 
 # --- CONFIGURAÇÕES ---
 BUCKET_NAME = "datalake-imoveis-pdm-2025"
 GOLD_FILE_PATH = f"gs://{BUCKET_NAME}/gold/imoveis_venda_analise.parquet"
+AMENITIES_FILE_PATH = f"gs://{BUCKET_NAME}/silver/silver_amenities.parquet"
 MODEL_LOCAL_PATH = "model_imoveis_xgb.pkl"
 MODEL_CLOUD_PATH = f"gs://{BUCKET_NAME}/models/model_imoveis_xgb.pkl"
+# Formato nativo (UBJSON) que a API prefere: carrega mais rápido e não depende de pickle
+MODEL_NATIVE_LOCAL_PATH = "model_imoveis_xgb.ubj"
+MODEL_NATIVE_CLOUD_PATH = f"gs://{BUCKET_NAME}/models/model_imoveis_xgb.ubj"
+# Registry versionado lido pela API (hot reload pelo ponteiro 'latest')
+MODEL_REGISTRY_URI = f"gs://{BUCKET_NAME}/models/registry"
+# Pipeline de features (vocabulários + ordem das colunas), salvo ao lado do modelo
+PIPELINE_LOCAL_PATH = PIPELINE_FILE
+PIPELINE_CLOUD_PATH = f"gs://{BUCKET_NAME}/models/{PIPELINE_FILE}"
 
-def train():
-    print("⏳ [1/6] Iniciando download explícito do arquivo Gold...")
-    
-    # 1. Download Seguro (Evita timeout)
-    fs = gcsfs.GCSFileSystem()
-    local_gold_file = "gold_temp.parquet"
-    
+# Hiperparâmetros padrão (mesmos do modelo original)
+XGB_PARAMS = dict(objective='reg:squarederror', n_estimators=500, learning_rate=0.05, max_depth=6, random_state=42)
+
+def download_gold(gold_path: str = GOLD_FILE_PATH):
+    """
+    Cópia local da gold pelo cache do storage.py: só baixa de novo se a versão no bucket
+    mudou (generation/md5). Caminhos locais são usados direto.
+    """
     try:
-        if not os.path.exists(local_gold_file):
-            print("   ⬇️ Baixando para o disco local...")
-            fs.get(GOLD_FILE_PATH, local_gold_file)
-        else:
-            print("   ℹ️ Arquivo local já existe, usando cache.")
-            
+        return storage.local_path(gold_path)
     except Exception as e:
         print(f"   ❌ Erro no download: {e}")
+        return None
+
+def add_text_features(X, listing_ids, pipeline, text_dir: str):
+    """Junta as colunas de texto (CSR do text_features.py) às densas, alinhadas por listing_id."""
+    ids, T, meta = load_text_features(text_dir)
+    T = align(ids, T, listing_ids)
+    pipeline.text = meta["config"]
+    com_texto = float((T.getnnz(axis=1) > 0).mean()) if T.shape[0] else 0.0
+    print(f"   📝 Texto: {T.shape[1]} colunas de hashing, {T.nnz / max(1, T.shape[0]):.0f} não-zeros por linha, "
+          f"{com_texto:.0%} dos imóveis com texto ({(T.data.nbytes + T.indices.nbytes) / 2**20:.1f} MB)")
+    return with_dense(np.asarray(X, dtype=np.float32), T), pipeline
+
+def train(features: str = "basic", amenities_path: str = AMENITIES_FILE_PATH, mode: str = "memory",
+          gold_path: str = GOLD_FILE_PATH, upload: bool = True, batch_rows: int = 200_000,
+          tune_trials: int = 0, tune_options: dict = None, text_features_dir: str = None,
+          compile_backend: bool = False):
+    print("⏳ [1/6] Iniciando download explícito do arquivo Gold...")
+    local_gold_file = download_gold(gold_path)
+    if local_gold_file is None:
         return
 
+    if mode in ("quantile", "external"):
+        return train_from_batches(local_gold_file, mode, upload, batch_rows, compile_backend)
+
+    t0 = time.perf_counter()
     print("📖 [2/6] Lendo e preparando dados...")
-    df = pd.read_parquet(local_gold_file)
-    
-    # --- AJUSTE DE COLUNAS (Baseado no seu debug) ---
     target = 'target_price'
-    
-    # Vamos usar a Área e o Tipo do imóvel
-    # O modelo vai aprender: "Apartamento de 100m² custa X"
-    
-    # Passo A: Limpar nulos na área e no preço
-    df_clean = df.dropna(subset=[target, 'total_area_m2'])
-    
-    # Passo B: Converter 'property_type' (texto) para número (código)
-    # Ex: UNIT -> 1, HOME -> 2
-    if 'property_type' in df_clean.columns:
-        df_clean['property_type_code'] = df_clean['property_type'].astype('category').cat.codes
-        feature_col_type = 'property_type_code'
+
+    if features == "wide":
+        # Matriz larga (silver + amenities + geo + bairro), reaproveitada do cache se nada mudou
+        X, y, pipeline, meta = build_feature_matrix(local_gold_file, amenities_path)
+        features = pipeline.columns
+        listing_ids = np.load(meta["listing_ids_path"])
     else:
-        feature_col_type = None
+        df = pd.read_parquet(local_gold_file)
+
+        # --- AJUSTE DE COLUNAS (Baseado no seu debug) ---
+        # Vamos usar a Área e o Tipo do imóvel
+        # O modelo vai aprender: "Apartamento de 100m² custa X"
+
+        # Passo A: Limpar nulos na área e no preço
+        df_clean = df.dropna(subset=[target, 'total_area_m2'])
+
+        # Passo B: Ajusta o pipeline de features (a API usa o mesmo artefato)
+        # 'property_type' (texto) vira código pelo vocabulário salvo, ex: apartment -> 0, home -> 1
+        categorical = ['property_type'] if 'property_type' in df_clean.columns else []
+        pipeline = FeaturePipeline.fit(df_clean, numeric=['total_area_m2'], categorical=categorical)
+        features = pipeline.columns
+
+        X = pd.DataFrame(pipeline.transform(df_clean), columns=features, index=df_clean.index)
+        y = df_clean[target]
+        listing_ids = df_clean["listing_id"].to_numpy() if "listing_id" in df_clean.columns else None
 
-    # Definição final das features
-    features = ['total_area_m2']
-    if feature_col_type:
-        features.append(feature_col_type)
-        
     print(f"   ✅ Features usadas: {features}")
-    
-    X = df_clean[features]
-    y = df_clean[target]
+    if text_features_dir:
+        if listing_ids is None:
+            print("   ❌ A gold não tem listing_id para alinhar as features de texto.")
+            return
+        # matriz vira CSR: [densas (todas as células guardadas) | hashing do título + descrição]
+        X, pipeline = add_text_features(X, listing_ids, pipeline, text_features_dir)
 
-    print(f"   ✅ Total de imóveis válidos para treino: {len(X)}")
+    print(f"   ✅ Total de imóveis válidos para treino: {X.shape[0]}")
 
     # Separação Treino (80%) vs Teste (20%)
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
+    params = dict(XGB_PARAMS)
+    if tune_trials:
+        # A busca usa só o treino (CV k-fold); o teste continua de fora para a avaliação final
+        print(f"🔎 [3/6] Buscando hiperparâmetros ({tune_trials} trials)...")
+        results = tune(np.asarray(X_train), np.asarray(y_train), n_trials=tune_trials, **(tune_options or {}))
+        params.update(best_params(results))
+        print(f"   🏅 Melhor trial: {params}")
+
     print("🧠 [3/6] Iniciando treinamento com XGBoost...")
-    model = xgb.XGBRegressor(
-        objective='reg:squarederror',
-        n_estimators=500,
-        learning_rate=0.05,
-        max_depth=6,
-        random_state=42,
-        n_jobs=-1
-    )
-    
+    model = xgb.XGBRegressor(**params, tree_method='hist', n_jobs=-1)
+
     model.fit(X_train, y_train)
-    print("   ✅ Modelo treinado!")
+    print(f"   ✅ Modelo treinado! ({time.perf_counter() - t0:.1f}s, pico de memória {peak_rss_mb():.0f} MB)")
 
     print("📊 [4/6] Avaliando performance...")
     predictions = model.predict(X_test)
@@ -91,19 +139,125 @@ def train():
     print(f"   💰 Erro Médio (MAE): R$ {mae:,.2f}")
     print("-" * 40)
 
+    # linhas do treino: anotação dos desvios e amostra de paridade do preditor compilado
+    save_and_publish(model, pipeline, upload, X_train[:ANNOTATE_ROWS] if compile_backend else None)
+
+def train_from_batches(local_gold_file: str, mode: str, upload: bool = True, batch_rows: int = 200_000,
+                       compile_backend: bool = False):
+    """Treino em lotes do Parquet (QuantileDMatrix ou memória externa), sem carregar a gold no pandas."""
+    print(f"📖 [2/6] Lendo a gold em lotes de {batch_rows} linhas (modo {mode})...")
+    params = {k: v for k, v in XGB_PARAMS.items() if k not in ("n_estimators", "learning_rate", "random_state")}
+    params.update(eta=XGB_PARAMS["learning_rate"], seed=XGB_PARAMS["random_state"])
+
+    print("🧠 [3/6] Iniciando treinamento com XGBoost...")
+    booster, pipeline, report = train_streaming(local_gold_file, params, XGB_PARAMS["n_estimators"],
+                                                mode=mode, batch_rows=batch_rows)
+    print(f"   ✅ Modelo treinado! {report['rows_train']} linhas | dados {report['data_seconds']}s "
+          f"| treino {report['train_seconds']}s | pico de memória {report['peak_rss_mb']:.0f} MB")
+
+    print("📊 [4/6] Avaliando performance...")
+    print("-" * 40)
+    print("🏆 RESULTADOS FINAIS:")
+    print(f"   ⭐ Acurácia (R²): {report['r2']:.4f}")
+    print(f"   💰 Erro Médio (MAE): R$ {report['mae']:,.2f}")
+    print("-" * 40)
+
+    # Mesmo formato que a API carrega: o .ubj do booster vira um XGBRegressor
+    booster.save_model(MODEL_NATIVE_LOCAL_PATH)
+    model = xgb.XGBRegressor()
+    model.load_model(MODEL_NATIVE_LOCAL_PATH)
+    X_sample = None
+    if compile_backend:
+        # anotação + amostra de paridade: as primeiras linhas da gold, pelo mesmo pipeline
+        cols = [c for c in pipeline.input_columns if c in pq.ParquetFile(local_gold_file).schema_arrow.names]
+        primeiro = pq.ParquetFile(local_gold_file).read_row_group(0, columns=cols).to_pandas()
+        X_sample = pipeline.transform(primeiro.head(ANNOTATE_ROWS))
+    save_and_publish(model, pipeline, upload, X_sample)
+    return report
+
+def save_and_publish(model, pipeline, upload: bool = True, X_sample=None):
+    """Com X_sample, também compila o booster (compiled_model.py) e publica a .so junto com o modelo."""
     print("💾 [5/6] Salvando modelo localmente...")
     joblib.dump(model, MODEL_LOCAL_PATH)
+    model.save_model(MODEL_NATIVE_LOCAL_PATH)
+    pipeline.save(PIPELINE_LOCAL_PATH)
+    compiled = []
+    if X_sample is not None:
+        try:
+            compiled = compile_model(model, ".", X_sample)
+            with open(compiled[1], encoding="utf-8") as f:
+                meta = json.load(f)
+            print(f"   ⚙️ Preditor compilado: {meta['num_trees']} árvores em {meta['compile_seconds']}s "
+                  f"({meta['lib_bytes'] / 2**20:.1f} MB, diferença relativa {meta['parity_max_rel_diff']:.1e})")
+        except Exception as e:
+            # a API segue com o XGBoost quando a .so não existe
+            print(f"   ⚠️ Compilação do preditor falhou ({e}); publicando só o modelo XGBoost.")
+            compiled = []
+
+    if not upload:
+        print(f"   ℹ️ Upload desligado; artefatos em {MODEL_NATIVE_LOCAL_PATH}, {MODEL_LOCAL_PATH} e {PIPELINE_LOCAL_PATH}"
+              + (f" (+ {', '.join(COMPILED_FILES)})" if compiled else ""))
+        return
 
     print("☁️ [6/6] Enviando cérebro da IA para o Bucket...")
     try:
-        fs.put(MODEL_LOCAL_PATH, MODEL_CLOUD_PATH)
-        print(f"   🚀 Sucesso! Modelo salvo em: {MODEL_CLOUD_PATH}")
+        storage.put(MODEL_LOCAL_PATH, MODEL_CLOUD_PATH)
+        storage.put(MODEL_NATIVE_LOCAL_PATH, MODEL_NATIVE_CLOUD_PATH)
+        storage.put(PIPELINE_LOCAL_PATH, PIPELINE_CLOUD_PATH)
+        for path in compiled:
+            storage.put(path, f"gs://{BUCKET_NAME}/models/{os.path.basename(path)}")
+        print(f"   🚀 Sucesso! Modelo salvo em: {MODEL_CLOUD_PATH} e {MODEL_NATIVE_CLOUD_PATH}")
+
+        version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        dest = publish_model([MODEL_NATIVE_LOCAL_PATH, MODEL_LOCAL_PATH, PIPELINE_LOCAL_PATH] + compiled,
+                             MODEL_REGISTRY_URI, version)
+        print(f"   🏷️ Versão {version} publicada no registry: {dest}")
     except Exception as e:
         print(f"   ❌ Erro ao subir modelo: {e}")
     
     # Limpeza
-    if os.path.exists(MODEL_LOCAL_PATH):
-        os.remove(MODEL_LOCAL_PATH)
+    for path in [MODEL_LOCAL_PATH, MODEL_NATIVE_LOCAL_PATH, PIPELINE_LOCAL_PATH] + compiled:
+        if os.path.exists(path):
+            os.remove(path)
+
+def main():
+    ap = argparse.ArgumentParser(description="Treina o modelo de preço (XGBoost) a partir da gold.")
+    ap.add_argument("--features", default="basic", choices=["basic", "wide"],
+                    help="basic = área + tipo; wide = matriz larga do build_features.py")
+    ap.add_argument("--amenities", default=AMENITIES_FILE_PATH, help="silver_amenities.parquet (modo wide)")
+    ap.add_argument("--mode", default="memory", choices=["memory", "quantile", "external"],
+                    help="memory = pandas em RAM; quantile = lotes do Parquet -> QuantileDMatrix; "
+                         "external = lotes -> memória externa (páginas em disco)")
+    ap.add_argument("--gold", default=GOLD_FILE_PATH, help="Parquet da gold (gs:// ou local)")
+    ap.add_argument("--batch-rows", type=int, default=200_000, help="Linhas por lote nos modos quantile/external")
+    ap.add_argument("--no-upload", action="store_true", help="Não envia para o bucket (mantém os arquivos locais)")
+    ap.add_argument("--tune", type=int, default=0, metavar="N",
+                    help="Busca N conjuntos de hiperparâmetros com CV k-fold antes do treino final (modo memory)")
+    ap.add_argument("--folds", type=int, default=5, help="Dobras da validação cruzada (--tune)")
+    ap.add_argument("--cores", type=int, default=None, help="Núcleos para a busca (padrão: todos)")
+    ap.add_argument("--workers", type=int, default=None,
+                    help="Processos da busca; cada um usa cores // workers threads do XGBoost")
+    ap.add_argument("--early-stopping", type=int, default=50, help="Rounds sem melhora para parar (--tune)")
+    ap.add_argument("--tune-results", default="tuning_results.csv", help="CSV com a tabela de trials")
+    ap.add_argument("--text-features", default=None, metavar="DIR",
+                    help="Diretório gerado pelo text_features.py: junta o hashing do título + descrição (modo memory)")
+    ap.add_argument("--compile", action="store_true",
+                    help="Compila o booster numa biblioteca nativa (tl2cgen) publicada junto; a API prefere ela")
+    args = ap.parse_args()
+
+    if args.mode != "memory" and args.features != "basic":
+        ap.error("--mode quantile/external só suporta --features basic")
+    if args.tune and args.mode != "memory":
+        ap.error("--tune só roda no modo memory")
+    if args.text_features and (args.mode != "memory" or args.tune):
+        ap.error("--text-features só roda no modo memory, sem --tune (a busca usa a matriz densa em .npy)")
+
+    tune_options = dict(n_folds=args.folds, cores=args.cores, workers=args.workers,
+                        early_stopping=args.early_stopping, results_path=args.tune_results)
+    train(features=args.features, amenities_path=args.amenities, mode=args.mode,
+          gold_path=args.gold, upload=not args.no_upload, batch_rows=args.batch_rows,
+          tune_trials=args.tune, tune_options=tune_options, text_features_dir=args.text_features,
+          compile_backend=args.compile)
 
 if __name__ == "__main__":
-    train()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""
+Treino com memória limitada: a gold é lida em lotes de linhas do Parquet e entregue ao
+XGBoost por um DataIter. Nada da tabela inteira fica em pandas.
+
+  - "quantile": QuantileDMatrix (só o histograma quantizado fica em RAM, ~1 byte por célula);
+  - "external": ExtMemQuantileDMatrix / DMatrix externa, com páginas em disco (cache_prefix).
+
+Usado por `train_model.py --mode quantile|external`.
+"""
+import os
+import resource
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import xgboost as xgb
+
+from feature_pipeline import FeaturePipeline
+
+TARGET = "target_price"
+BATCH_ROWS = 200_000
+VALID_BUCKETS = 5  # 1 de cada 5 listings (por hash do id) vai para validação: ~80/20 estável
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss vem em KB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def fit_pipeline_streaming(path: str, numeric: List[str], categorical: List[str]) -> FeaturePipeline:
+    """Vocabulário das categóricas numa passada que lê só essas colunas."""
+    pf = pq.ParquetFile(path)
+    vistos = {c: set() for c in categorical}
+    if categorical:
+        for batch in pf.iter_batches(batch_size=BATCH_ROWS, columns=categorical):
+            for c in categorical:
+                vistos[c].update(batch.column(c).drop_null().unique().to_pylist())
+    amostra = pd.DataFrame({c: pd.Series(sorted(map(str, v)), dtype=object) for c, v in vistos.items()})
+    return FeaturePipeline.fit(amostra, numeric=numeric, categorical=categorical)
+
+
+class ParquetBatchIter(xgb.DataIter):
+    """Percorre o Parquet em lotes, aplica o pipeline e entrega só a fração train ou valid."""
+
+    def __init__(self, path: str, pipeline: FeaturePipeline, split: str,
+                 batch_rows: int = BATCH_ROWS, cache_prefix: Optional[str] = None):
+        self.path = path
+        self.pipeline = pipeline
+        self.split = split
+        self.batch_rows = batch_rows
+        self.columns = list(dict.fromkeys(["listing_id", TARGET] + pipeline.input_columns))
+        self.rows = 0  # linhas entregues na última passada completa
+        self._pass_rows = 0
+        self._it = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def reset(self):
+        self._it = pq.ParquetFile(self.path).iter_batches(batch_size=self.batch_rows, columns=self.columns)
+        self._pass_rows = 0
+
+    def _frame(self, batch) -> Optional[pd.DataFrame]:
+        df = batch.to_pandas().dropna(subset=[TARGET, "total_area_m2"])
+        bucket = pd.util.hash_pandas_object(df["listing_id"].astype(str), index=False).to_numpy() % VALID_BUCKETS
+        mask = bucket == 0 if self.split == "valid" else bucket != 0
+        df = df[mask]
+        return df if len(df) else None
+
+    def next(self, input_data) -> bool:
+        if self._it is None:
+            self.reset()
+        for batch in self._it:
+            df = self._frame(batch)
+            if df is None:
+                continue
+            input_data(data=self.pipeline.transform(df), label=df[TARGET].to_numpy(dtype=np.float32))
+            self._pass_rows += len(df)
+            return True
+        self.rows = self._pass_rows
+        return False
+
+    def iter_frames(self):
+        """Mesmos lotes, para avaliação (fora do XGBoost)."""
+        self.reset()
+        for batch in self._it:
+            df = self._frame(batch)
+            if df is not None:
+                yield self.pipeline.transform(df), df[TARGET].to_numpy(dtype=np.float64)
+
+
+def evaluate_streaming(booster: xgb.Booster, it: ParquetBatchIter) -> Dict[str, float]:
+    """R² e MAE acumulados lote a lote (sem juntar as previsões em memória)."""
+    n = s_abs = s_sq = s_y = s_y2 = 0.0
+    for X, y in it.iter_frames():
+        p = booster.inplace_predict(X).astype(np.float64)
+        n += len(y)
+        s_abs += np.abs(y - p).sum()
+        s_sq += ((y - p) ** 2).sum()
+        s_y += y.sum()
+        s_y2 += (y ** 2).sum()
+    if not n:
+        return {"r2": float("nan"), "mae": float("nan"), "rows": 0}
+    ss_tot = s_y2 - s_y ** 2 / n
+    return {"r2": 1 - s_sq / ss_tot if ss_tot else float("nan"), "mae": s_abs / n, "rows": int(n)}
+
+
+def train_streaming(path: str, params: Dict[str, Any], num_boost_round: int = 500,
+                    mode: str = "quantile", batch_rows: int = BATCH_ROWS,
+                    numeric: Tuple[str, ...] = ("total_area_m2",),
+                    categorical: Tuple[str, ...] = ("property_type",)):
+    """
+    Treina lendo `path` (Parquet local) em lotes. Retorna (booster, pipeline, relatório).
+    """
+    t0 = time.perf_counter()
+    cols = pq.read_schema(path).names
+    pipeline = fit_pipeline_streaming(path, list(numeric), [c for c in categorical if c in cols])
+
+    params = {"tree_method": "hist", "objective": "reg:squarederror", **params}
+    tmpdir = tempfile.mkdtemp(prefix="xgb_extmem_") if mode == "external" else None
+    prefix = os.path.join(tmpdir, "cache") if tmpdir else None
+    # páginas do modo external (podem ser do tamanho da base): apagadas ao fim, com ou sem erro
+    try:
+        it_train = ParquetBatchIter(path, pipeline, "train", batch_rows, cache_prefix=prefix)
+        it_valid = ParquetBatchIter(path, pipeline, "valid", batch_rows)
+
+        if mode == "external":
+            if hasattr(xgb, "ExtMemQuantileDMatrix"):
+                dtrain = xgb.ExtMemQuantileDMatrix(it_train, max_bin=params.get("max_bin", 256))
+            else:
+                dtrain = xgb.DMatrix(it_train)
+        elif mode == "quantile":
+            dtrain = xgb.QuantileDMatrix(it_train, max_bin=params.get("max_bin", 256))
+        else:
+            raise ValueError(f"Modo de treino em streaming desconhecido: {mode}")
+        dvalid = xgb.QuantileDMatrix(it_valid, ref=dtrain)
+        t_data = time.perf_counter() - t0
+
+        booster = xgb.train(params, dtrain, num_boost_round=num_boost_round,
+                            evals=[(dvalid, "valid")], verbose_eval=False)
+        t_train = time.perf_counter() - t0 - t_data
+
+        report = {
+            "mode": mode,
+            "rows_train": it_train.rows,
+            "data_seconds": round(t_data, 2),
+            "train_seconds": round(t_train, 2),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            **evaluate_streaming(booster, it_valid),
+        }
+        return booster, pipeline, report
+    finally:
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
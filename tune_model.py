@@ -0,0 +1,161 @@
+"""
+Busca de hiperparâmetros com validação cruzada k-fold, em paralelo.
+
+Cada trial (um conjunto de parâmetros) roda as k dobras num processo do pool, com early
+stopping em cada dobra. Os núcleos são divididos explicitamente: `workers` processos x
+`nthread` threads do XGBoost por processo <= `cores`, para o pool e o OpenMP do XGBoost
+não disputarem a mesma CPU.
+
+A matriz (X, y) vai para um .npy temporário e cada processo a abre com mmap: os dados
+não são copiados para cada worker.
+
+Usado por `train_model.py --tune N`.
+"""
+import itertools
+import multiprocessing as mp
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+SEARCH_SPACE = {
+    "max_depth": [4, 6, 8, 10],
+    "learning_rate": [0.03, 0.05, 0.1],
+    "min_child_weight": [1, 3, 10],
+    "subsample": [0.7, 0.85, 1.0],
+    "colsample_bytree": [0.6, 0.8, 1.0],
+    "reg_lambda": [1.0, 5.0, 10.0],
+}
+# Trial 0: os parâmetros do modelo original, para a tabela ter a linha de base
+BASELINE = {"max_depth": 6, "learning_rate": 0.05, "min_child_weight": 1,
+            "subsample": 1.0, "colsample_bytree": 1.0, "reg_lambda": 1.0}
+MAX_ROUNDS = 2000
+EARLY_STOPPING_ROUNDS = 50
+N_FOLDS = 5
+SEED = 42
+RESULTS_FILE = "tuning_results.csv"
+
+# Estado de cada processo do pool (preenchido pelo initializer)
+_X: Optional[np.ndarray] = None
+_y: Optional[np.ndarray] = None
+_NTHREAD = 1
+
+
+def budget_cores(cores: Optional[int] = None, workers: Optional[int] = None) -> Tuple[int, int]:
+    """
+    (workers, nthread) com workers * nthread <= cores. Sem `workers`, prefere processos
+    (trials independentes escalam melhor que threads do hist em bases pequenas), mas deixa
+    ao menos 2 threads por processo quando há núcleos sobrando.
+    """
+    cores = max(1, cores or os.cpu_count() or 1)
+    if workers is None:
+        workers = max(1, cores // 2) if cores >= 4 else cores
+    workers = max(1, min(workers, cores))
+    return workers, max(1, cores // workers)
+
+
+def sample_params(n_trials: int, seed: int = SEED) -> List[Dict[str, Any]]:
+    """Busca aleatória sem repetição no grid; o trial 0 é sempre a linha de base."""
+    keys = list(SEARCH_SPACE)
+    grid = [dict(zip(keys, vals)) for vals in itertools.product(*SEARCH_SPACE.values())]
+    grid = [p for p in grid if p != BASELINE]
+    random.Random(seed).shuffle(grid)
+    return [dict(BASELINE)] + grid[:max(0, n_trials - 1)]
+
+
+def _init_worker(x_path: str, y_path: str, nthread: int):
+    global _X, _y, _NTHREAD
+    _X = np.load(x_path, mmap_mode="r")
+    _y = np.load(y_path, mmap_mode="r")
+    _NTHREAD = nthread
+
+
+def _folds(n: int, n_folds: int, seed: int = SEED) -> np.ndarray:
+    return np.random.default_rng(seed).permutation(n) % n_folds
+
+
+def run_trial(trial: int, params: Dict[str, Any], n_folds: int = N_FOLDS,
+              max_rounds: int = MAX_ROUNDS, early_stopping: int = EARLY_STOPPING_ROUNDS) -> Dict[str, Any]:
+    """k dobras de um conjunto de parâmetros, no processo atual (usa _X/_y do initializer)."""
+    t0 = time.perf_counter()
+    booster_params = {
+        "objective": "reg:squarederror", "tree_method": "hist", "eval_metric": "rmse",
+        "nthread": _NTHREAD, "seed": SEED,
+        **{("eta" if k == "learning_rate" else k): v for k, v in params.items()},
+    }
+    fold = _folds(len(_y), n_folds)
+    rmse, mae, r2, rounds = [], [], [], []
+    for f in range(n_folds):
+        tr, va = np.flatnonzero(fold != f), np.flatnonzero(fold == f)
+        dtrain = xgb.QuantileDMatrix(_X[tr], label=_y[tr])
+        dvalid = xgb.QuantileDMatrix(_X[va], label=_y[va], ref=dtrain)
+        booster = xgb.train(booster_params, dtrain, num_boost_round=max_rounds,
+                            evals=[(dvalid, "valid")], early_stopping_rounds=early_stopping,
+                            verbose_eval=False)
+        pred = booster.predict(dvalid, iteration_range=(0, booster.best_iteration + 1)).astype(np.float64)
+        y_va = np.asarray(_y[va], dtype=np.float64)
+        err = y_va - pred
+        rmse.append(float(np.sqrt(np.mean(err ** 2))))
+        mae.append(float(np.mean(np.abs(err))))
+        r2.append(float(1 - np.sum(err ** 2) / np.sum((y_va - y_va.mean()) ** 2)))
+        rounds.append(booster.best_iteration + 1)
+    return {
+        "trial": trial, **params,
+        "rmse_mean": np.mean(rmse), "rmse_std": np.std(rmse),
+        "mae_mean": np.mean(mae), "r2_mean": np.mean(r2),
+        "best_rounds": int(np.median(rounds)),
+        "seconds": round(time.perf_counter() - t0, 2),
+    }
+
+
+def tune(X, y, n_trials: int = 20, n_folds: int = N_FOLDS, cores: Optional[int] = None,
+         workers: Optional[int] = None, max_rounds: int = MAX_ROUNDS,
+         early_stopping: int = EARLY_STOPPING_ROUNDS, results_path: str = RESULTS_FILE) -> pd.DataFrame:
+    """Roda os trials no pool e devolve a tabela de resultados ordenada por RMSE (também salva em CSV)."""
+    workers, nthread = budget_cores(cores, workers)
+    trials = sample_params(n_trials)
+    workers = min(workers, len(trials))
+    print(f"   ⚙️ {len(trials)} trials x {n_folds} dobras | {workers} processos x {nthread} threads "
+          f"| até {max_rounds} rounds, early stopping {early_stopping}")
+
+    tmpdir = tempfile.mkdtemp(prefix="tune_")
+    x_path, y_path = os.path.join(tmpdir, "X.npy"), os.path.join(tmpdir, "y.npy")
+    np.save(x_path, np.ascontiguousarray(X, dtype=np.float32))
+    np.save(y_path, np.asarray(y, dtype=np.float32))
+
+    rows = []
+    t0 = time.perf_counter()
+    try:
+        # spawn: o pai já pode ter threads do OpenMP ativas, e fork com elas pode travar
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(x_path, y_path, nthread)) as pool:
+            futures = [pool.submit(run_trial, i, p, n_folds, max_rounds, early_stopping)
+                       for i, p in enumerate(trials)]
+            for fut in as_completed(futures):
+                r = fut.result()
+                rows.append(r)
+                print(f"   🔎 trial {r['trial']:>3} | RMSE {r['rmse_mean']:,.0f} | R² {r['r2_mean']:.4f} "
+                      f"| {r['best_rounds']} rounds | {r['seconds']}s")
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    results = pd.DataFrame(rows).sort_values("rmse_mean").reset_index(drop=True)
+    results.to_csv(results_path, index=False)
+    print(f"   ✅ Busca concluída em {time.perf_counter() - t0:.1f}s; tabela em {results_path}")
+    return results
+
+
+def best_params(results: pd.DataFrame) -> Dict[str, Any]:
+    """Parâmetros do XGBRegressor para o melhor trial, com n_estimators = rounds do early stopping."""
+    best = results.iloc[0]
+    # a linha do DataFrame sobe tudo para float; volta ao tipo do espaço de busca (max_depth é int)
+    params = {k: type(v[0])(best[k]) for k, v in SEARCH_SPACE.items()}
+    params["n_estimators"] = int(best["best_rounds"])
+    return params